@@ -0,0 +1,2 @@
+# Benchmarks of the APP-11 report generation (run from the repository root,
+# e.g. python -m benchmarks.bench_dtg).
@@ -0,0 +1,98 @@
+# Number of rows kept by each TRCKHIST decimation strategy (src/decimation.py) on a straight
+# track with sensor noise: exits with an error when the change strategy keeps more than a
+# handful of rows (the jitter of the heading and speed must never add up to a change).
+# The track heads north, so that the heading noise also wraps around 360 degrees.
+#
+#   python -m benchmarks.bench_decimation [--rows N] [--max-kept N] [--output results.json]
+
+# Library imports
+import argparse
+import math
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+# Local imports
+from benchmarks.results import createResults, \
+                               addTiming, \
+                               saveResults
+from src.constants import ESTATE_CHUNK_SIZE, \
+                          EARTH_RADIUS_M
+from src.datatypes import DecimationStrategy
+from src.decimation import decimate
+from src.tasks import getParams, getData
+
+
+SAMPLE_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent / "sample"
+
+# Straight track: 1.5 m/s northwards, one row every 0.2 s, from 43N 9E
+TRACK_SPEED = 1.5
+TRACK_ROW_INTERVAL = 0.2
+TRACK_ORIGIN = (math.radians(43.0), math.radians(9.0))
+# Standard deviations of the sensor noise
+HEADING_NOISE = math.radians(2.0)
+SPEED_NOISE = 0.05
+POSITION_NOISE = 0.3
+
+
+def noisyStraightTrack(rows: int, seed: int) -> list:
+    # EstimatedState chunks (see src/estimated_state.py:iterEstimatedStateChunks)
+    rng = np.random.default_rng(seed)
+    time_values = 1726387200.0 + TRACK_ROW_INTERVAL * np.arange(rows)
+    north = TRACK_SPEED * TRACK_ROW_INTERVAL * np.arange(rows) + rng.normal(0.0, POSITION_NOISE, rows)
+    east = rng.normal(0.0, POSITION_NOISE, rows)
+    yaw = rng.normal(0.0, HEADING_NOISE, rows) % (2 * math.pi)
+    speed = TRACK_SPEED + rng.normal(0.0, SPEED_NOISE, rows)
+    track = {
+             'time'       : time_values,
+             'latitude'   : TRACK_ORIGIN[0] + north / EARTH_RADIUS_M,
+             'longitude'  : TRACK_ORIGIN[1] + east / (EARTH_RADIUS_M * math.cos(TRACK_ORIGIN[0])),
+             'yaw'        : yaw,
+             'vx'         : speed * np.cos(yaw),
+             'vy'         : speed * np.sin(yaw),
+             'altitude'   : np.full(rows, 10.0)
+            }
+    return [{name: values[start:start + ESTATE_CHUNK_SIZE] for name, values in track.items()}
+            for start in range(0, rows, ESTATE_CHUNK_SIZE)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Counts the rows kept by each decimation strategy on a noisy '
+                                                 'straight track, and fails if the change strategy keeps more '
+                                                 'than a handful of them.')
+    parser.add_argument('--rows', type=int, default=20000, help='Number of rows of the track')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the sensor noise')
+    parser.add_argument('--max-kept', type=int, default=5,
+                        help='Largest number of rows the change strategy may keep (default: 5)')
+    parser.add_argument('--output', type=pathlib.Path, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = createResults("decimation", {'rows': args.rows, 'seed': args.seed})
+    results['kept rows'] = {}
+    chunks = noisyStraightTrack(args.rows, args.seed)
+    data = getData(getParams(SAMPLE_DIRECTORY))
+
+    print(f"{'strategy':<24}{'kept rows':>12}{'time':>14}")
+    for strategy in DecimationStrategy:
+        start = time.perf_counter()
+        kept = sum(len(indices) for _, indices in decimate(iter(chunks), strategy, data))
+        seconds = time.perf_counter() - start
+        addTiming(results, f"decimate({strategy})", seconds)
+        results['kept rows'][str(strategy)] = kept
+        print(f"{str(strategy):<24}{kept:>12}{seconds:>12.3f} s")
+
+    if args.output is not None:
+        saveResults(results, args.output)
+        print(f"Results written to {args.output}")
+
+    kept = results['kept rows'][str(DecimationStrategy.Change)]
+    if kept > args.max_kept:
+        print(f"Decimation regression: the change strategy keeps {kept} rows of a straight track "
+              f"(at most {args.max_kept} expected)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
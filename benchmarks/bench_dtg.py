@@ -0,0 +1,99 @@
+# Benchmark of the DTG formatting functions (src/dtg.py) against the previous
+# datetime.strptime/strftime based implementations.
+#
+#   python -m benchmarks.bench_dtg [--rows N] [--output results.json]
+
+# Library imports
+import argparse
+import datetime
+import pathlib
+import random
+import timeit
+
+import numpy as np
+
+# Local imports
+from benchmarks.results import createResults, \
+                               addTiming, \
+                               saveResults
+from src import dtg
+
+
+def legacyTimeToZulu(time_str):
+    date = datetime.datetime.strptime(time_str, '%Y%m%d-%H%M')
+    return date.strftime('%d%H%MZ%b%Y').upper()
+
+
+def legacyEpochToZulu(timestamp):
+    # NOTE: the previous implementation used local time - UTC here, for comparison.
+    time = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return "{}".format(time.strftime('%d%H%MZ%b%Y')).upper()
+
+
+def legacyCurrentDatetime():
+    time = datetime.datetime.now(datetime.timezone.utc)
+    return "{}".format(time.strftime('%d%H%MZ%b%Y')).upper()
+
+
+def sampleTimeStrings(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 9, 15, 6, 0)
+    return [(start + datetime.timedelta(minutes=rng.randrange(0, 12 * 60))).strftime('%Y%m%d-%H%M')
+            for _ in range(count)]
+
+
+def sampleTimestamps(count: int, seed: int) -> np.ndarray:
+    # Telemetry-like timestamps: increasing, a few rows per second
+    rng = np.random.default_rng(seed)
+    return 1726380000.0 + np.cumsum(rng.uniform(0.05, 1.0, count))
+
+
+def bench(function, repeat: int = 3) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the DTG formatting functions.')
+    parser.add_argument('--rows', type=int, default=100000, help='Number of rows to format')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', type=pathlib.Path, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    time_strings = sampleTimeStrings(args.rows, args.seed)
+    timestamps = sampleTimestamps(args.rows, args.seed)
+    timestamp_list = timestamps.tolist()
+
+    # Check that the fast paths give the same results first
+    assert [dtg.timeToZulu(s) for s in time_strings] == [legacyTimeToZulu(s) for s in time_strings]
+    assert dtg.epochsToZulu(timestamps) == [legacyEpochToZulu(t) for t in timestamp_list]
+
+    results = [
+               ("timeToZulu",       lambda: [legacyTimeToZulu(s) for s in time_strings],
+                                    lambda: [dtg.timeToZulu(s) for s in time_strings]),
+               ("timeToZulu (no cache)", lambda: [legacyTimeToZulu(s) for s in time_strings],
+                                    lambda: [dtg.formatDTG(*dtg.parseDatetime(s)) for s in time_strings]),
+               ("epochToZulu",      lambda: [legacyEpochToZulu(t) for t in timestamp_list],
+                                    lambda: [dtg.epochToZulu(t) for t in timestamp_list]),
+               ("epochsToZulu",     lambda: [legacyEpochToZulu(t) for t in timestamp_list],
+                                    lambda: dtg.epochsToZulu(timestamps)),
+               ("currentDatetime",  lambda: [legacyCurrentDatetime() for _ in range(args.rows)],
+                                    lambda: [dtg.currentDatetime() for _ in range(args.rows)]),
+              ]
+
+    timings = createResults("dtg", {'rows': args.rows, 'seed': args.seed})
+
+    print(f"{'function':<24}{'legacy (s)':>12}{'new (s)':>12}{'speedup':>10}   ({args.rows} rows)")
+    for name, legacy, new in results:
+        legacy_time = bench(legacy)
+        new_time = bench(new)
+        print(f"{name:<24}{legacy_time:>12.4f}{new_time:>12.4f}{legacy_time / new_time:>9.1f}x")
+        addTiming(timings, f"legacy {name}", legacy_time, args.rows)
+        addTiming(timings, name, new_time, args.rows)
+
+    if args.output is not None:
+        saveResults(timings, args.output)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
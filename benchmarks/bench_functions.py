@@ -0,0 +1,233 @@
+# Microbenchmarks of the functions of src/app11.py and src/utils.py, and of create_body,
+# on synthetic exercise data (see benchmarks/generators.py).
+#
+#   python -m benchmarks.bench_functions [--rows N] [--output results.json] [--compare baseline.json]
+
+# Library imports
+import argparse
+import contextlib
+import csv
+import io
+import os
+import pathlib
+import tempfile
+import timeit
+
+# Local imports
+from benchmarks.generators import generateMines, \
+                                  generateEstimatedState
+from benchmarks.results import createResults, \
+                               addTiming, \
+                               saveResults, \
+                               loadResults, \
+                               printResults
+from src import app11, utils
+from src.constants import MILECREP, \
+                          MILCOREP, \
+                          MDETREP, \
+                          NOMBOINFO, \
+                          MINEINFO, \
+                          ESTATE_THROTTLE_DELTA_T, \
+                          FILENAME_MINES_CSV
+from src.create_report import create_body
+from src.datatypes import ReportType
+from src.mines import parseMineRows
+from src.mines_cache import getCacheFile, \
+                            loadMineLines
+from src.report_writer import ReportWriter
+from src.tasks import getParams, getData
+
+
+SAMPLE_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent / "sample"
+
+
+def bench(function, repeat: int) -> tuple:
+    # Returns (best time of a batch of calls, number of calls in a batch),
+    # with batches of at least 0.2s (see timeit.Timer.autorange).
+    timer = timeit.Timer(function)
+    calls, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=calls)), calls
+
+
+@contextlib.contextmanager
+def workingDirectory(directory: pathlib.Path):
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def loadMineRecords(filepath: pathlib.Path) -> list:
+    # Detections of the file, parsed like the reports do (see src/mines.py:parseMineRows)
+    with open(filepath, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        mines = parseMineRows(filepath, header, ((reader.line_num, row) for row in reader))
+    return [mine for mine in mines if mine is not None]
+
+
+def loadMineLinesCold(data_directory: pathlib.Path) -> list:
+    # Every row is parsed and formatted again
+    getCacheFile(data_directory).unlink(missing_ok=True)
+    return loadMineLines(data_directory)
+
+
+def firstMineOfType(mines: list, detection_type: str):
+    return next(mine for mine in mines if mine.type == detection_type)
+
+
+def app11Benchmarks(mines: list, estimated_state_row: list) -> dict:
+    # Map of function name to its arguments
+    milecrep = firstMineOfType(mines, MILECREP)
+    milcorep = firstMineOfType(mines, MILCOREP)
+    mdetrep = firstMineOfType(mines, MDETREP)
+    nomboinfo = firstMineOfType(mines, NOMBOINFO)
+    mineinfo = firstMineOfType(mines, MINEINFO)
+
+    return {
+            'filename'      : (ReportType.Complete, "TE4", "MWA", "EH01", 3),
+            'header'        : ("TE4", "EXCON"),
+            'begin'         : (),
+            'end'           : (),
+            'exer'          : ("REPMUS 2024",),
+            'msgid'         : ("TE4", 3, ReportType.Complete),
+            'ref_doc'       : ("A", "EXPLAN", "COMMANDO NAVAL", "09JUL2024"),
+            'ref'           : ("C", "OPDIR", "TE4", "150700ZSEP2024"),
+            'geodatum'      : ("WGE",),
+            'nmwrepq'       : ("CPT",),
+            'heading'       : ("MCM",),
+            'mtaskrep'      : ("MWA", "EH01", "TE4", ReportType.Complete, "150800ZSEP2024", "151700ZSEP2024"),
+            'mcmpedat_short': ("MWA", "EH01", 50),
+            'mcmpedat'      : ("MWA", "EH01", 100, 50, 0.9, 0.1, 0.1, [(250 - 25 * i, 1 + i % 2) for i in range(21)]),
+            'trckhist'      : ("HYDRA H5SE7",
+                               utils.extractAndFormatDTG(estimated_state_row),
+                               utils.extractAndFormatFix(estimated_state_row),
+                               utils.extractAndFormatSensorAltitude(estimated_state_row),
+                               utils.extractAndFormatSpeed(estimated_state_row),
+                               utils.extractAndFormatHeading(estimated_state_row)),
+            'milecrep'      : (milecrep.utc, utils.getMineFix(milecrep), "3",
+                               milecrep.detection_equipment, "UNCERTAIN", milecrep.image_name),
+            'milcorep'      : (milcorep.contact_reference_number, milcorep.utc, utils.getMineFix(milcorep), "3",
+                               milcorep.detection_equipment, "4", "LOOKS LIKE A MINE", milcorep.image_name),
+            'nonmilcorep'   : (milcorep.contact_reference_number, milcorep.utc, utils.getMineFix(milcorep), "3",
+                               milcorep.detection_equipment, "2", "DOESN'T LOOK LIKE A MINE", milcorep.image_name),
+            'mdetrep'       : ("VISUAL", mdetrep.utc, "-", "DIVER", utils.getMineFix(mdetrep), "3",
+                               "SEE IMAGE " + mdetrep.image_name),
+            'nomboinfo'     : (nomboinfo.contact_reference_number, nomboinfo.utc, utils.getMineFix(nomboinfo), "3",
+                               nomboinfo.nombo_identification, "SONAR", nomboinfo.image_name),
+            'mineinfo'      : (mineinfo.mine_reference_number, mineinfo.utc, utils.getMineFix(mineinfo), "3",
+                               mineinfo.mine_status_identifier, mineinfo.mine_case, mineinfo.mine_identity,
+                               "SONAR", utils.getMineDepth(mineinfo), mineinfo.image_name),
+            'narr'          : (1.5, 2.0, 0.5, 0.5),
+            'gentext'       : ("SURVEY COMPLETED",)
+           }
+
+
+def utilsBenchmarks(mines: list, estimated_state_row: list, estimated_state_rows: list) -> dict:
+    # Map of function name to its arguments
+    mineinfo = firstMineOfType(mines, MINEINFO)
+    milcorep = firstMineOfType(mines, MILCOREP)
+
+    return {
+            'timeToZulu'                        : ("20240915-0810",),
+            'degreesToDDM'                      : (38.42225068,),
+            'radiansToDDM'                      : (0.6705556528,),
+            'currentDatetime'                   : (),
+            'formatFix'                         : (3825.3350, -909.1497),
+            'throttleData'                      : (estimated_state_rows, ESTATE_THROTTLE_DELTA_T),
+            'extractAndFormatDTG'               : (estimated_state_row,),
+            'extractAndFormatFix'               : (estimated_state_row,),
+            'extractAndFormatSensorAltitude'    : (estimated_state_row,),
+            'extractAndFormatSpeed'             : (estimated_state_row,),
+            'extractAndFormatHeading'           : (estimated_state_row,),
+            'createTrckHist'                    : (estimated_state_rows, "HYDRA H5SE7"),
+            'getMineFix'                        : (mineinfo,),
+            'getMineCircularErrorProbability'   : (mineinfo,),
+            'getMineSonarConfidenceLevel'       : (milcorep,),
+            'getMineDepth'                      : (mineinfo,)
+           }
+
+
+def moduleFunctions(module) -> list:
+    # Public functions defined in module (including the compiled APP-11 set formatters)
+    return [name for name, value in vars(module).items()
+            if callable(value) and not isinstance(value, type) and not name.startswith("_")
+            and getattr(value, '__module__', None) in (module.__name__, None)]
+
+
+def createBodyData(mine_lines: list, estimated_state_file: pathlib.Path) -> dict:
+    data = getData(getParams(SAMPLE_DIRECTORY))
+    data['message serial number'] = 1
+    data['mine lines'] = mine_lines
+    data['estimated state files'] = [(data['vehicle name'], estimated_state_file)]
+    return data
+
+
+def createBody(report_type: ReportType, data: dict) -> None:
+    create_body(ReportWriter(), report_type, data, False, report_type == ReportType.Complete, False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the functions of src/app11.py and src/utils.py, '
+                                                 'and create_body.')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Number of mine detection and EstimatedState rows of the synthetic data')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed batches (the best one is kept)')
+    parser.add_argument('--output', type=pathlib.Path, help='JSON file to write the results to')
+    parser.add_argument('--compare', type=pathlib.Path, help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    results = createResults("functions", {'rows': args.rows, 'seed': args.seed})
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        # The mines cache is written next to the data directory (see src/mines_cache.py)
+        data_directory = directory / "data"
+        data_directory.mkdir()
+        mines_file = data_directory / FILENAME_MINES_CSV
+        estimated_state_file = directory / "EstimatedState.csv"
+        generateMines(mines_file, args.rows, args.seed)
+        generateEstimatedState(estimated_state_file, args.rows, args.seed)
+
+        mines = loadMineRecords(mines_file)
+        with open(estimated_state_file, newline='') as csvfile:
+            estimated_state_rows = list(csv.reader(csvfile))[1:]
+        estimated_state_row = estimated_state_rows[0]
+
+        suites = [(app11, app11Benchmarks(mines, estimated_state_row)),
+                  (utils, utilsBenchmarks(mines, estimated_state_row, estimated_state_rows))]
+        for module, benchmarks in suites:
+            missing = [name for name in moduleFunctions(module) if name not in benchmarks]
+            if len(missing) > 0:
+                print(f"WARNING: no benchmark for {module.__name__}: {', '.join(missing)}")
+
+            for name, arguments in benchmarks.items():
+                function = getattr(module, name)
+                # createTrckHist writes trckhist.txt in the working directory, and prints
+                with workingDirectory(directory), contextlib.redirect_stdout(io.StringIO()):
+                    seconds, calls = bench(lambda: function(*arguments), args.repeat)
+                addTiming(results, f"{module.__name__.split('.')[-1]}.{name}", seconds, calls)
+
+        # Mines.csv is read the way the reports read it: without, then with the mines cache
+        seconds, calls = bench(lambda: loadMineLinesCold(data_directory), args.repeat)
+        addTiming(results, "mines_cache.loadMineLines(cold)", seconds, calls)
+        seconds, calls = bench(lambda: loadMineLines(data_directory), args.repeat)
+        addTiming(results, "mines_cache.loadMineLines(warm)", seconds, calls)
+
+        data = createBodyData(loadMineLines(data_directory), estimated_state_file)
+        for report_type in ReportType:
+            seconds, calls = bench(lambda: createBody(report_type, data), args.repeat)
+            addTiming(results, f"create_body({report_type})", seconds, calls)
+
+    printResults(results, loadResults(args.compare) if args.compare is not None else None)
+
+    if args.output is not None:
+        saveResults(results, args.output)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Peak memory of the TRCKHIST generation (tracemalloc), on synthetic EstimatedState logs of
+# several sizes: the logs are streamed, so the peak must not grow with the number of rows.
+# Exits with an error when the peak of the largest log exceeds the peak of the smallest one
+# by more than the tolerance, without (cold) or with (warm) the decoded columns cache.
+#
+#   python -m benchmarks.bench_memory [--rows N N...] [--tolerance 0.25] [--output results.json]
+
+# Library imports
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Local imports
+from benchmarks.generators import generateEstimatedState
+from benchmarks.results import createResults, \
+                               addTiming, \
+                               saveResults
+from src.create_report import create_report
+from src.datatypes import ReportType
+from src.tasks import getParams, getData
+
+
+SAMPLE_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent / "sample"
+
+
+def createReportData(estimated_state_file: pathlib.Path) -> dict:
+    data = getData(getParams(SAMPLE_DIRECTORY))
+    data['message serial number'] = 1
+    data['mine lines'] = []
+    data['estimated state files'] = [(data['vehicle name'], estimated_state_file)]
+    return data
+
+
+def measureReport(estimated_state_file: pathlib.Path, reports_directory: pathlib.Path) -> tuple:
+    # Returns (seconds, peak traced bytes) of writing the COMPLETE report with its TRCKHIST lines
+    data = createReportData(estimated_state_file)
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        create_report(ReportType.Complete, data, reports_directory, False, True, False)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the peak memory of the TRCKHIST generation, and fails '
+                                                 'if it grows with the number of rows of the EstimatedState log.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[200000, 800000],
+                        help='Numbers of rows of the synthetic EstimatedState logs (default: 200000 800000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic data')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed growth of the peak memory from the smallest to the largest log (default: 0.25)')
+    parser.add_argument('--output', type=pathlib.Path, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    if len(args.rows) < 2:
+        parser.error("--rows needs at least 2 sizes")
+    sizes = sorted(args.rows)
+
+    results = createResults("memory", {'rows': sizes, 'seed': args.seed, 'tolerance': args.tolerance})
+    results['peak memory'] = {}
+    # Map of run (cold, warm) to the peak of each size
+    peaks = {'cold': [], 'warm': []}
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        reports_directory = directory / "reports"
+        reports_directory.mkdir()
+
+        print(f"{'benchmark':<48}{'time':>14}{'peak (MiB)':>14}")
+        for rows in sizes:
+            estimated_state_file = directory / f"EstimatedState_{rows}.csv"
+            generateEstimatedState(estimated_state_file, rows, args.seed)
+
+            # The first run decodes the CSV file and writes the cache, the second one reads the cache
+            for run in ("cold", "warm"):
+                name = f"create_report(COMPLETE, {rows} rows, {run})"
+                seconds, peak = measureReport(estimated_state_file, reports_directory)
+                addTiming(results, name, seconds)
+                results['peak memory'][name] = peak
+                peaks[run].append(peak)
+                print(f"{name:<48}{seconds:>12.3f} s{peak / 2**20:>14.1f}")
+
+    if args.output is not None:
+        saveResults(results, args.output)
+        print(f"Results written to {args.output}")
+
+    failures = [f"{run}: the peak grows from {values[0] / 2**20:.1f} MiB ({sizes[0]} rows) "
+                f"to {values[-1] / 2**20:.1f} MiB ({sizes[-1]} rows)"
+                for run, values in peaks.items() if values[-1] > values[0] * (1 + args.tolerance)]
+    if len(failures) > 0:
+        print("Memory regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Startup time of the command line scripts, with an import time budget per case
+# (python -X importtime): exits with an error when a case exceeds its budget, or loads
+# a module it should not need (e.g. numpy or the CSV parsing to print the help).
+#
+#   python -m benchmarks.bench_startup [--repeat N] [--output results.json] [--compare baseline.json]
+
+# Library imports
+import argparse
+import ast
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Local imports
+from benchmarks.results import createResults, \
+                               addTiming, \
+                               saveResults, \
+                               loadResults, \
+                               printResults
+from src.constants import FILENAME_MINES_CSV, \
+                          FILENAME_PARAMETERS, \
+                          FOLDER_NAME_DATA
+
+
+REPOSITORY_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+SAMPLE_DIRECTORY = REPOSITORY_DIRECTORY / "sample"
+
+# Task generated by the --only START case
+SAMPLE_TASK = ("TE4", "MWA", "EH01")
+
+# Modules that none of the cases below need
+COMMON_FORBIDDEN_MODULES = ["numpy", "csv", "src.mines_cache", "src.survey_legs", "src.coverage", "concurrent.futures", "cProfile", "tracemalloc"]
+
+# Map of case name to script, arguments ({top} is the top level directory of the sample task),
+# import time budget (ms) and modules that must not be loaded
+STARTUP_CASE_MAP = {
+                    "generate_reports.py -h"      : ("generate_reports.py",
+                                                     ["-h"],
+                                                     60.0,
+                                                     COMMON_FORBIDDEN_MODULES + ["configparser",
+                                                                                 "sqlite3",
+                                                                                 "colorama",
+                                                                                 "src.tasks",
+                                                                                 "src.create_report"]),
+                    "create_directory.py -h"      : ("create_directory.py",
+                                                     ["-h"],
+                                                     55.0,
+                                                     COMMON_FORBIDDEN_MODULES + ["colorama"]),
+                    "validate_reports.py -h"      : ("validate_reports.py",
+                                                     ["-h"],
+                                                     70.0,
+                                                     COMMON_FORBIDDEN_MODULES + ["colorama"]),
+                    "correlate_mines.py -h"       : ("correlate_mines.py",
+                                                     ["-h"],
+                                                     55.0,
+                                                     COMMON_FORBIDDEN_MODULES + ["colorama",
+                                                                                 "src.correlation"]),
+                    "generate_reports.py --only START" : ("generate_reports.py",
+                                                     [*SAMPLE_TASK, "{top}", "--only", "START", "--force", "-q"],
+                                                     120.0,
+                                                     COMMON_FORBIDDEN_MODULES + ["multiprocessing",
+                                                                                 "src.batch",
+                                                                                 "src.watch"]),
+                   }
+
+# Runs a script like "python script.py arguments..." would, and writes the names of the
+# modules loaded at exit to a file (modules imported lazily and never used are left out).
+# Only builtin modules are imported, so that the import times are those of the script.
+PROBE = """
+import atexit, sys
+modules_file, script = sys.argv[1:3]
+sys.argv = sys.argv[2:]
+def dump():
+    with open(modules_file, "w") as file:
+        file.write(repr(sorted(name for name, module in list(sys.modules.items())
+                               if type(module).__name__ != "_LazyModule")))
+atexit.register(dump)
+with open(script) as file:
+    code = compile(file.read(), script, "exec")
+exec(code, {"__name__": "__main__", "__file__": script})
+"""
+
+# "import time: <self us> | <cumulative us> | <indentation><module>"
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def createSampleTask(top_directory: pathlib.Path) -> None:
+    data_directory = top_directory.joinpath(FOLDER_NAME_DATA, *SAMPLE_TASK, FOLDER_NAME_DATA)
+    data_directory.mkdir(parents=True)
+    for filename in (FILENAME_PARAMETERS, FILENAME_MINES_CSV):
+        shutil.copy(SAMPLE_DIRECTORY / filename, data_directory / filename)
+
+
+def runCase(script: str, arguments: list, modules_file: pathlib.Path) -> tuple:
+    # Returns (total import time in seconds, wall time in seconds, loaded modules)
+    command = [sys.executable, "-X", "importtime", "-c", PROBE, str(modules_file), script, *arguments]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True)
+    wall_time = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{script} {' '.join(arguments)} failed:\n{process.stdout}{process.stderr}")
+
+    import_time = 0
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is not None:
+            import_time += int(match.group(1))
+    modules = set(ast.literal_eval(modules_file.read_text()))
+    return import_time * 1e-6, wall_time, modules
+
+
+def forbiddenModules(modules: set, forbidden: list) -> list:
+    return [name for name in forbidden
+            if any(module == name or module.startswith(name + ".") for module in modules)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the startup time of the command line scripts, and '
+                                                 'fails if a case exceeds its import time budget.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each case (the best one is kept)')
+    parser.add_argument('--budget-factor', type=float, default=1.0,
+                        help='Multiplier of the import time budgets (e.g. 2 on a slow machine)')
+    parser.add_argument('--output', type=pathlib.Path, help='JSON file to write the results to')
+    parser.add_argument('--compare', type=pathlib.Path, help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    results = createResults("startup", {'repeat': args.repeat, 'budget factor': args.budget_factor})
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        top_directory = directory / "exercise"
+        createSampleTask(top_directory)
+        modules_file = directory / "modules.txt"
+
+        for name, (script, arguments, budget, forbidden) in STARTUP_CASE_MAP.items():
+            arguments = [argument.format(top=top_directory) for argument in arguments]
+            runs = [runCase(script, arguments, modules_file) for _ in range(args.repeat)]
+            import_time = min(run[0] for run in runs)
+            addTiming(results, f"{name} (imports)", import_time)
+            addTiming(results, f"{name} (wall)", min(run[1] for run in runs))
+
+            budget = budget * args.budget_factor * 1e-3
+            if import_time > budget:
+                failures.append(f"{name}: imports take {import_time * 1e3:.1f} ms (budget: {budget * 1e3:.1f} ms)")
+            loaded = forbiddenModules(runs[-1][2], forbidden)
+            if len(loaded) > 0:
+                failures.append(f"{name}: loads {', '.join(loaded)}")
+
+    printResults(results, loadResults(args.compare) if args.compare is not None else None)
+
+    if args.output is not None:
+        saveResults(results, args.output)
+        print(f"Results written to {args.output}")
+
+    if len(failures) > 0:
+        print("Startup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Seeded generators of synthetic exercise data, for the benchmarks.
+#
+#   python -m benchmarks.generators mines ROWS OUTPUT [--seed N]
+#   python -m benchmarks.generators estimated-state ROWS OUTPUT [--seed N]
+#
+# The same seed and size always give the same file. Files are written in chunks,
+# so that sizes up to 10M rows can be generated with a bounded amount of memory.
+
+# Library imports
+import argparse
+import csv
+import math
+import pathlib
+import random
+
+import numpy as np
+
+# Local imports
+from src.constants import MINES_COLUMN_MAP, \
+                          MINE_STATUS_ID_MAP, \
+                          MINE_CASE_MAP, \
+                          MILECREP, \
+                          MILCOREP, \
+                          NONMILCOREP, \
+                          MDETREP, \
+                          NOMBOINFO, \
+                          MINEINFO, \
+                          ESTATE_CHUNK_SIZE, \
+                          ESTATE_COLUMN_TIME, \
+                          ESTATE_COLUMN_LATITUDE, \
+                          ESTATE_COLUMN_LONGITUDE, \
+                          ESTATE_COLUMN_YAW, \
+                          ESTATE_COLUMN_VX, \
+                          ESTATE_COLUMN_VY, \
+                          ESTATE_COLUMN_ALTITUDE, \
+                          EARTH_RADIUS_M
+
+
+# Benchmark sizes, in rows
+SIZES = [1000, 10000, 100000, 1000000, 10000000]
+
+# Origin of the synthetic survey area (deg), and start of the exercise (s since epoch)
+ORIGIN_LATITUDE     = 38.42
+ORIGIN_LONGITUDE    = -9.15
+EXERCISE_START      = 1726380000.0      # 2024-09-15 06:00 UTC
+
+# Relative frequency of each detection type (a survey mostly reports contacts)
+DETECTION_TYPE_WEIGHTS = {
+                          MILECREP    : 50,
+                          MILCOREP    : 30,
+                          NONMILCOREP : 12,
+                          MDETREP     : 2,
+                          NOMBOINFO   : 3,
+                          MINEINFO    : 3
+                         }
+
+# Vehicles reporting each detection type
+DETECTION_VEHICLE_MAP = {
+                         MILECREP    : ["SONOBOT", "QUADROIN"],
+                         MILCOREP    : ["SONOBOT", "QUADROIN"],
+                         NONMILCOREP : ["SONOBOT", "QUADROIN"],
+                         MDETREP     : ["DIVER"],
+                         NOMBOINFO   : ["DIVER"],
+                         MINEINFO    : ["DIVER"]
+                        }
+
+MINE_IDENTITIES = ["Manta", "MK36", "Rockan", "VS-50", "MN103"]
+
+# EstimatedState header, as exported by Neptus (23 columns)
+ESTATE_HEADER = ["timestamp (seconds since 01/01/1970)", " system", " entity ",
+                 " lat (rad)", " lon (rad)", " height (m)", " x (m)", " y (m)", " z (m)",
+                 " phi (rad)", " theta (rad)", " psi (rad)", " u (m/s)", " v (m/s)", " w (m/s)",
+                 " vx (m/s)", " vy (m/s)", " vz (m/s)", " p (rad/s)", " q (rad/s)", " r (rad/s)",
+                 " depth (m)", " alt (m)"]
+
+# Lawnmower survey pattern followed by the synthetic vehicle
+SURVEY_LEG_LENGTH   = 400.0     # m
+SURVEY_LEG_SPACING  = 25.0      # m
+SURVEY_SPEED        = 1.5       # m/s
+
+
+def generateMines(filepath: pathlib.Path, rows: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    types = list(DETECTION_TYPE_WEIGHTS)
+    weights = list(DETECTION_TYPE_WEIGHTS.values())
+    statuses = list(MINE_STATUS_ID_MAP)
+    cases = list(MINE_CASE_MAP)
+
+    with open(filepath, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, lineterminator='\n')
+        writer.writerow(MINES_COLUMN_MAP.values())
+
+        for index in range(rows):
+            detection_type = rng.choices(types, weights)[0]
+            minute = int(EXERCISE_START // 60) + rng.randrange(0, 12 * 60)
+            utc = "20240915-{:02d}{:02d}".format((minute // 60) % 24, minute % 60)
+            row = {key: "" for key in MINES_COLUMN_MAP}
+            row['type']                         = detection_type
+            row['utc']                          = utc
+            row['longitude']                    = "{:.8f}".format(ORIGIN_LONGITUDE + rng.uniform(0.0, 0.05))
+            row['latitude']                     = "{:.8f}".format(ORIGIN_LATITUDE + rng.uniform(0.0, 0.05))
+            row['circular error probability']   = rng.randint(1, 10)
+            row['confidence level']             = rng.choice(["0.5", "0.6", "0.75", "0.8", "0.9", "1.0"])
+            row['detected by']                  = rng.choice(DETECTION_VEHICLE_MAP[detection_type])
+
+            if detection_type in (MILCOREP, NONMILCOREP, NOMBOINFO):
+                row['contact reference number'] = index + 1
+            if detection_type == NOMBOINFO:
+                row['nombo identification'] = rng.randint(1, 99)
+            if detection_type == MINEINFO:
+                row['mine reference number']    = "EVO{:02d}".format(index + 1)
+                row['mine status identifier']   = rng.choice(statuses)
+                row['mine case']                = rng.choice(cases)
+                row['mine identity']            = rng.choice(MINE_IDENTITIES)
+                row['depth']                    = rng.randint(5, 40)
+            if detection_type in (NOMBOINFO, MINEINFO) or rng.random() < 0.3:
+                row['image'] = "images/{}{:06d}.jpg".format(detection_type, index)
+
+            writer.writerow(row.values())
+
+
+def surveyTrack(distance: np.ndarray) -> tuple:
+    # Position (north, east in m) and heading (rad) along a lawnmower pattern
+    # at the given distance travelled.
+    leg = np.floor_divide(distance, SURVEY_LEG_LENGTH)
+    along = np.mod(distance, SURVEY_LEG_LENGTH)
+    backwards = np.mod(leg, 2) == 1
+    east = np.where(backwards, SURVEY_LEG_LENGTH - along, along)
+    north = leg * SURVEY_LEG_SPACING
+    heading = np.where(backwards, 1.5 * math.pi, 0.5 * math.pi)
+    return north, east, heading
+
+
+def generateEstimatedState(filepath: pathlib.Path, rows: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    origin_latitude = math.radians(ORIGIN_LATITUDE)
+    origin_longitude = math.radians(ORIGIN_LONGITUDE)
+
+    # Columns other than the ones read by the report generation are filled with noise
+    row_format = ["%.4f"] * len(ESTATE_HEADER)
+    row_format[ESTATE_COLUMN_TIME] = "%.6f"
+    row_format[1] = "sonobot"
+    row_format[2] = "Navigation"
+    row_format[ESTATE_COLUMN_LATITUDE] = "%.10f"
+    row_format[ESTATE_COLUMN_LONGITUDE] = "%.10f"
+    row_format[ESTATE_COLUMN_YAW] = "%.6f"
+    row_format[ESTATE_COLUMN_ALTITUDE] = "%.3f"
+    row_format = ",".join(row_format)
+    numeric_columns = [column for column in range(len(ESTATE_HEADER)) if column not in (1, 2)]
+
+    time = EXERCISE_START
+    distance = 0.0
+    altitude = 10.0
+    with open(filepath, 'w') as file:
+        file.write(",".join(ESTATE_HEADER) + "\n")
+
+        for start in range(0, rows, ESTATE_CHUNK_SIZE):
+            count = min(ESTATE_CHUNK_SIZE, rows - start)
+
+            dt = rng.uniform(0.05, 1.0, count)
+            times = time + np.cumsum(dt)
+            speeds = SURVEY_SPEED + rng.normal(0.0, 0.1, count)
+            distances = distance + np.cumsum(dt * speeds)
+            altitudes = np.clip(altitude + np.cumsum(rng.normal(0.0, 0.05, count)), 2.0, 30.0)
+            time, distance, altitude = times[-1], distances[-1], altitudes[-1]
+
+            north, east, heading = surveyTrack(distances)
+            yaw = heading + rng.normal(0.0, 0.05, count)
+
+            values = rng.normal(0.0, 1.0, (count, len(numeric_columns)))
+            columns = {column: index for index, column in enumerate(numeric_columns)}
+            values[:, columns[ESTATE_COLUMN_TIME]] = times
+            values[:, columns[ESTATE_COLUMN_LATITUDE]] = origin_latitude + north / EARTH_RADIUS_M
+            values[:, columns[ESTATE_COLUMN_LONGITUDE]] = origin_longitude \
+                                                          + east / (EARTH_RADIUS_M * math.cos(origin_latitude))
+            values[:, columns[ESTATE_COLUMN_YAW]] = np.arctan2(np.sin(yaw), np.cos(yaw))
+            values[:, columns[ESTATE_COLUMN_VX]] = speeds * np.cos(yaw)
+            values[:, columns[ESTATE_COLUMN_VY]] = speeds * np.sin(yaw)
+            values[:, columns[ESTATE_COLUMN_ALTITUDE]] = altitudes
+
+            np.savetxt(file, values, fmt=row_format)
+
+
+# Map of data set name to its generator
+GENERATOR_MAP = {
+                 "mines"            : generateMines,
+                 "estimated-state"  : generateEstimatedState
+                }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates synthetic exercise data for the benchmarks.')
+    parser.add_argument('kind', choices=list(GENERATOR_MAP), help='Kind of file to generate')
+    parser.add_argument('rows', type=int, help=f'Number of rows (benchmark sizes: {SIZES})')
+    parser.add_argument('output', type=pathlib.Path, help='File to write')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    GENERATOR_MAP[args.kind](args.output, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark results, saved as JSON to compare versions of the generator:
+#
+#   python -m benchmarks.bench_functions --output before.json
+#   (change the code)
+#   python -m benchmarks.bench_functions --output after.json --compare before.json
+
+# Library imports
+import datetime
+import json
+import pathlib
+import platform
+import subprocess
+
+# Local imports
+from src.constants import GENERATOR_VERSION
+
+
+def gitRevision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def createResults(benchmark: str, parameters: dict) -> dict:
+    return {
+            'benchmark'         : benchmark,
+            'generator version' : GENERATOR_VERSION,
+            'revision'          : gitRevision(),
+            'date'              : datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python'            : platform.python_version(),
+            'machine'           : platform.machine(),
+            'parameters'        : parameters,
+            'timings'           : {}
+           }
+
+
+def addTiming(results: dict, name: str, seconds: float, calls: int = 1) -> None:
+    # seconds: best time for all the calls
+    results['timings'][name] = {
+                                'calls'             : calls,
+                                'seconds'           : seconds,
+                                'seconds per call'  : seconds / calls
+                               }
+
+
+def saveResults(results: dict, filepath: pathlib.Path) -> None:
+    with open(filepath, 'w') as file:
+        json.dump(results, file, indent=2)
+        file.write("\n")
+
+
+def loadResults(filepath: pathlib.Path) -> dict:
+    with open(filepath) as file:
+        return json.load(file)
+
+
+def printResults(results: dict, baseline: dict = None) -> None:
+    # Prints the time per call of every benchmark, and the speedup against baseline if given.
+    baseline_timings = baseline['timings'] if baseline is not None else {}
+    if baseline is not None:
+        print(f"Baseline: revision {baseline['revision']} ({baseline['date']})")
+
+    print(f"{'benchmark':<48}{'per call':>14}{'baseline':>14}{'speedup':>10}")
+    for name, timing in results['timings'].items():
+        per_call = timing['seconds per call']
+        line = f"{name:<48}{formatSeconds(per_call):>14}"
+        if name in baseline_timings:
+            baseline_per_call = baseline_timings[name]['seconds per call']
+            line += f"{formatSeconds(baseline_per_call):>14}{baseline_per_call / per_call:>9.2f}x"
+        print(line)
+
+
+def formatSeconds(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
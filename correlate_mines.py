@@ -0,0 +1,124 @@
+#!/bin/python3
+
+# Library imports
+import argparse
+import pathlib
+import textwrap
+import sys
+import time
+
+# Local imports
+from src.constants import MINES_COLUMN_MAP
+from src.exit_codes import ExitCode
+from src.filesystem_utils import writeFileAtomically
+from src.lazy_import import lazyImport
+from src.logger import log, LogLevel, LogFormat, info, warning, success, error, debug
+
+# Only loaded once the arguments are parsed (not for -h)
+correlation = lazyImport("src.correlation")
+mines = lazyImport("src.mines")
+
+# Number of lines listed for each contact with conflicting reference numbers
+CONFLICT_LINES_SHOWN = 10
+
+
+def usage():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent(
+        '''
+        Links the detections of a Mines.csv file that report the same contact (detections whose
+        circles of error overlap), and fills in their empty contact and mine reference numbers
+        from the other detections of the contact (or with new numbers).
+
+        By default, the numbers are only printed: use --write or --output to fill them in.
+        '''
+        ),
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('mines_file',
+                        type=pathlib.Path,
+                        help='Path to the file containing the CSV mines data')
+    parser.add_argument('-w',
+                        '--write',
+                        action='store_true',
+                        help='Fill in the reference numbers in the mines file itself')
+    parser.add_argument('-o',
+                        '--output',
+                        type=pathlib.Path,
+                        help='Write the mines file with the reference numbers filled in to this file')
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='store_true',
+                        help='Print debug information')
+    parser.add_argument('-q',
+                        '--quiet',
+                        action='store_true',
+                        help='Quiet mode (only print errors)')
+    parser.add_argument('--log-format',
+                        type=LogFormat,
+                        choices=list(LogFormat),
+                        default=LogFormat.Console,
+                        help='Format of the messages: coloured console lines, or one JSON object per line '
+                             '(time, level, logger, pid, message) for other programs (default: console)')
+
+    args = parser.parse_args()
+
+    if args.write and args.output is not None:
+        parser.error("--write and --output cannot be used together")
+
+    return args
+
+
+def main():
+    args = usage()
+
+    if args.verbose:
+        log.setLogLevel(LogLevel.Debug)
+    elif args.quiet:
+        log.setLogLevel(LogLevel.Quiet)
+    log.setLogFormat(args.log_format)
+
+    if not args.mines_file.exists():
+        error(f"'{args.mines_file}' does not exist.")
+        sys.exit(ExitCode.Failure)
+
+    try:
+        table = correlation.MinesTable(args.mines_file)
+    except mines.MinesFileError as e:
+        error(f"Invalid mines file: {e}")
+        sys.exit(ExitCode.Failure)
+
+    start = time.perf_counter()
+    contacts = correlation.findContacts(table.mines)
+    fills, conflicts = correlation.correlateContacts(table.mines, contacts)
+    debug("Correlated %d detection(s) in %.3fs.", len(table.mines), time.perf_counter() - start)
+
+    for column, contact, values in conflicts:
+        lines = ", ".join(f"{table.line_numbers[index]}" for index in contact[:CONFLICT_LINES_SHOWN])
+        if len(contact) > CONFLICT_LINES_SHOWN:
+            lines += f" (and {len(contact) - CONFLICT_LINES_SHOWN} more)"
+        warning(f"Lines {lines} report the same contact with different {MINES_COLUMN_MAP[column]}s "
+                f"({', '.join(values)}) - left as they are.")
+
+    output = args.mines_file if args.write else args.output
+    # The numbers are listed when they are not written (or in verbose mode)
+    show = info if output is None else debug
+    listed = output is None or log.isEnabled(LogLevel.Debug)
+    for index, column, value in fills:
+        if listed:
+            show(f"Line {table.line_numbers[index]} ({table.mines[index].type}): {MINES_COLUMN_MAP[column]} {value}")
+        table.setValue(index, column, value)
+
+    info(f"{len(table.mines)} detection(s) of {len(contacts)} contact(s): "
+         f"{len(fills)} reference number(s) to fill in, {len(conflicts)} conflict(s).")
+    if output is None:
+        if len(fills) > 0:
+            info("Use --write (or --output) to fill them in.")
+        return
+
+    writeFileAtomically(output, table.text())
+    success(f"Wrote {output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,7 @@ from src.constants import FOLDER_NAME_DATA, \
 from src.filesystem_utils import createDirectoryIfNecessary, \
                                  createFileWithContent, \
                                  copyFileIfPossible
-from src.logger import log, LogLevel, info, error, success
+from src.logger import log, LogLevel, LogFormat, info, error, success
 from src.exit_codes import ExitCode
 from src.templates import parameterTemplate
 
@@ -80,6 +80,12 @@ def usage():
                         '--quiet',
                         action='store_true',
                         help='Quiet mode (only print errors)')
+    parser.add_argument('--log-format',
+                        type=LogFormat,
+                        choices=list(LogFormat),
+                        default=LogFormat.Console,
+                        help='Format of the messages: coloured console lines, or one JSON object per line '
+                             '(time, level, logger, pid, message) for other programs (default: console)')
 
     args = parser.parse_args()
 
@@ -93,6 +99,7 @@ def main():
         log.setLogLevel(LogLevel.Debug)
     elif args.quiet:
         log.setLogLevel(LogLevel.Quiet)
+    log.setLogFormat(args.log_format)
 
     top_directory = pathlib.Path(args.directory).resolve()
     if not top_directory.exists():
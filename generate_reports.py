@@ -2,27 +2,28 @@
 
 # Library imports
 import argparse
-import configparser
-import csv
+import contextlib
+import glob
+import os
 import pathlib
 import textwrap
 import sys
 
 # Local imports
-from src.constants import FILENAME_ESTIMATED_STATE_CSV, \
-                          FILENAME_MINES_CSV, \
-                          FILENAME_PARAMETERS, \
-                          FILENAME_NUMBER_CACHE_FILE, \
-                          FOLDER_NAME_DATA, \
-                          FOLDER_NAME_REPORTS, \
-                          PARAMETER_SECTION_MAP
-from src.create_report import create_report
-from src.datatypes import ReportType
-from src.filesystem_utils import readDictFromFileIfPossible, \
-                                 createFileWithContent, \
-                                 createDirectoryIfNecessary
-from src.exit_codes import ExitCode
-from src.logger import Logger, LogLevel, log, success, info, warning, error, debug
+from src.constants import FILENAME_NUMBER_CACHE_FILE, \
+                          FILENAME_SERIAL_REGISTRY
+from src.datatypes import ReportType, DecimationStrategy
+from src.exit_codes import ExitCode, FailureError
+from src.lazy_import import lazyImport
+from src.logger import Logger, LogLevel, LogFormat, log, success, info, warning, error
+from src import profiling
+
+# Only loaded once the arguments are parsed (not for -h), and only what the run needs
+# (e.g. batch and watch pull in the process pool and inotify).
+batch = lazyImport("src.batch")
+serial_registry = lazyImport("src.serial_registry")
+tasks = lazyImport("src.tasks")
+watch = lazyImport("src.watch")
 
 
 def usage():
@@ -30,22 +31,40 @@ def usage():
         description=textwrap.dedent(
         '''
         Generates the APP-11 reports for a specified area and task.
+
+        The element, area and task can also be glob patterns (e.g. TE4 'MW*' '*'),
+        or --all can be used, to generate the reports of several tasks in parallel.
         '''
         ),
     formatter_class=argparse.RawDescriptionHelpFormatter)
 
     parser.add_argument('element',
                         type=str,
+                        nargs='?',
                         help='Tasking element (TE) for which to generate the report (e.g. TE4)')
     parser.add_argument('area',
                         type=str,
+                        nargs='?',
                         help='Area for which to generate the report (e.g. MWD)')
     parser.add_argument('task',
                         type=str,
+                        nargs='?',
                         help='Task number for which to generate the report (e.g. EH01)')
     parser.add_argument('directory',
                         type=str,
+                        nargs='?',
                         help='Top level directory in which to generate the folders')
+    parser.add_argument('--all',
+                        type=str,
+                        metavar='DIRECTORY',
+                        help='Generate the reports of every task found in this top level directory '
+                             '(instead of specifying element, area, task and directory)')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of tasks to generate in parallel, or for a single task, number of processes '
+                             'formatting large mine detection files (default: number of CPUs)')
     parser.add_argument('-v',
                         '--verbose',
                         action='store_true',
@@ -54,120 +73,156 @@ def usage():
                         '--quiet',
                         action='store_true',
                         help='Quiet mode (only print errors)')
+    parser.add_argument('--log-format',
+                        type=LogFormat,
+                        choices=list(LogFormat),
+                        default=LogFormat.Console,
+                        help='Format of the messages: coloured console lines, or one JSON object per line '
+                             '(time, level, logger, pid, message) for other programs (default: console)')
     parser.add_argument('--only',
                         type=ReportType,
                         choices=list(ReportType),
                         help='If specified, only generate report for this type')
+    parser.add_argument('-f',
+                        '--force',
+                        action='store_true',
+                        help='Regenerate all reports, even those whose inputs did not change since the last run')
     parser.add_argument('--start-number',
                         type=int,
                         help='If specified, use this number as start number instead of the next available from cache')
+    parser.add_argument('--decimation',
+                        type=DecimationStrategy,
+                        choices=list(DecimationStrategy),
+                        help='If specified, TRCKHIST decimation strategy to use instead of the one in the parameters file')
+    parser.add_argument('--profile',
+                        choices=['time', 'memory'],
+                        nargs='?',
+                        const='memory',
+                        help='Print the time, number of rows and peak memory of each stage '
+                             '(memory tracking slows the run down: use --profile time for accurate times)')
+    parser.add_argument('--cprofile',
+                        type=str,
+                        metavar='FILE',
+                        help='Write a cProfile dump of the run to this file (see python -m pstats)')
+    parser.add_argument('--tracemalloc',
+                        type=str,
+                        metavar='FILE',
+                        help='Write a tracemalloc snapshot of the memory allocated at the end of the run to this file')
+    parser.add_argument('-w',
+                        '--watch',
+                        action='store_true',
+                        help='Keep running, and regenerate the reports of the tasks whose input files change '
+                             '(new tasks are picked up too)')
+    parser.add_argument('--poll',
+                        action='store_true',
+                        help='In watch mode, scan the data directories periodically instead of using inotify '
+                             '(e.g. on network file systems)')
+    parser.add_argument('--decimation-threshold',
+                        type=float,
+                        help='If specified, main threshold of the decimation strategy '
+                             '(time: s, distance: m, change: heading deg, douglas-peucker: m)')
 
     args = parser.parse_args()
 
-    return args
-
+    positionals = [args.element, args.area, args.task, args.directory]
+    if args.all is not None:
+        if any(positional is not None for positional in positionals):
+            parser.error("element, area, task and directory cannot be used with --all")
+        args.element, args.area, args.task, args.directory = "*", "*", "*", args.all
+    elif any(positional is None for positional in positionals):
+        parser.error("the following arguments are required: element, area, task, directory")
 
-def parseCsv(filepath: str) -> list:
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
 
-    data = []
+    if args.watch and args.start_number is not None:
+        parser.error("--start-number cannot be used with --watch")
+    if args.poll and not args.watch:
+        parser.error("--poll can only be used with --watch")
 
-    with open(filepath, newline='') as csvfile:
-        reader = csv.reader(csvfile, delimiter=',')
-        for row in reader:
-            data.append(row)
+    # Stages run in other processes could not be measured
+    if args.profile is not None or args.cprofile is not None or args.tracemalloc is not None:
+        args.jobs = 1
 
-    # Remove the first row, which contains the column names
-    if len(data) > 0:
-        data.pop(0)
-
-    return data
-
-
-def get_cache_dict(cache_file: pathlib.Path) -> dict:
-    return readDictFromFileIfPossible(cache_file)
+    return args
 
 
-def hasNumber(cache_dict: dict, area: str, task: str):
-    number_list = []
-    found = False
-    for key in cache_dict:
-        if key == area:
-            field = cache_dict[key]
-            for subkey in field:
-                if subkey == task:
-                    found = True
-                    number_list = field[subkey]
-    return found, number_list
+def isPattern(name: str) -> bool:
+    return glob.has_magic(name)
 
 
-def maxNumber(cache_dict: dict) -> int:
-    max_number = 0
-    for key in cache_dict:
-        field = cache_dict[key]
-        for subkey in field:
-            number = max(field[subkey])
-            if number > max_number:
-                max_number = number
-    return max_number
+@contextlib.contextmanager
+def openRegistry(top_directory: pathlib.Path):
+    # Only opened (and created, or migrated from the old number cache) once the tasks are
+    # known to be valid, so that a mistyped task leaves the top level directory untouched.
+    with serial_registry.SerialRegistry(top_directory / FILENAME_SERIAL_REGISTRY) as registry:
+        serial_registry.migrateNumberCache(registry, top_directory / FILENAME_NUMBER_CACHE_FILE)
+        yield registry
 
 
-def getReportStartNumber(cache_dict: dict, area: str, task: str) -> int:
-    has_number, report_numbers = hasNumber(cache_dict, area, task)
-    if not has_number:
-        report_start_number = maxNumber(cache_dict) + 1
-    else:
-        report_start_number = report_numbers[0]
-    debug(f"Report start number: {report_start_number}")
-    return has_number, report_start_number
+def generateSingleTask(args, top_directory: pathlib.Path, options: dict):
+    data_directory = tasks.getDataDirectory(top_directory, args.element, args.area, args.task)
 
+    message = tasks.checkTaskFiles(data_directory)
+    if message is not None:
+        error(message)
+        info("Create it, and try again.")
+        sys.exit(ExitCode.Failure)
 
-def getParams(data_directory: pathlib.Path) -> dict:
-    params = configparser.ConfigParser()
-    params.read(data_directory / FILENAME_PARAMETERS)
-    return params
+    count = tasks.countReports(top_directory, args.element, args.area, args.task)
+    with openRegistry(top_directory) as registry:
+        _, report_start_number = registry.reserve(args.area, args.task, count, args.start_number)
 
+    if args.start_number is not None:
+        report_start_number = args.start_number
 
-def getReportTypes(params: dict) -> list:
-    report_types = []
-    for key in PARAMETER_SECTION_MAP.keys():
-        if key in params:
-            report_types.append(PARAMETER_SECTION_MAP[key])
-    return report_types
+    tasks.generateTask(top_directory,
+                       args.element,
+                       args.area,
+                       args.task,
+                       report_start_number,
+                       options)
 
+    success("APP-11 reports generated successfully.")
 
-def getData(params: dict) -> dict:
-    data = {}
-    data['area']                = params['GENERAL']['Area']
-    data['task']                = params['GENERAL']['Task Order Number']
-    data['originator']          = params['GENERAL']['Originator']
-    data['destination']         = params['GENERAL']['Destination']
-    data['reference utc']       = params['GENERAL']['Reference UTC Datetime']
 
-    data['start utc']           = params['START']['Start UTC Datetime']
-    data['etc utc']             = params['START']['Estimated Completion UTC Datetime']
-    data['start comments']      = params['START']['Comments']
+def generateAllTasks(args, top_directory: pathlib.Path, options: dict):
+    if args.start_number is not None:
+        error("--start-number cannot be used when generating several tasks.")
+        sys.exit(ExitCode.Failure)
 
-    data['stop utc']            = params['STOP']['Stop UTC Datetime']
-    data['stop progress']       = params['STOP']['Progress']
-    data['stop comments']       = params['STOP']['Comments']
+    matching_tasks = tasks.findTasks(top_directory, args.element, args.area, args.task)
+    if len(matching_tasks) == 0:
+        error(f"No task matching '{args.element}/{args.area}/{args.task}' found in '{top_directory}'.")
+        sys.exit(ExitCode.Failure)
+    info(f"Found {len(matching_tasks)} task(s).")
+
+    valid_tasks = []
+    results = {}
+    for task in matching_tasks:
+        element, area, task_number = task
+        message = tasks.checkTaskFiles(tasks.getDataDirectory(top_directory, element, area, task_number))
+        if message is not None:
+            results[task] = FileNotFoundError(message)
+        else:
+            valid_tasks.append(task)
 
-    data['complete utc']        = params['COMPLETE']['Complete UTC Datetime']
-    data['complete comments']   = params['COMPLETE']['Comments']
+    # Allocate the serial numbers up front, in the (sorted) task order,
+    # so that they do not depend on the order in which the workers finish.
+    # NOTE: the numbers of a task that fails stay allocated to it for the next run.
+    start_numbers = {}
+    if len(valid_tasks) > 0:
+        with openRegistry(top_directory) as registry:
+            for element, area, task_number in valid_tasks:
+                count = tasks.countReports(top_directory, element, area, task_number)
+                _, start_numbers[(element, area, task_number)] = registry.reserve(area, task_number, count)
 
-    return data
+    results.update(batch.runTasks(top_directory, valid_tasks, start_numbers, options, args.jobs))
 
+    if not batch.summarize(results):
+        sys.exit(ExitCode.Failure)
 
-def getAdditionalData(data: dict,
-                      report_type: ReportType,
-                      data_directory: pathlib.Path,
-                      add_extended_mcmpedat: bool) -> dict:
-    if report_type == ReportType.Complete:
-        if add_extended_mcmpedat:
-            debug("Parsing estimated state data...")
-            data['estimated state data'] = parseCsv(data_directory / FILENAME_ESTIMATED_STATE_CSV)
-        debug("Parsing mine detection data...")
-        data['mine data'] = parseCsv(data_directory / FILENAME_MINES_CSV)
-    return data
+    success("APP-11 reports generated successfully.")
 
 
 def main():
@@ -177,75 +232,50 @@ def main():
         log.setLogLevel(LogLevel.Debug)
     elif args.quiet:
         log.setLogLevel(LogLevel.Quiet)
+    log.setLogFormat(args.log_format)
 
     info("Generating APP-11 reports...")
 
     top_directory = pathlib.Path(args.directory).resolve()
-    data_directory = top_directory  / FOLDER_NAME_DATA / args.element / args.area / args.task / FOLDER_NAME_DATA
-    reports_path = top_directory / FOLDER_NAME_REPORTS
-    reports_directory = reports_path / args.element / args.area / args.task
-    param_data_file = data_directory / FILENAME_PARAMETERS
-    mines_data_file = data_directory / FILENAME_MINES_CSV
-    number_cache_file = top_directory / FILENAME_NUMBER_CACHE_FILE
 
     if not top_directory.exists():
         error(f"Directory '{top_directory}' does not exist.")
         info("Create it, and try again.")
         sys.exit(ExitCode.Failure)
 
-    if not (param_data_file).exists():
-        error(f"Directory '{data_directory}' does not contain a file '{FILENAME_PARAMETERS}'.")
-        info("Create it, and try again.")
-        sys.exit(ExitCode.Failure)
-
-    if not (mines_data_file).exists():
-        error(f"Directory '{data_directory}' does not contain a file '{FILENAME_MINES_CSV}'.")
-        info("Create it, and try again.")
+    options = {
+               'only'                   : args.only,
+               'force'                  : args.force,
+               'jobs'                   : args.jobs,
+               'watch'                  : args.watch,
+               'decimation'             : args.decimation,
+               'decimation threshold'   : args.decimation_threshold
+              }
+
+    try:
+        with profiling.dumps(args.cprofile, args.tracemalloc):
+            if args.profile is not None:
+                profiling.enable(track_memory=args.profile == 'memory')
+
+            if args.watch:
+                with openRegistry(top_directory) as registry:
+                    watch.watchTasks(top_directory, args.element, args.area, args.task, registry, options, args.poll)
+            elif any(isPattern(name) for name in (args.element, args.area, args.task)):
+                generateAllTasks(args, top_directory, options)
+            else:
+                generateSingleTask(args, top_directory, options)
+    # Not the error classes of the lazy modules: resolving them would import these modules
+    # (and numpy) on every exception going through, SystemExit and KeyboardInterrupt included
+    except FailureError as e:
+        error(f"{e}")
         sys.exit(ExitCode.Failure)
-
-    if not number_cache_file.exists():
-        debug(f"No number cache file found - creating...")
-        createFileWithContent(top_directory / FILENAME_NUMBER_CACHE_FILE, "")
-
-    if not reports_directory.exists():
-        createDirectoryIfNecessary(reports_directory)
-        debug(f"No reports directory found - creating...")
-
-    params = getParams(data_directory)
-    report_types = getReportTypes(params)
-    data = getData(params)
-    cache_dict = get_cache_dict(number_cache_file)
-    has_number, report_start_number = getReportStartNumber(cache_dict, args.area, args.task)
-
-    if args.start_number is not None:
-        report_start_number = args.start_number
-    else:
-        report_start_number = report_start_number
-
-    report_number = report_start_number
-    report_numbers = []
-    for report in report_types:
-        info(f"Generating {report} report with number {report_number}...")
-        data["message serial number"] = report_number
-        data = getAdditionalData(data, report, data_directory, False)
-        create_report(report,
-                      data,
-                      reports_directory,
-                      False,
-                      False,
-                      False)
-        report_numbers.append(report_number)
-        report_number += 1
-
-    if not has_number:
-        new_pair = {args.task: report_numbers}
-        if cache_dict.get(args.area) is None:
-            cache_dict[args.area] = new_pair
-        else:
-            cache_dict[args.area][args.task] = report_numbers
-        createFileWithContent(number_cache_file, str(cache_dict), True)
-
-    success("APP-11 reports generated successfully.")
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+        info("Stopped watching.")
+    finally:
+        if profiling.isEnabled():
+            profiling.printReport()
 
 
 if __name__ == "__main__":
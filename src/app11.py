@@ -5,6 +5,8 @@ import math
 import textwrap
 
 # Local imports
+from src.app11_schema import SetSchema, \
+                             Field
 from src.constants import NMW_TQ_MAP, \
                           NMW_TQ_SECOND_MAP, \
                           MSG_ID_MAP
@@ -59,16 +61,147 @@ def end() -> str:
     return "BT\n"
 
 
+# Layout of the APP-11 sets (see src/app11_schema.py)
+# NOTE: DTGs are always 14 characters long (e.g. 150810ZSEP2024)
+DTG_LENGTH = 14
+
+EXER_SET        = SetSchema("EXER", [Field("exercise nickname")])
+
+MSGID_SET       = SetSchema("MSGID", ["OPREP NWM", "APP-11(E)", "1",
+                                      Field("originator"),
+                                      Field("message serial number"),
+                                      "SEP",
+                                      Field("message qualifier"),
+                                      "-", "NATO", "UNCLASSIFIED"])
+
+REF_SET         = SetSchema("REF", [Field("serial letter"),
+                                    "TYPE:MSG",
+                                    Field("information product"),
+                                    Field("originator"),
+                                    Field("datetime")])
+
+REF_DOC_SET     = SetSchema("REF", [Field("serial letter"),
+                                    "TYPE:DOC",
+                                    Field("document"),
+                                    Field("originator"),
+                                    Field("date")])
+
+GEODATUM_SET    = SetSchema("GEODATUM", [Field("geodetic datum")])
+
+NMWREPQ_SET     = SetSchema("NMWREPQ", ["TASKREP",
+                                        Field("time qualifier")])
+
+HEADING_SET     = SetSchema("HEADING", [Field("heading")])
+
+MTASKREP_SET    = SetSchema("MTASKREP", [Field("area and task"),
+                                         Field("originator"),
+                                         "-",
+                                         Field("start time qualifier"),
+                                         Field("start utc", max_length=DTG_LENGTH),
+                                         Field("second time qualifier"),
+                                         Field("second utc", max_length=DTG_LENGTH)])
+
+MCMPEDAT_SHORT_SET = SetSchema("MCMPEDAT", [Field("area and task"),
+                                            Field("progress")])
+
+MCMPEDAT_SET    = SetSchema("MCMPEDAT", [Field("area and task"),
+                                         Field("completion"),
+                                         "-",
+                                         Field("characteristic width", suffix="M"),
+                                         "-",
+                                         Field("classification probability"),
+                                         "-", "1", "-", "-",
+                                         Field("probability undetected due to burial"),
+                                         Field("probability undetected due to seabed"),
+                                         Field("track info", repeating=True)],
+                            terminator="//\n\n")
+
+TRCKHIST_SET    = SetSchema("TRCKHIST", [Field("equipment"),
+                                         Field("utc", max_length=DTG_LENGTH),
+                                         Field("fix"),
+                                         Field("sensor altitude"),
+                                         Field("speed"),
+                                         Field("heading")])
+
+MILECREP_SET    = SetSchema("MILECREP", [Field("utc", max_length=DTG_LENGTH),
+                                         "WGE",
+                                         Field("fix"),
+                                         Field("circular error probability"),
+                                         Field("sonar type"),
+                                         Field("comment"),
+                                         Field("image name", optional=True)])
+
+MILCOREP_SET    = SetSchema("MILCOREP", [Field("contact reference number"),
+                                         Field("utc", max_length=DTG_LENGTH),
+                                         "WGE",
+                                         Field("fix"),
+                                         Field("circular error probability"),
+                                         Field("sonar type"),
+                                         Field("sonar confidence level"),
+                                         "-",
+                                         Field("comment"),
+                                         Field("image name", optional=True)])
+
+NONMILCOREP_SET = SetSchema("NONMILCOREP", MILCOREP_SET.fields)
+
+MDETREP_SET     = SetSchema("MDETREP", ["SIGHTED",
+                                        Field("detection means"),
+                                        Field("utc", max_length=DTG_LENGTH),
+                                        Field("unit type"),
+                                        Field("unit name"),
+                                        "WGE",
+                                        Field("fix"),
+                                        Field("circular error probability"),
+                                        "-",
+                                        Field("amplifying info")])
+
+MINEINFO_SET    = SetSchema("MINEINFO", [Field("mine reference number"),
+                                         Field("utc", max_length=DTG_LENGTH),
+                                         "WGE",
+                                         Field("fix"),
+                                         Field("circular error probability"),
+                                         Field("mine status identifier"),
+                                         Field("mine case"),
+                                         "-", "-", "-",
+                                         Field("mine identity"),
+                                         Field("identification method"),
+                                         Field("mine depth"),
+                                         "-", "-", "-", "-",
+                                         Field("image name", optional=True)])
+
+NOMBOINFO_SET   = SetSchema("NOMBOINFO", [Field("contact reference number"),
+                                          Field("utc", max_length=DTG_LENGTH),
+                                          "WGE",
+                                          Field("fix"),
+                                          Field("circular error probability"),
+                                          Field("nombo identification"),
+                                          Field("identification method"),
+                                          Field("image name", optional=True)])
+
+NARR_SET        = SetSchema("NARR", [Field("time in water", suffix="H"),
+                                     Field("pma detection and processing time", suffix="H"),
+                                     Field("pma classification and processing time", suffix="H"),
+                                     Field("pma recovery and processing time", suffix="H")])
+
+GENTEXT_SET     = SetSchema("GENTEXT", ["COMMENTS",
+                                        Field("free text")])
+
+# Map of set name to its layouts (several for the sets written in different forms)
+SET_SCHEMA_MAP = {}
+for schema in [EXER_SET, MSGID_SET, REF_SET, REF_DOC_SET, GEODATUM_SET, NMWREPQ_SET, HEADING_SET,
+               MTASKREP_SET, MCMPEDAT_SHORT_SET, MCMPEDAT_SET, TRCKHIST_SET, MILECREP_SET, MILCOREP_SET,
+               NONMILCOREP_SET, MDETREP_SET, MINEINFO_SET, NOMBOINFO_SET, NARR_SET, GENTEXT_SET]:
+    SET_SCHEMA_MAP.setdefault(schema.name, []).append(schema)
+
+
 def msgid(originator : str,
           msg_serial_number : str,
           report_type : str) -> str:
     # TODO: handle other qualifiers in field 7 (e.g. follow-up, final, etc...)
 
-    return "MSGID/OPREP NWM/APP-11(E)/1/{}/{}/SEP/{}/-/NATO/UNCLASSIFIED//\n" \
-            .format(originator,
-                    msg_serial_number,
-                    MSG_ID_MAP[report_type]
-                    )
+    return MSGID_SET.format(originator,
+                            msg_serial_number,
+                            MSG_ID_MAP[report_type])
 
 
 def ref(serial_letter: str,
@@ -76,16 +209,14 @@ def ref(serial_letter: str,
         originator : str,
         datetime: str) -> str:
 
-    return "REF/{}/TYPE:MSG/{}/{}/{}//\n" \
-            .format(serial_letter,
-                    information_product,
-                    originator,
-                    datetime)
+    return REF_SET.format(serial_letter,
+                          information_product,
+                          originator,
+                          datetime)
 
 
 def nmwrepq(nmw_time_qualifier: str) -> str:
-    return "NMWREPQ/TASKREP/{}//\n" \
-            .format(nmw_time_qualifier)
+    return NMWREPQ_SET.format(nmw_time_qualifier)
 
 
 def mtaskrep(area : str,
@@ -95,243 +226,68 @@ def mtaskrep(area : str,
              start_utc : str,
              second_utc : str) -> str:
 
-    return "MTASKREP/{}-{}/{}/-/{}/{}/{}/{}//\n" \
-            .format(area,
-                    task,
-                    originator,
-                    NMW_TQ_MAP[ReportType.Start],
-                    start_utc,
-                    NMW_TQ_SECOND_MAP[report_type],
-                    second_utc)
+    return MTASKREP_SET.format("{}-{}".format(area, task),
+                               originator,
+                               NMW_TQ_MAP[ReportType.Start],
+                               start_utc,
+                               NMW_TQ_SECOND_MAP[report_type],
+                               second_utc)
 
 
 def mcmpedat_short(area : str,
                    task : str,
                    progress : int) -> str:
 
-    return "MCMPEDAT/{}-{}/{}//\n" \
-           .format(area, task, progress)
+    return MCMPEDAT_SHORT_SET.format("{}-{}".format(area, task), progress)
 
 
 
 def mcmpedat(area : str,
              task : str,
+             completion : int,
              characteristic_width : int,
              classification_probability : float,
              probability_undetected_due_to_burial : float,
              probability_undetected_due_to_seabed : float,
-             number_of_tracks : int,
-             track_spacing : float) -> str:
+             tracks : list) -> str:
 
-    # NOTE:
-    # this function makes assumptions:
-    #  - only 1 run per track
-    #  - completion is always 100%
-    # obviously this is not correct all the time, but for us it is and this simplifies things
+    # tracks: (distance to the centre line in m, number of runs) of each track
+    # (see src/survey_legs.py)
 
-    if (number_of_tracks == 0):
+    if (len(tracks) == 0):
         return ""
 
-    track_info = ""
-    for i in range(0, number_of_tracks):
-         dist_to_center_line = ((number_of_tracks - 1) / 2 - i) * track_spacing
-         qualifier = "PS" if (dist_to_center_line >= 0) else "MS"
-         dist_to_center_line = abs(dist_to_center_line)
-         track_info += "{}{}M/1/1".format(qualifier, int(round(dist_to_center_line)))
-         if (i < number_of_tracks - 1):
-             track_info += "/"
-
-    return "MCMPEDAT/{}-{}/100/-/{}M/-/{}/-/1/-/-/{}/{}/{}//\n\n" \
-           .format(area,
-                   task,
-                   characteristic_width,
-                   classification_probability,
-                   probability_undetected_due_to_burial,
-                   probability_undetected_due_to_seabed,
-                   track_info)
-
-
-def trckhist(equipment: str,
-             utc: str,
-             fix: str,
-             sensor_altitude: str,
-             speed: str,
-             heading: str) -> str:
-
-    return "TRCKHIST/{}/{}/{}/{}/{}/{}//\n" \
-            .format(equipment,
-                    utc,
-                    fix,
-                    sensor_altitude,
-                    speed,
-                    heading)
-
-
-def milecrep(utc: str,
-             fix: str,
-             circular_error_probability: str,
-             sonar_type: str,
-             comment: str,
-             image_name: str) -> str:
-
-    if image_name == "":
-        return "MILECREP/{}/WGE/{}/{}/{}/{}//\n" \
-               .format(utc,
-                       fix,
-                       circular_error_probability,
-                       sonar_type,
-                       comment)
-
-    return "MILECREP/{}/WGE/{}/{}/{}/{}/{}//\n" \
-           .format(utc,
-                   fix,
-                   circular_error_probability,
-                   sonar_type,
-                   comment,
-                   image_name)
-
-
-def milcorep(contact_reference_number: str,
-             utc: str,
-             fix: str,
-             circular_error_probability: str,
-             sonar_type: str,
-             sonar_confidence_level: str,
-             comment: str,
-             image_name: str) -> str:
-
-    if image_name == "":
-        return "MILCOREP/{}/{}/WGE/{}/{}/{}/{}/-/{}//\n" \
-               .format(contact_reference_number,
-                       utc,
-                       fix,
-                       circular_error_probability,
-                       sonar_type,
-                       sonar_confidence_level,
-                       comment)
-
-    return "MILCOREP/{}/{}/WGE/{}/{}/{}/{}/-/{}/{}//\n" \
-           .format(contact_reference_number,
-                   utc,
-                   fix,
-                   circular_error_probability,
-                   sonar_type,
-                   sonar_confidence_level,
-                   comment,
-                   image_name)
-
-
-def nonmilcorep(contact_reference_number: str,
-                utc: str,
-                fix: str,
-                circular_error_probability: str,
-                sonar_type: str,
-                sonar_confidence_level,
-                comment: str,
-                image_name: str) -> str:
-
-    if image_name == "":
-        return "NONMILCOREP/{}/{}/WGE/{}/{}/{}/{}/-/{}//\n" \
-               .format(contact_reference_number,
-                       utc,
-                       fix,
-                       circular_error_probability,
-                       sonar_type,
-                       sonar_confidence_level,
-                       comment)
-
-    return "NONMILCOREP/{}/{}/WGE/{}/{}/{}/{}/-/{}/{}//\n" \
-           .format(contact_reference_number,
-                   utc,
-                   fix,
-                   circular_error_probability,
-                   sonar_type,
-                   sonar_confidence_level,
-                   comment,
-                   image_name)
-
-
-def mdetrep(detection_means: str,
-            utc: str,
-            unit_type: str,
-            unit_name: str,
-            fix: str,
-            circular_error_probability: str,
-            amplifying_info: str) -> str:
-
-    return "MDETREP/SIGHTED/{}/{}/{}/{}/WGE/{}/{}/-/{}//\n" \
-           .format(detection_means,
-                   utc,
-                   unit_type,
-                   unit_name,
-                   fix,
-                   circular_error_probability,
-                   amplifying_info)
-
-
-def mineinfo(mine_reference_number : str,
-             utc : str,
-             fix : str,
-             circular_error_probability : str,
-             mine_status_identifier : str,
-             mine_case : str,
-             mine_identity : str,
-             identification_method : str,
-             mine_depth : str,
-             image_name : str
-             ) -> str:
-
-    if image_name == "":
-        return "MINEINFO/{}/{}/WGE/{}/{}/{}/{}/-/-/-/{}/{}/{}/-/-/-/-//\n" \
-               .format(mine_reference_number,
-                       utc,
-                       fix,
-                       circular_error_probability,
-                       mine_status_identifier,
-                       mine_case,
-                       mine_identity,
-                       identification_method,
-                       mine_depth)
-
-    return "MINEINFO/{}/{}/WGE/{}/{}/{}/{}/-/-/-/{}/{}/{}/-/-/-/-/{}//\n" \
-           .format(mine_reference_number,
-                   utc,
-                   fix,
-                   circular_error_probability,
-                   mine_status_identifier,
-                   mine_case,
-                   mine_identity,
-                   identification_method,
-                   mine_depth,
-                   image_name)
-
-
-def nomboinfo(contact_reference_number : str,
-              utc : str,
-              fix : str,
-              circular_error_probability : str,
-              nombo_identification : str,
-              identification_method : str,
-              image_name : str
-              ) -> str:
-
-    if image_name == "":
-        return "NOMBOINFO/{}/{}/WGE/{}/{}/{}/{}//\n" \
-               .format(contact_reference_number,
-                       utc,
-                       fix,
-                       circular_error_probability,
-                       nombo_identification,
-                       identification_method)
-
-    return "NOMBOINFO/{}/{}/WGE/{}/{}/{}/{}/{}//\n" \
-           .format(contact_reference_number,
-                   utc,
-                   fix,
-                   circular_error_probability,
-                   nombo_identification,
-                   identification_method,
-                   image_name)
+    track_info = "/".join(["{}{}M/{}/1".format("PS" if (dist_to_center_line >= 0) else "MS",
+                                               abs(dist_to_center_line),
+                                               runs)
+                           for dist_to_center_line, runs in tracks])
+
+    return MCMPEDAT_SET.format("{}-{}".format(area, task),
+                               completion,
+                               characteristic_width,
+                               classification_probability,
+                               probability_undetected_due_to_burial,
+                               probability_undetected_due_to_seabed,
+                               track_info)
+
+
+# Sets with fixed contents in every report
+exer        = EXER_SET.format
+ref_doc     = REF_DOC_SET.format
+geodatum    = GEODATUM_SET.format
+heading     = HEADING_SET.format
+
+
+# The sets below are written for every contact and every track point: they are the compiled
+# formatters themselves, which take the values of the fields positionally, in the order of the
+# schema (see src/app11_schema.py).
+trckhist    = TRCKHIST_SET.format
+milecrep    = MILECREP_SET.format
+milcorep    = MILCOREP_SET.format
+nonmilcorep = NONMILCOREP_SET.format
+mdetrep     = MDETREP_SET.format
+mineinfo    = MINEINFO_SET.format
+nomboinfo   = NOMBOINFO_SET.format
 
 
 def narr(time_in_water: float,
@@ -339,18 +295,13 @@ def narr(time_in_water: float,
          pma_classification_and_processing_time: float,
          pma_recovery_and_processing_time: float) -> str:
 
-    return "NARR/{}H/{}H/{}H/{}H//\n" \
-           .format(time_in_water,
-                   pma_detection_and_processing_time,
-                   pma_classification_and_processing_time,
-                   pma_recovery_and_processing_time)
+    return NARR_SET.format(time_in_water,
+                           pma_detection_and_processing_time,
+                           pma_classification_and_processing_time,
+                           pma_recovery_and_processing_time)
 
 
 def gentext(free_text : str) -> str:
 
-    if free_text == "":
-        free_text = "-"
-
-    return "GENTEXT/COMMENTS/{}//\n" \
-           .format(free_text)
-
+    # An empty comment is written as the '-' placeholder
+    return GENTEXT_SET.format(free_text)
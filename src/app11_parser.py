@@ -0,0 +1,247 @@
+# Parser of the APP-11 reports written by the generator, and round-trip validation
+# of their sets against the layouts of src/app11.py.
+#
+#   report = parseReport(filepath)      # header and sets, as structured records
+#   errors = validateReport(filepath)   # ["line 12: MILCOREP: 8 fields instead of 9 to 10.", ...]
+#
+# A report is read line by line (a COMPLETE report can have millions of TRCKHIST lines):
+#
+#   R 150810ZSEP2024            header
+#   FM TE4
+#   TO CTU SESIMBRA
+#   INFO EXCON
+#
+#   BT                          begin
+#
+#   NATO UNCLASSIFIED
+#
+#   EXER/REPMUS 2024//          sets (and blank lines)
+#   MSGID/OPREP NWM/...//
+#   ...
+#
+#   BT                          end
+#
+# Every set is parsed with its schema, then formatted back: the result must be the line itself.
+
+# Library imports
+import os
+import re
+
+# Local imports
+from src.app11 import SET_SCHEMA_MAP
+
+
+# Kinds of the lines of a report
+TOKEN_BLANK             = "blank"
+TOKEN_HEADER            = "header"
+TOKEN_BT                = "BT"
+TOKEN_CLASSIFICATION    = "classification"
+TOKEN_SET               = "set"
+TOKEN_TEXT              = "text"
+
+# Map of header line prefix to header key
+HEADER_PREFIX_MAP = {
+                     "R "    : 'datetime',
+                     "FM "   : 'originator',
+                     "TO "   : 'destination',
+                     "INFO " : 'information'
+                    }
+
+CLASSIFICATION = "NATO UNCLASSIFIED"
+
+DTG_PATTERN = re.compile(r"\d{6}Z[A-Z]{3}\d{4}")
+
+# <originator>_<area>-<task>_<time qualifier>_<serial>.txt (see app11.filename)
+REPORT_FILENAME_PATTERN = re.compile(r"(?P<originator>[^_]+)_(?P<area>[^_-]+)-(?P<task>[^_]+)"
+                                     r"_(?P<qualifier>[A-Z]+)_(?P<serial>\d+)\.txt")
+
+
+class Token:
+
+    __slots__ = ('line_number', 'kind', 'text')
+
+    def __init__(self, line_number: int, kind: str, text: str):
+        self.line_number = line_number
+        self.kind = kind
+        self.text = text
+
+
+class SetRecord:
+
+    __slots__ = ('line_number', 'name', 'values')
+
+    def __init__(self, line_number: int, name: str, values: dict):
+        self.line_number = line_number
+        self.name = name
+        # Map of field name (e.g. 'contact_reference_number') to value
+        self.values = values
+
+
+class Report:
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        # Map of header key ('datetime', 'originator', 'destination', 'information') to value
+        self.header = {}
+        self.sets = []
+        # "line N: message" of every error found
+        self.errors = []
+
+
+def tokenKind(line: str) -> str:
+    if line == "":
+        return TOKEN_BLANK
+    if line.endswith("//"):
+        return TOKEN_SET
+    if line == "BT":
+        return TOKEN_BT
+    if line == CLASSIFICATION:
+        return TOKEN_CLASSIFICATION
+    for prefix in HEADER_PREFIX_MAP:
+        if line.startswith(prefix):
+            return TOKEN_HEADER
+    return TOKEN_TEXT
+
+
+def iterTokens(lines):
+    # lines: iterable of lines, with or without their line breaks (e.g. an open file)
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        yield Token(line_number, tokenKind(line), line)
+
+
+def parseSet(line: str) -> tuple:
+    # (schema, values) of a set line (see SetSchema.parse). Raises ValueError
+    # if the line does not match any layout of its set, or does not format back to itself.
+    name = line.split("/", 1)[0]
+    schemas = SET_SCHEMA_MAP.get(name)
+    if schemas is None:
+        raise ValueError(f"unknown set '{name}'.")
+
+    messages = []
+    for schema in schemas:
+        try:
+            values = schema.parse(line)
+        except ValueError as e:
+            messages.append(f"{e}")
+            continue
+
+        formatted = schema.format(*values).rstrip("\n")
+        if formatted != line:
+            raise ValueError(f"{name}: does not format back to the same line ('{formatted}').")
+        return schema, values
+
+    raise ValueError(" / ".join(messages))
+
+
+def iterReportSets(tokens, header: dict, errors: list):
+    # Checks the structure of the report (header, BT, classification, BT), fills in header,
+    # appends the errors found to errors, and yields the tokens of the sets.
+    state = 'header'
+    for token in tokens:
+        kind = token.kind
+
+        if state == 'body':
+            if kind == TOKEN_SET:
+                yield token
+            elif kind == TOKEN_BT:
+                state = 'end'
+            elif kind != TOKEN_BLANK:
+                errors.append(f"line {token.line_number}: unexpected line '{token.text}' (sets end with '//').")
+        elif state == 'header':
+            if kind == TOKEN_HEADER:
+                for prefix, key in HEADER_PREFIX_MAP.items():
+                    if token.text.startswith(prefix):
+                        header[key] = token.text[len(prefix):]
+            elif kind == TOKEN_BT:
+                state = 'begin'
+            elif kind != TOKEN_BLANK:
+                errors.append(f"line {token.line_number}: unexpected line '{token.text}' in the header.")
+        elif state == 'begin':
+            if kind == TOKEN_CLASSIFICATION:
+                state = 'body'
+            elif kind != TOKEN_BLANK:
+                errors.append(f"line {token.line_number}: '{CLASSIFICATION}' expected after BT.")
+                state = 'body'
+                if kind == TOKEN_SET:
+                    yield token
+        elif kind != TOKEN_BLANK:
+            errors.append(f"line {token.line_number}: unexpected line '{token.text}' after the final BT.")
+
+    if state != 'end':
+        errors.append("report does not end with BT.")
+
+
+def checkHeader(header: dict, errors: list) -> None:
+    for key in HEADER_PREFIX_MAP.values():
+        if key not in header:
+            errors.append(f"header: {key} line missing.")
+    if 'datetime' in header and DTG_PATTERN.fullmatch(header['datetime']) is None:
+        errors.append(f"header: '{header['datetime']}' is not a DTG.")
+
+
+def checkConsistency(filename: str, header: dict, fields: dict, errors: list) -> None:
+    # Checks that the header, the filename and the MSGID, NMWREPQ and MTASKREP sets agree.
+    # fields: map of set name to the values of the first set of that name
+    if 'MSGID' not in fields:
+        errors.append("MSGID set missing.")
+        return
+
+    originator, serial = fields['MSGID'][0], fields['MSGID'][1]
+    if 'originator' in header and header['originator'] != originator:
+        errors.append(f"MSGID originator '{originator}' differs from the header ('{header['originator']}').")
+
+    match = REPORT_FILENAME_PATTERN.fullmatch(filename)
+    if match is None:
+        return
+    if match['originator'] != originator:
+        errors.append(f"MSGID originator '{originator}' differs from the filename ('{match['originator']}').")
+    if match['serial'] != serial:
+        errors.append(f"MSGID serial number '{serial}' differs from the filename ('{match['serial']}').")
+    if 'NMWREPQ' in fields and fields['NMWREPQ'][0] != match['qualifier']:
+        errors.append(f"NMWREPQ time qualifier '{fields['NMWREPQ'][0]}' "
+                      f"differs from the filename ('{match['qualifier']}').")
+    area_and_task = f"{match['area']}-{match['task']}"
+    if 'MTASKREP' in fields and fields['MTASKREP'][0] != area_and_task:
+        errors.append(f"MTASKREP area and task '{fields['MTASKREP'][0]}' differs from the filename ('{area_and_task}').")
+
+
+def readReport(filepath, on_set) -> tuple:
+    # Reads the report, calling on_set(token, schema, values) for every valid set.
+    # Returns (header, errors).
+    header = {}
+    errors = []
+    fields = {}
+    with open(filepath) as file:
+        for token in iterReportSets(iterTokens(file), header, errors):
+            try:
+                schema, values = parseSet(token.text)
+            except ValueError as e:
+                errors.append(f"line {token.line_number}: {e}")
+                continue
+            fields.setdefault(schema.name, values)
+            on_set(token, schema, values)
+
+    checkHeader(header, errors)
+    checkConsistency(os.path.basename(filepath), header, fields, errors)
+    return header, errors
+
+
+def validateReport(filepath) -> list:
+    # Errors found in the report ("line N: message"), empty if it is valid
+    _, errors = readReport(filepath, lambda token, schema, values: None)
+    return errors
+
+
+def parseReport(filepath) -> Report:
+    report = Report(filepath)
+
+    def addSet(token: Token, schema, values: list) -> None:
+        report.sets.append(SetRecord(token.line_number, schema.name, dict(zip(schema.argument_names, values))))
+
+    report.header, report.errors = readReport(filepath, addSet)
+    return report
+
+
+def isReportFilename(filename: str) -> bool:
+    return REPORT_FILENAME_PATTERN.fullmatch(filename) is not None
@@ -0,0 +1,190 @@
+# Declarative layout of APP-11 sets, compiled once into formatters.
+#
+# A set is its name followed by its fields, separated by '/' and terminated by '//':
+#   MILECREP/150810ZSEP2024/WGE/4307.12N00912.45W/10/SONOBOT/UNCERTAIN//
+# A schema lists the fields in order: plain strings are constant fields, Field
+# instances are filled with the values given to SetSchema.format.
+#  - empty values are replaced by the '-' placeholder (an empty field would end the set early),
+#  - empty optional fields at the end of the set are left out entirely,
+#  - values longer than the max_length of their field are rejected.
+# SetSchema.parse is the inverse of format: it reads the values back from a set line.
+
+
+# Placeholder of a field without value
+EMPTY_FIELD = "-"
+
+FIELD_SEPARATOR = "/"
+SET_TERMINATOR = "//\n"
+
+
+class Field:
+
+    def __init__(self,
+                 name: str,
+                 optional: bool = False,
+                 max_length: int = None,
+                 suffix: str = "",
+                 repeating: bool = False):
+        self.name = name
+        self.optional = optional
+        self.max_length = max_length
+        # Unit appended to the value (e.g. 'H' for hours, 'M' for meters)
+        self.suffix = suffix
+        # The value is a group of fields repeated until the end of the set
+        # (e.g. the tracks of MCMPEDAT), it contains separators itself
+        self.repeating = repeating
+
+
+def parameterName(name: str) -> str:
+    # 'circular error probability' -> 'circular_error_probability'
+    return name.replace(" ", "_")
+
+
+def escapeFormat(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class SetSchema:
+
+    def __init__(self,
+                 name: str,
+                 fields: list,
+                 terminator: str = SET_TERMINATOR):
+        self.name = name
+        self.fields = fields
+        self.terminator = terminator
+        self._compile()
+
+    def _compile(self):
+        # Optional fields can only be left out at the end of the set
+        seen_optional = False
+        for field in self.fields:
+            if isinstance(field, Field) and field.optional:
+                seen_optional = True
+            elif seen_optional:
+                raise ValueError(f"{self.name}: optional fields must be the last fields of the set.")
+        if any(isinstance(field, Field) and field.repeating for field in self.fields[:-1]):
+            raise ValueError(f"{self.name}: only the last field of the set can be repeating.")
+
+        arguments = [field for field in self.fields if isinstance(field, Field)]
+        self._mandatory_count = len([field for field in arguments if not field.optional])
+        self._argument_count = len(arguments)
+        self.argument_names = [parameterName(field.name) for field in arguments]
+        # Number of fields of a set line, with all its optional fields or without some of them
+        self._field_counts = range(len(self.fields) - (len(arguments) - self._mandatory_count), len(self.fields) + 1)
+        self._repeating = len(self.fields) > 0 and isinstance(self.fields[-1], Field) and self.fields[-1].repeating
+        self._prefix = self.name + FIELD_SEPARATOR
+
+        # One template per number of values: from the mandatory fields only up to all the fields
+        self._templates = {}
+        for count in range(self._mandatory_count, len(arguments) + 1):
+            parts = [escapeFormat(self.name)]
+            used = 0
+            for field in self.fields:
+                if isinstance(field, Field):
+                    if used == count:
+                        break
+                    parts.append("{}" + escapeFormat(field.suffix))
+                    used += 1
+                else:
+                    parts.append(escapeFormat(field))
+            self._templates[count] = (FIELD_SEPARATOR.join(parts) + escapeFormat(self.terminator)).format
+
+        # The formatter is a closure over the templates, so that the common case (every field
+        # filled) is a couple of tests and a single str.format call. Falsy values (empty
+        # strings, but also e.g. 0) go through formatPartial, and then through _formatEmpty,
+        # which only replaces the empty strings.
+        # NOTE: fields with a max_length must be strings.
+        name = self.name
+        mandatory_count = self._mandatory_count
+        argument_count = self._argument_count
+        templates = [self._templates.get(count) for count in range(argument_count + 1)]
+        template = templates[argument_count]
+        limits = [(index, parameterName(field.name), field.max_length)
+                  for index, field in enumerate(arguments) if field.max_length is not None]
+        formatEmpty = self._formatEmpty
+        tooLong = self._tooLong
+
+        def formatPartial(values):
+            if len(values) != argument_count:
+                raise TypeError(f"{name}.format() takes {argument_count} arguments ({len(values)} given)")
+            if not all(values[:mandatory_count]):
+                return formatEmpty(values)
+            for index, argument_name, max_length in limits:
+                if len(values[index]) > max_length:
+                    tooLong(argument_name, values[index], max_length)
+            # Empty optional fields at the end are left out, an empty one before a filled one
+            # needs a placeholder
+            count = argument_count
+            while count > mandatory_count and not values[count - 1]:
+                count -= 1
+            if count > mandatory_count + 1 and not all(values[mandatory_count:count - 1]):
+                return formatEmpty(values)
+            return templates[count](*values[:count])
+
+        if len(limits) == 0:
+            def format(*values):
+                if len(values) == argument_count and all(values):
+                    return template(*values)
+                return formatPartial(values)
+        else:
+            def format(*values):
+                if len(values) == argument_count and all(values):
+                    for index, argument_name, max_length in limits:
+                        if len(values[index]) > max_length:
+                            tooLong(argument_name, values[index], max_length)
+                    return template(*values)
+                return formatPartial(values)
+
+        format.__qualname__ = f"{name}.format"
+        self.format = format
+
+    def _tooLong(self, name: str, value, max_length: int) -> None:
+        raise ValueError(f"{self.name}: {name} '{value}' is longer than {max_length} characters.")
+
+    def _formatEmpty(self, values: tuple) -> str:
+        values = list(values)
+        while len(values) > self._mandatory_count and values[-1] == "":
+            values.pop()
+        values = [EMPTY_FIELD if value == "" else value for value in values]
+
+        arguments = [field for field in self.fields if isinstance(field, Field)]
+        for field, value in zip(arguments, values):
+            if field.max_length is not None and len(str(value)) > field.max_length:
+                self._tooLong(parameterName(field.name), value, field.max_length)
+
+        return self._templates[len(values)](*values)
+
+    def parse(self, line: str) -> list:
+        # Values of the fields of a set line (with or without its line break), in the order of
+        # the arguments of format: suffixes are removed, '-' placeholders are kept as they are,
+        # and optional fields left out are returned as empty strings.
+        line = line.rstrip("\n")
+        if not line.endswith("//"):
+            raise ValueError(f"{self.name}: set is not terminated by '//'.")
+        if not line.startswith(self._prefix):
+            raise ValueError(f"{self.name}: not a {self.name} set.")
+
+        parts = line[len(self._prefix):-2].split(FIELD_SEPARATOR)
+        if self._repeating and len(parts) > len(self.fields):
+            parts[len(self.fields) - 1:] = [FIELD_SEPARATOR.join(parts[len(self.fields) - 1:])]
+        if len(parts) not in self._field_counts:
+            expected = f"{self._field_counts[0]}" if len(self._field_counts) == 1 \
+                       else f"{self._field_counts[0]} to {self._field_counts[-1]}"
+            raise ValueError(f"{self.name}: {len(parts)} fields instead of {expected}.")
+
+        values = []
+        for position, (part, field) in enumerate(zip(parts, self.fields), 1):
+            if isinstance(field, str):
+                if part != field:
+                    raise ValueError(f"{self.name}: field {position} is '{part}' instead of '{field}'.")
+            elif field.suffix:
+                if not part.endswith(field.suffix):
+                    raise ValueError(f"{self.name}: {parameterName(field.name)} '{part}' "
+                                     f"does not end with '{field.suffix}'.")
+                values.append(part[:-len(field.suffix)])
+            else:
+                values.append(part)
+
+        values.extend([""] * (self._argument_count - len(values)))
+        return values
@@ -0,0 +1,79 @@
+# Generation of the APP-11 reports of several tasks in parallel.
+
+# Library imports
+import concurrent.futures
+import pathlib
+
+# Local imports
+from src.logger import log, info, error, success
+from src.tasks import generateTask
+
+
+def _initWorker(log_level, log_format):
+    log.setLogLevel(log_level)
+    log.setLogFormat(log_format)
+
+
+def _generateTaskSafely(top_directory: pathlib.Path,
+                        task: tuple,
+                        report_start_number: int,
+                        options: dict):
+    try:
+        return generateTask(top_directory, *task, report_start_number, options)
+    except Exception as e:
+        return e
+    finally:
+        # Pool workers exit without calling the atexit functions (see src/logger.py)
+        log.flush()
+
+
+def runTasks(top_directory: pathlib.Path,
+             tasks: list,
+             start_numbers: dict,
+             options: dict,
+             jobs: int) -> dict:
+    # Generates the reports of every (element, area, task) in tasks, on up to
+    # jobs processes. Serial numbers are allocated beforehand (start_numbers),
+    # so the result does not depend on the order in which tasks complete.
+    # Returns a dict of task to report numbers, or to the exception raised.
+    results = {}
+
+    if jobs == 1:
+        for task in tasks:
+            results[task] = _generateTaskSafely(top_directory, task, start_numbers[task], options)
+        return results
+
+    # The tasks are already spread across the processes: each of them runs on a single one
+    options = dict(options, jobs=1)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                initializer=_initWorker,
+                                                initargs=(log.getLogLevel(), log.getLogFormat())) as executor:
+        futures = {executor.submit(_generateTaskSafely,
+                                   top_directory,
+                                   task,
+                                   start_numbers[task],
+                                   options): task
+                   for task in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return results
+
+
+def taskName(task: tuple) -> str:
+    return "/".join(task)
+
+
+def summarize(results: dict) -> bool:
+    failures = {task: result for task, result in results.items() if isinstance(result, Exception)}
+    succeeded = len(results) - len(failures)
+
+    info(f"Summary: {succeeded} task(s) succeeded, {len(failures)} task(s) failed.")
+    for task in sorted(results):
+        if task in failures:
+            error(f"  {taskName(task)}: {type(failures[task]).__name__}: {failures[task]}")
+        else:
+            success(f"  {taskName(task)}: reports {results[task]}")
+
+    return len(failures) == 0
@@ -1,5 +1,5 @@
 # Local imports
-from src.datatypes import ReportType
+from src.datatypes import ReportType, DecimationStrategy
 
 # Constants for folder names
 FOLDER_NAME_DATA      = "data"
@@ -11,8 +11,17 @@ FOLDER_NAME_TASKING   = "tasking"
 FILENAME_PARAMETERS          = "parameters.ini"
 FILENAME_MINES_CSV           = "Mines.csv"
 FILENAME_ESTIMATED_STATE_CSV = "EstimatedState.csv"
+# EstimatedState of the other vehicles of a task, e.g. EstimatedState_QUADROIN.csv
+FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN = "EstimatedState_*.csv"
 FILENAME_TASKING_TXT         = "tasking.txt"
 FILENAME_NUMBER_CACHE_FILE   = "number_cache"
+FILENAME_SERIAL_REGISTRY     = "serial_registry.sqlite"
+FILENAME_MANIFEST            = ".manifest.json"
+FILENAME_MINES_CACHE         = ".mines_cache.json"
+
+# Version of the generator (bump it whenever the generated reports change,
+# so that the reports of every task are regenerated)
+GENERATOR_VERSION = "1.4.0"
 
 # NMW time qualifiers (see table 1220/22)
 NMW_TQ_CANCEL        = "CXL"
@@ -107,6 +116,30 @@ PARAMETER_SECTION_MAP = {
                          "COMPLETE"  : ReportType.Complete
                         }
 
+# Map of report type to the parameter sections it depends on
+REPORT_SECTION_DEPENDENCY_MAP = {
+                                 ReportType.Start     : ["GENERAL", "START"],
+                                 ReportType.Stop      : ["GENERAL", "STOP", "COVERAGE"],
+                                 ReportType.Complete  : ["GENERAL", "COMPLETE", "TRCKHIST", "MCMPEDAT", "COVERAGE"]
+                                }
+
+# Map of report type to the data files it depends on
+REPORT_FILE_DEPENDENCY_MAP = {
+                              ReportType.Start     : [],
+                              ReportType.Stop      : [],
+                              ReportType.Complete  : [FILENAME_MINES_CSV, FILENAME_ESTIMATED_STATE_CSV,
+                                                      FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN]
+                             }
+
+# Map of report type to the data files it also depends on when its progress is computed
+# from the coverage of the task area (with a [COVERAGE] section, see src/coverage.py)
+REPORT_COVERAGE_FILE_DEPENDENCY_MAP = {
+                                       ReportType.Start     : [],
+                                       ReportType.Stop      : [FILENAME_ESTIMATED_STATE_CSV,
+                                                               FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN],
+                                       ReportType.Complete  : []
+                                      }
+
 # Map of report type to NMW time qualifier
 NMW_TQ_MAP = {
               ReportType.Start     : NMW_TQ_START,
@@ -128,6 +161,9 @@ MSG_ID_MAP = {
               ReportType.Complete  : MSG_ID_FINAL
              }
 
+# Vehicle used when the parameters do not specify one
+DEFAULT_VEHICLE = "SONOBOT"
+
 # Map of vehicle to detection equipment type
 DETECTION_EQUIPMENT_MAP = {
                            "SONOBOT"   : "HYDRA H5SE7",
@@ -138,6 +174,75 @@ DETECTION_EQUIPMENT_MAP = {
 # Estimated State Throttle Delta T
 ESTATE_THROTTLE_DELTA_T = 15.0
 
+# Default TRCKHIST decimation parameters
+DEFAULT_DECIMATION_STRATEGY          = DecimationStrategy.Time
+DEFAULT_DECIMATION_DISTANCE_INTERVAL = 25.0     # m
+DEFAULT_DECIMATION_HEADING_CHANGE    = 10.0     # deg
+DEFAULT_DECIMATION_SPEED_CHANGE      = 1.0      # kn
+DEFAULT_DECIMATION_TOLERANCE         = 5.0      # m
+
+# Map of decimation strategy to its main threshold (the one set with --decimation-threshold)
+DECIMATION_THRESHOLD_MAP = {
+                            DecimationStrategy.Time            : "decimation time interval",
+                            DecimationStrategy.Distance        : "decimation distance interval",
+                            DecimationStrategy.Change          : "decimation heading change",
+                            DecimationStrategy.DouglasPeucker  : "decimation tolerance"
+                           }
+
+# Data entries holding the decimation settings
+DECIMATION_SETTINGS = [
+                       "decimation strategy",
+                       "decimation time interval",
+                       "decimation distance interval",
+                       "decimation heading change",
+                       "decimation speed change",
+                       "decimation tolerance"
+                      ]
+
+# Survey leg detection, used for the tracks of the full MCMPEDAT set (see src/survey_legs.py)
+SURVEY_SAMPLE_INTERVAL          = 1.0      # s, between the track positions analysed
+SURVEY_LEG_HEADING_TOLERANCE    = 20.0     # deg, between the course of a leg and the survey axis
+SURVEY_LEG_MIN_SPEED            = 0.2      # m/s
+SURVEY_LEG_MIN_LENGTH           = 30.0     # m
+SURVEY_TRACK_TOLERANCE          = 5.0      # m, between the cross-track offsets of the runs of a track
+
+# Sonar coverage of the task area, used for the progress of the STOP and COMPLETE reports (see src/coverage.py)
+COVERAGE_CELL_SIZE              = 5.0      # m
+COVERAGE_MAX_STEP               = 100.0    # m, longer jumps between rows (e.g. position resets) are not swept
+
+# Mean earth radius (m)
+EARTH_RADIUS_M = 6371000.0
+
+# Number of Estimated State rows processed at once when streaming
+ESTATE_CHUNK_SIZE = 65536
+
+# Estimated State CSV column indices
+ESTATE_COLUMN_TIME       = 0
+ESTATE_COLUMN_LATITUDE   = 3
+ESTATE_COLUMN_LONGITUDE  = 4
+ESTATE_COLUMN_YAW        = 11
+ESTATE_COLUMN_VX         = 15
+ESTATE_COLUMN_VY         = 16
+ESTATE_COLUMN_ALTITUDE   = 22
+
+# Estimated State CSV column names (lower case, without the unit), by array name.
+# The columns are looked up by name in the header, so the exports can reorder or add columns.
+ESTATE_COLUMN_NAME_MAP = {
+                          "time"       : "timestamp",
+                          "latitude"   : "lat",
+                          "longitude"  : "lon",
+                          "yaw"        : "psi",
+                          "vx"         : "vx",
+                          "vy"         : "vy",
+                          "altitude"   : "alt"
+                         }
+
+# Number of bytes of Estimated State CSV decoded at once
+ESTATE_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Conversion factor from m/s to knots
+MS_TO_KNOTS = 1.94384
+
 # Mine detection codes
 MILECREP    = "MILECREP"
 MILCOREP    = "MILCOREP"
@@ -145,3 +250,59 @@ NONMILCOREP = "NONMILCOREP"
 MDETREP     = "MDETREP"
 NOMBOINFO   = "NOMBOINFO"
 MINEINFO    = "MINEINFO"
+
+# Mines.csv column names, looked up in the header row (columns can be in any order)
+MINES_COLUMN_MAP = {
+                    "type"                          : "Type",
+                    "contact reference number"      : "Contact Reference Number",
+                    "mine reference number"         : "Mine Reference Number",
+                    "nombo identification"          : "Nombo Identification",
+                    "utc"                           : "Date (YYYYMMDD-HHMM)",
+                    "longitude"                     : "Longitude (deg)",
+                    "latitude"                      : "Latitude (deg)",
+                    "circular error probability"    : "Circular Error Probable",
+                    "confidence level"              : "Confidence Level",
+                    "detected by"                   : "Detected by",
+                    "mine status identifier"        : "Mine Status Identifier",
+                    "mine case"                     : "Mine Case",
+                    "mine identity"                 : "Mine Identity",
+                    "depth"                         : "Depth (m)",
+                    "image"                         : "Image File Name"
+                   }
+
+# Map of mine detection type to the Mines.csv columns it requires
+# (on top of the type, date, position, circular error probable and detecting vehicle)
+MINES_REQUIRED_COLUMN_MAP = {
+                             MILECREP    : [],
+                             MILCOREP    : ["confidence level"],
+                             NONMILCOREP : ["confidence level"],
+                             MDETREP     : [],
+                             NOMBOINFO   : [],
+                             MINEINFO    : ["mine status identifier", "mine case", "depth"]
+                            }
+
+# Map of Mines.csv reference number column to the detection types whose sets report it
+# (see src/correlation.py: these types get a new number when their contact has none)
+MINES_REFERENCE_COLUMN_MAP = {
+                              "contact reference number"  : [MILCOREP, NONMILCOREP, NOMBOINFO],
+                              "mine reference number"     : [MINEINFO]
+                             }
+
+# Number of mines formatted by each task in parallel mode
+MINES_CHUNK_SIZE = 16384
+
+# Smallest number of mines worth formatting on several processes
+MINES_PARALLEL_MIN_ROWS = 50000
+
+# Input files of a task watched by --watch (names or glob patterns)
+WATCHED_FILENAMES = [FILENAME_PARAMETERS, FILENAME_MINES_CSV, FILENAME_ESTIMATED_STATE_CSV,
+                     FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN]
+
+# Seconds without changes after which the reports are regenerated (--watch)
+WATCH_DEBOUNCE_DELAY = 1.0
+
+# Longest delay (s) before regenerating the reports of files that keep changing (--watch)
+WATCH_MAX_DELAY = 10.0
+
+# Seconds between two scans of the data directories when inotify is not available (--watch)
+WATCH_POLL_INTERVAL = 1.0
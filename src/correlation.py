@@ -0,0 +1,217 @@
+# Automatic correlation of the detections of Mines.csv.
+#
+# The same contact is usually reported several times (MILECREP, then MILCOREP or NONMILCOREP,
+# then NOMBOINFO or MINEINFO once it has been identified), and the rows are linked by their
+# contact and mine reference numbers, which are filled in by hand. Here, the detections whose
+# circles of error overlap (distance <= sum of their circular error probables) are grouped into
+# contacts, and the empty reference numbers of each contact are filled in from its other rows
+# (or new numbers are allocated, following the highest one of the file).
+#
+# The positions are projected to metres around the mean latitude of the file and hashed into
+# a grid of cells as large as the longest possible link: only the detections of neighbouring
+# cells are compared, instead of every pair of rows.
+
+# Library imports
+import csv
+import io
+import math
+import pathlib
+import re
+
+# Local imports
+from src.constants import EARTH_RADIUS_M, \
+                          MINES_COLUMN_MAP, \
+                          MINES_REFERENCE_COLUMN_MAP
+from src.lazy_import import lazyImport
+from src.mines import MineRecord, \
+                      parseMineRows
+from src.mines_cache import iterRecords
+
+np = lazyImport("numpy")
+
+# Offsets of the cells compared with each cell: itself and half of its neighbours,
+# so that each pair of neighbouring cells is only compared once
+GRID_NEIGHBOUR_OFFSETS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+# Largest number of pairs of detections compared at once
+CORRELATION_BATCH_PAIRS = 1 << 22
+
+
+class MinesTable:
+    # Rows of a Mines.csv file, and the detections parsed from them. The file can be written
+    # back with some values filled in: the other rows are written exactly as they were read.
+
+    def __init__(self, filepath: pathlib.Path):
+        with open(filepath, newline='') as csvfile:
+            records = list(iterRecords(csvfile))
+        # Line number (of the last line) of each row
+        line_numbers = [line_number for line_number, _ in records]
+        self.records = [record for _, record in records]
+        self.rows = list(csv.reader(self.records))
+        # Indices of the rows whose values were changed
+        self.changed_rows = set()
+        # Detections, and index in rows and line number of the row of each one
+        self.mines = []
+        self.mine_rows = []
+        self.line_numbers = []
+        if len(self.rows) == 0:
+            return
+
+        header = self.rows[0]
+        mines = parseMineRows(filepath, header, zip(line_numbers[1:], self.rows[1:]))
+        stripped_header = [name.strip() for name in header]
+        self.column_indices = {key: stripped_header.index(name) for key, name in MINES_COLUMN_MAP.items()}
+
+        for index, (line_number, mine) in enumerate(zip(line_numbers[1:], mines), 1):
+            if mine is None:
+                continue
+            self.mines.append(mine)
+            self.mine_rows.append(index)
+            self.line_numbers.append(line_number)
+
+    def setValue(self, mine_index: int, column: str, value: str) -> None:
+        # column: key of MINES_COLUMN_MAP
+        row_index = self.mine_rows[mine_index]
+        row = self.rows[row_index]
+        index = self.column_indices[column]
+        if len(row) <= index:
+            row += [""] * (index + 1 - len(row))
+        row[index] = value
+        self.changed_rows.add(row_index)
+
+    def text(self) -> str:
+        output = io.StringIO()
+        for index, (record, row) in enumerate(zip(self.records, self.rows)):
+            if index not in self.changed_rows:
+                output.write(record)
+                continue
+            # Same line ending as the row had
+            line_ending = record[len(record.rstrip("\r\n")):]
+            csv.writer(output, lineterminator=line_ending).writerow(row)
+        return output.getvalue()
+
+
+def referenceValue(mine: MineRecord, column: str) -> str:
+    # e.g. "contact reference number" -> mine.contact_reference_number
+    return getattr(mine, column.replace(" ", "_"))
+
+
+def localCoordinates(positions: list) -> tuple:
+    # Arrays of the x and y in metres of each (latitude, longitude) in degrees, projected around their mean latitude
+    latitudes, longitudes = np.array(positions, dtype=np.float64).reshape(-1, 2).T
+    scale = math.radians(1) * EARTH_RADIUS_M
+    return longitudes * (scale * math.cos(math.radians(latitudes.mean()))), latitudes * scale
+
+
+def iterLinks(x, y, radii):
+    # Yields arrays (first, second) of the pairs of points whose circles overlap (first < second)
+    cell_size = max(2 * float(radii.max()), 1.0)
+    cell_x = np.floor(x / cell_size).astype(np.int64)
+    cell_y = np.floor(y / cell_size).astype(np.int64)
+    # Cells numbered row by row, with an empty row and column around them for the neighbours
+    cell_x -= cell_x.min() - 1
+    cell_y -= cell_y.min() - 1
+    width = int(cell_y.max()) + 2
+    cells = cell_x * width + cell_y
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+
+    for offset_x, offset_y in GRID_NEIGHBOUR_OFFSETS:
+        neighbours = cells + (offset_x * width + offset_y)
+        starts = np.searchsorted(sorted_cells, neighbours, "left")
+        counts = np.searchsorted(sorted_cells, neighbours, "right") - starts
+        ends = np.cumsum(counts)
+
+        # The candidate pairs are built for a batch of points at a time, to bound the memory used
+        begin = 0
+        while begin < len(x):
+            limit = (ends[begin - 1] if begin > 0 else 0) + CORRELATION_BATCH_PAIRS
+            end = max(int(np.searchsorted(ends, limit, "right")), begin + 1)
+            batch_counts = counts[begin:end]
+            first = np.repeat(np.arange(begin, end), batch_counts)
+            within = np.arange(len(first)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+            second = order[np.repeat(starts[begin:end], batch_counts) + within]
+            begin = end
+
+            if offset_x == 0 and offset_y == 0:
+                keep = first < second
+                first, second = first[keep], second[keep]
+            distances = (x[first] - x[second]) ** 2 + (y[first] - y[second]) ** 2
+            linked = distances <= (radii[first] + radii[second]) ** 2
+            yield np.minimum(first, second)[linked], np.maximum(first, second)[linked]
+
+
+def _findRoot(parents: list, index: int) -> int:
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def findContacts(mines: list) -> list:
+    # Lists of the indices of the detections of each contact (ordered by their first detection):
+    # detections are in the same contact if they are linked by a chain of overlapping circles of error.
+    if len(mines) == 0:
+        return []
+
+    # The detections of a same position are always linked: they are compared once, with their largest error
+    radii = {}
+    for mine in mines:
+        position = (mine.latitude, mine.longitude)
+        radii[position] = max(radii.get(position, 0), mine.circular_error_probability)
+    positions = list(radii)
+    x, y = localCoordinates(positions)
+
+    parents = list(range(len(positions)))
+    for firsts, seconds in iterLinks(x, y, np.array(list(radii.values()), dtype=np.float64)):
+        for first, second in zip(firsts.tolist(), seconds.tolist()):
+            first_root = _findRoot(parents, first)
+            second_root = _findRoot(parents, second)
+            if first_root != second_root:
+                parents[max(first_root, second_root)] = min(first_root, second_root)
+
+    position_indices = {position: index for index, position in enumerate(positions)}
+    contacts = {}
+    for index, mine in enumerate(mines):
+        root = _findRoot(parents, position_indices[(mine.latitude, mine.longitude)])
+        contacts.setdefault(root, []).append(index)
+    return list(contacts.values())
+
+
+def newReferenceNumbers(existing):
+    # Yields the numbers following the highest existing one, with its prefix and width
+    # (e.g. EVO07, EVO09 -> EVO10, EVO11...), or 1, 2... if there is none.
+    prefix, number, width = "", 0, 1
+    for value in existing:
+        match = re.fullmatch(r"(.*?)(\d+)", value)
+        if match is not None and int(match[2]) >= number:
+            prefix, number, width = match[1], int(match[2]), len(match[2])
+    while True:
+        number += 1
+        yield f"{prefix}{number:0{width}d}"
+
+
+def correlateContacts(mines: list, contacts: list) -> tuple:
+    # Returns (fills, conflicts):
+    #   fills: (mine index, column, value) of the empty reference numbers to fill in
+    #   conflicts: (column, mine indices, values) of the contacts whose rows have different numbers
+    fills = []
+    conflicts = []
+    new_numbers = {column: newReferenceNumbers(referenceValue(mine, column) for mine in mines)
+                   for column in MINES_REFERENCE_COLUMN_MAP}
+
+    for contact in contacts:
+        for column, detection_types in MINES_REFERENCE_COLUMN_MAP.items():
+            values = sorted({referenceValue(mines[index], column) for index in contact} - {""})
+            if len(values) > 1:
+                conflicts.append((column, contact, values))
+                continue
+            if len(values) == 1:
+                value = values[0]
+            elif any(mines[index].type in detection_types for index in contact):
+                value = next(new_numbers[column])
+            else:
+                continue
+            fills.extend((index, column, value) for index in contact if referenceValue(mines[index], column) == "")
+
+    return fills, conflicts
@@ -0,0 +1,252 @@
+# Sonar coverage of the task area, used for the progress of the STOP and COMPLETE reports.
+#
+# The task area (a polygon, in decimal degrees) is projected to metres and divided into
+# square cells. The vehicle track is resampled every half cell, and every cell within sonar
+# range of a position is marked as swept: the progress is the percentage of the cells of the
+# area that were swept. Consecutive rows further apart than COVERAGE_MAX_STEP are not joined.
+#
+# During a task, EstimatedState.csv keeps growing: the swept cells are kept next to it
+# (.EstimatedState.coverage.npy, with the number of bytes of the file already read, a digest
+# of them and the settings in .EstimatedState.coverage.json), so that each run only reads
+# the rows appended since the previous one. The last line is only read once it is complete.
+
+# Library imports
+import hashlib
+import json
+import math
+import mmap
+import os
+import pathlib
+
+# Local imports
+from src.constants import COVERAGE_CELL_SIZE, \
+                          COVERAGE_MAX_STEP, \
+                          EARTH_RADIUS_M, \
+                          GENERATOR_VERSION
+from src.estimated_state import iterEstimatedStateBlocks
+from src.filesystem_utils import AtomicWriteBatch
+from src.lazy_import import lazyImport
+from src.logger import debug
+
+np = lazyImport("numpy")
+
+# Largest number of cells marked at once
+COVERAGE_BATCH_CELLS = 1 << 22
+
+
+def parseArea(text: str) -> list:
+    # e.g. "43.0010 9.1020, 43.0100 9.1020, 43.0100 9.1200" -> [(43.001, 9.102), ...]
+    area = []
+    for corner in text.split(","):
+        values = corner.split()
+        if len(values) != 2:
+            raise ValueError(f"invalid area corner '{corner.strip()}' (expected: latitude longitude, in degrees)")
+        area.append((float(values[0]), float(values[1])))
+    if len(area) < 3:
+        raise ValueError("the area needs at least 3 corners")
+    return area
+
+
+def _insidePolygon(x, y, polygon_x: list, polygon_y: list) -> "np.ndarray":
+    # Even-odd rule: a point is inside if a ray from it crosses the edges an odd number of times
+    inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+    for index in range(len(polygon_x)):
+        x1, y1 = polygon_x[index - 1], polygon_y[index - 1]
+        x2, y2 = polygon_x[index], polygon_y[index]
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+
+class CoverageGrid:
+    # Cells of the task area swept by the sonar. Rows of the track can be added as they arrive:
+    # the first row of an update is joined to the last row of the previous one.
+
+    def __init__(self,
+                 area: list,
+                 sonar_range: float,
+                 cell_size: float = COVERAGE_CELL_SIZE):
+        self.area = [(float(latitude), float(longitude)) for latitude, longitude in area]
+        self.sonar_range = float(sonar_range)
+        self.cell_size = float(cell_size)
+
+        # Metres east and north of the south west corner of the area
+        latitudes = [math.radians(latitude) for latitude, _ in self.area]
+        longitudes = [math.radians(longitude) for _, longitude in self.area]
+        self._origin = (min(latitudes), min(longitudes))
+        self._scale_x = EARTH_RADIUS_M * math.cos(sum(latitudes) / len(latitudes))
+        polygon_x = [(longitude - self._origin[1]) * self._scale_x for longitude in longitudes]
+        polygon_y = [(latitude - self._origin[0]) * EARTH_RADIUS_M for latitude in latitudes]
+
+        self.shape = (max(math.ceil(max(polygon_y) / self.cell_size), 1),
+                      max(math.ceil(max(polygon_x) / self.cell_size), 1))
+        centres_y = (np.arange(self.shape[0]) + 0.5) * self.cell_size
+        centres_x = (np.arange(self.shape[1]) + 0.5) * self.cell_size
+        self.inside = _insidePolygon(centres_x[np.newaxis, :], centres_y[:, np.newaxis], polygon_x, polygon_y)
+        self.swept = np.zeros(self.shape, dtype=bool)
+        # (x, y) of the last row added
+        self.last_position = None
+
+        # Offsets (rows, columns) of the cells within sonar range of a cell
+        reach = int(self.sonar_range // self.cell_size)
+        offsets = np.arange(-reach, reach + 1)
+        offset_y, offset_x = np.meshgrid(offsets, offsets, indexing="ij")
+        within = (offset_x ** 2 + offset_y ** 2) * self.cell_size ** 2 <= self.sonar_range ** 2
+        self._disc = (offset_y[within], offset_x[within])
+        self._reach = reach
+
+    def settings(self) -> dict:
+        return {
+                'area'           : [list(corner) for corner in self.area],
+                'sonar range'    : self.sonar_range,
+                'cell size'      : self.cell_size
+               }
+
+    def _resample(self, x, y) -> tuple:
+        # Positions every half cell along the track (rows further apart than COVERAGE_MAX_STEP are not joined)
+        steps = np.hypot(np.diff(x), np.diff(y))
+        counts = np.where(steps <= COVERAGE_MAX_STEP, np.ceil(steps / (self.cell_size / 2)), 1).astype(np.int64)
+        counts = np.maximum(counts, 1)
+        segments = np.repeat(np.arange(len(steps)), counts)
+        fractions = (np.arange(len(segments)) - np.repeat(np.cumsum(counts) - counts, counts)) / counts[segments]
+        resampled_x = np.concatenate((x[segments] + (x[segments + 1] - x[segments]) * fractions, x[-1:]))
+        resampled_y = np.concatenate((y[segments] + (y[segments + 1] - y[segments]) * fractions, y[-1:]))
+        return resampled_x, resampled_y
+
+    def _sweep(self, x, y) -> None:
+        # Marks the cells within sonar range of the cell of each position
+        rows = np.floor(y / self.cell_size).astype(np.int64)
+        columns = np.floor(x / self.cell_size).astype(np.int64)
+        # Positions too far from the area to reach it are left out
+        near = (rows >= -self._reach) & (rows < self.shape[0] + self._reach) \
+               & (columns >= -self._reach) & (columns < self.shape[1] + self._reach)
+        width = self.shape[1] + 2 * self._reach
+        cells = np.unique((rows[near] + self._reach) * width + (columns[near] + self._reach))
+        rows, columns = cells // width - self._reach, cells % width - self._reach
+
+        batch = max(COVERAGE_BATCH_CELLS // len(self._disc[0]), 1)
+        for start in range(0, len(cells), batch):
+            swept_rows = (rows[start:start + batch, np.newaxis] + self._disc[0]).ravel()
+            swept_columns = (columns[start:start + batch, np.newaxis] + self._disc[1]).ravel()
+            valid = (swept_rows >= 0) & (swept_rows < self.shape[0]) \
+                    & (swept_columns >= 0) & (swept_columns < self.shape[1])
+            self.swept[swept_rows[valid], swept_columns[valid]] = True
+
+    def update(self, chunks) -> int:
+        # Adds the rows of the EstimatedState chunks to the track, returns the number of rows added
+        count = 0
+        for chunk in chunks:
+            if len(chunk['time']) == 0:
+                continue
+            x = (chunk['longitude'] - self._origin[1]) * self._scale_x
+            y = (chunk['latitude'] - self._origin[0]) * EARTH_RADIUS_M
+            if self.last_position is not None:
+                x = np.concatenate(([self.last_position[0]], x))
+                y = np.concatenate(([self.last_position[1]], y))
+            self._sweep(*self._resample(x, y))
+            self.last_position = (float(x[-1]), float(y[-1]))
+            count += len(chunk['time'])
+        return count
+
+    def merge(self, other: "CoverageGrid") -> None:
+        # Adds the cells swept along another track (e.g. by another vehicle), with the same settings
+        self.swept |= other.swept
+
+    def percentage(self) -> int:
+        # Percentage of the area swept (rounded down: 100 only once every cell is swept)
+        area_cells = int(np.count_nonzero(self.inside))
+        if area_cells == 0:
+            return 0
+        return int(np.count_nonzero(self.swept & self.inside)) * 100 // area_cells
+
+
+def getCoverageFiles(filepath: pathlib.Path) -> tuple:
+    # (grid file, metadata file), e.g. data/.EstimatedState.coverage.npy and data/.EstimatedState.coverage.json
+    return (filepath.with_name(f".{filepath.stem}.coverage.npy"),
+            filepath.with_name(f".{filepath.stem}.coverage.json"))
+
+
+def completeLength(filepath: pathlib.Path) -> int:
+    # Number of bytes of the complete lines of the file (up to its last line break)
+    with open(filepath, "rb") as file:
+        if file.seek(0, os.SEEK_END) == 0:
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped.rfind(b"\n") + 1
+
+
+def updateDigest(digest, filepath: pathlib.Path, start: int, end: int):
+    # Adds the bytes start to end of the file to the digest
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        while start < end:
+            block = f.read(min(1 << 20, end - start))
+            if len(block) == 0:
+                break
+            digest.update(block)
+            start += len(block)
+    return digest
+
+
+def _loadState(filepath: pathlib.Path, grid: CoverageGrid) -> tuple:
+    # Restores the swept cells of a previous run into grid. Returns the number of bytes of
+    # filepath they were computed from (0 if they cannot be used), and the digest of those bytes.
+    grid_file, meta_file = getCoverageFiles(filepath)
+    try:
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        size = filepath.stat().st_size
+    except (OSError, ValueError):
+        return 0, hashlib.blake2b()
+    if not isinstance(meta, dict) or meta.get('version') != GENERATOR_VERSION or meta.get('settings') != grid.settings():
+        return 0, hashlib.blake2b()
+    length = meta.get('length')
+    if not isinstance(length, int) or length > size:
+        return 0, hashlib.blake2b()
+    digest = updateDigest(hashlib.blake2b(), filepath, 0, length)
+    if digest.hexdigest() != meta.get('digest'):
+        debug("%s was rewritten - computing its coverage again.", filepath)
+        return 0, hashlib.blake2b()
+
+    try:
+        swept = np.load(grid_file)
+    except (OSError, ValueError):
+        return 0, hashlib.blake2b()
+    if swept.dtype != bool or swept.shape != grid.shape:
+        return 0, hashlib.blake2b()
+    grid.swept = swept
+    grid.last_position = None if meta.get('last position') is None else tuple(meta['last position'])
+    return length, digest
+
+
+def updateCoverage(filepath: pathlib.Path,
+                   area: list,
+                   sonar_range: float,
+                   cell_size: float = COVERAGE_CELL_SIZE) -> CoverageGrid:
+    # Coverage of the track of the EstimatedState file, only reading the rows appended
+    # since the previous run (see above)
+    grid = CoverageGrid(area, sonar_range, cell_size)
+    start, digest = _loadState(filepath, grid)
+    end = completeLength(filepath)
+    if end <= start:
+        return grid
+    count = grid.update(iterEstimatedStateBlocks(filepath, start=start, end=end))
+    debug("Coverage: %d row(s) added (from byte %d).", count, start)
+
+    if not os.access(filepath.parent, os.W_OK):
+        return grid
+    grid_file, meta_file = getCoverageFiles(filepath)
+    meta = {
+            'version'          : GENERATOR_VERSION,
+            'settings'         : grid.settings(),
+            'length'           : end,
+            'digest'           : updateDigest(digest, filepath, start, end).hexdigest(),
+            'last position'    : grid.last_position
+           }
+    with AtomicWriteBatch() as batch:
+        with batch.open(grid_file, "wb") as file:
+            np.save(file, grid.swept)
+        batch.writeFile(meta_file, json.dumps(meta))
+    return grid
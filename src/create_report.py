@@ -1,5 +1,9 @@
 # Functions to generate APP-11 reports used in REPMUS 2023.
 
+# Library imports
+import contextlib
+import pathlib
+
 # Local imports
 from src.app11 import filename, \
                       header, \
@@ -11,9 +15,12 @@ from src.app11 import filename, \
                       mdetrep, \
                       nomboinfo, \
                       mineinfo, \
-                      trckhist, \
+                      exer, \
                       msgid, \
                       ref, \
+                      ref_doc, \
+                      geodatum, \
+                      heading, \
                       nmwrepq, \
                       mtaskrep, \
                       mcmpedat, \
@@ -21,35 +28,29 @@ from src.app11 import filename, \
                       narr, \
                       gentext
 
-from src.constants import ESTATE_THROTTLE_DELTA_T, \
-                          NMW_TQ_MAP, \
+from src.constants import NMW_TQ_MAP, \
                           MILECREP, \
                           MILCOREP, \
                           NONMILCOREP, \
                           MDETREP, \
                           NOMBOINFO, \
                           MINEINFO, \
-                          DETECTION_EQUIPMENT_MAP
+                          MINES_CHUNK_SIZE, \
+                          MINES_PARALLEL_MIN_ROWS
 from src.datatypes import ReportType
-from src.utils import getMineDTG, \
-                      getMineFix, \
+from src.filesystem_utils import AtomicWriteBatch, \
+                                 writeFileAtomically
+from src.decimation import decimate
+from src.estimated_state import mergeTrckhistLines
+from src.estimated_state_cache import iterCachedEstimatedStateChunks
+from src.logger import log, debug
+from src.mines import MineRecord
+from src.profiling import span
+from src.report_writer import ReportWriter
+from src.utils import getMineFix, \
                       getMineCircularErrorProbability, \
-                      getMineContactReferenceNumber, \
                       getMineSonarConfidenceLevel, \
-                      getMineImageName, \
-                      getMineNOMBOIdentification, \
-                      getMineReferenceNumber, \
-                      getMineStatusIdentifier, \
-                      getMineDetectionEquipment, \
-                      getMineCase, \
-                      getMineIdentity, \
                       getMineDepth, \
-                      throttleData, \
-                      extractAndFormatDTG, \
-                      extractAndFormatFix, \
-                      extractAndFormatSensorAltitude, \
-                      extractAndFormatSpeed, \
-                      extractAndFormatHeading, \
                       timeToZulu
 
 
@@ -65,119 +66,179 @@ def create_filename(report_type: ReportType,
                     data['message serial number'])
 
 
-def create_mines(data: dict) -> str:
-
-    mine_data = data['mine data']
-
-    if len(mine_data) == 0:
-        return ""
-
-    body = ""
-
-    for line in mine_data:
-        utc                         = getMineDTG(line)
-        fix                         = getMineFix(line)
-        circular_error_probability  = getMineCircularErrorProbability(line)
-        contact_reference_number    = getMineContactReferenceNumber(line)
-        sonar_confidence_level      = getMineSonarConfidenceLevel(line)
-        image_name                  = getMineImageName(line)
-        detection_vehicle           = getMineDetectionEquipment(line)
-
-        detection_equipment         = DETECTION_EQUIPMENT_MAP[detection_vehicle].upper()
-
-        detection_type = line[0].upper()
-        if detection_type == MILECREP:
-            body += milecrep(utc,
-                             fix,
-                             circular_error_probability,
-                             detection_equipment,
-                             "UNCERTAIN",
-                             image_name)
-        if detection_type == MILCOREP:
-            body += milcorep(contact_reference_number,
-                             utc,
-                             fix,
-                             circular_error_probability,
-                             detection_equipment,
-                             sonar_confidence_level,
-                             "LOOKS LIKE A MINE",
-                             image_name)
-        if detection_type == NONMILCOREP:
-            body += nonmilcorep(contact_reference_number,
-                                utc,
-                                fix,
-                                circular_error_probability,
-                                detection_equipment,
-                                sonar_confidence_level,
-                                "DOESN'T LOOK LIKE A MINE",
-                                image_name)
-        if detection_type == MDETREP:
-            body += mdetrep("VISUAL",
-                            utc,
-                            "-",
-                            "DIVER",
-                            fix,
-                            circular_error_probability,
-                            "SEE IMAGE " + image_name)
-        if detection_type == NOMBOINFO:
-            nombo_id = getMineNOMBOIdentification(line)
-            body += nomboinfo(contact_reference_number,
-                              utc,
-                              fix,
-                              circular_error_probability,
-                              nombo_id,
-                              "SONAR",
-                              image_name)
-        if detection_type == MINEINFO:
-            mine_reference_number = getMineReferenceNumber(line)
-            mine_status_identifier = getMineStatusIdentifier(line)
-            mine_case = getMineCase(line)
-            mine_identity = getMineIdentity(line)
-            mine_depth = getMineDepth(line)
-            body += mineinfo(mine_reference_number,
-                             utc,
-                             fix,
-                             circular_error_probability,
-                             mine_status_identifier,
-                             mine_case,
-                             mine_identity,
-                             "SONAR",
-                             mine_depth,
-                             image_name)
-
-    body += "\n"
-
-    return body
-
-
-def create_trckhist(data):
-
-    estimated_state_data = data['estimated state data']
-
-    if len(estimated_state_data) == 0:
-        return ""
-
-    estimated_state_data = throttleData(estimated_state_data, ESTATE_THROTTLE_DELTA_T)
-    body = ""
-
-    for line in estimated_state_data:
-        body += trckhist(data['vehicle name'],
-                         extractAndFormatDTG(line),
-                         extractAndFormatFix(line),
-                         extractAndFormatSensorAltitude(line),
-                         extractAndFormatSpeed(line),
-                         extractAndFormatHeading(line))
-
-    body += "\n"
-
-    return body
-
-
-def create_body(report_type: ReportType,
+def format_milecrep(mine: MineRecord) -> str:
+    return milecrep(mine.utc,
+                    getMineFix(mine),
+                    getMineCircularErrorProbability(mine),
+                    mine.detection_equipment,
+                    "UNCERTAIN",
+                    mine.image_name)
+
+
+def format_milcorep(mine: MineRecord) -> str:
+    return milcorep(mine.contact_reference_number,
+                    mine.utc,
+                    getMineFix(mine),
+                    getMineCircularErrorProbability(mine),
+                    mine.detection_equipment,
+                    getMineSonarConfidenceLevel(mine),
+                    "LOOKS LIKE A MINE",
+                    mine.image_name)
+
+
+def format_nonmilcorep(mine: MineRecord) -> str:
+    return nonmilcorep(mine.contact_reference_number,
+                       mine.utc,
+                       getMineFix(mine),
+                       getMineCircularErrorProbability(mine),
+                       mine.detection_equipment,
+                       getMineSonarConfidenceLevel(mine),
+                       "DOESN'T LOOK LIKE A MINE",
+                       mine.image_name)
+
+
+def format_mdetrep(mine: MineRecord) -> str:
+    return mdetrep("VISUAL",
+                   mine.utc,
+                   "-",
+                   "DIVER",
+                   getMineFix(mine),
+                   getMineCircularErrorProbability(mine),
+                   "SEE IMAGE " + mine.image_name)
+
+
+def format_nomboinfo(mine: MineRecord) -> str:
+    return nomboinfo(mine.contact_reference_number,
+                     mine.utc,
+                     getMineFix(mine),
+                     getMineCircularErrorProbability(mine),
+                     mine.nombo_identification,
+                     "SONAR",
+                     mine.image_name)
+
+
+def format_mineinfo(mine: MineRecord) -> str:
+    return mineinfo(mine.mine_reference_number,
+                    mine.utc,
+                    getMineFix(mine),
+                    getMineCircularErrorProbability(mine),
+                    mine.mine_status_identifier,
+                    mine.mine_case,
+                    mine.mine_identity,
+                    "SONAR",
+                    getMineDepth(mine),
+                    mine.image_name)
+
+
+# Map of mine detection type to the function formatting its line
+# (rows of other types are left out of the report)
+MINE_FORMATTER_MAP = {
+                      MILECREP    : format_milecrep,
+                      MILCOREP    : format_milcorep,
+                      NONMILCOREP : format_nonmilcorep,
+                      MDETREP     : format_mdetrep,
+                      NOMBOINFO   : format_nomboinfo,
+                      MINEINFO    : format_mineinfo
+                     }
+
+
+def format_mine(mine: MineRecord) -> str:
+    # Empty for the detection types left out of the report
+    formatter = MINE_FORMATTER_MAP.get(mine.type)
+    return formatter(mine) if formatter is not None else ""
+
+
+# Mines formatted by a worker process (see format_mine_lines)
+_worker_mines = []
+
+
+def _initMinesWorker(mines: list) -> None:
+    # With the fork start method, the initializer arguments are inherited
+    # by the workers rather than pickled: the mines are never copied.
+    global _worker_mines
+    _worker_mines = mines
+
+
+def _formatMineLinesRange(start: int, stop: int) -> list:
+    try:
+        return [format_mine(mine) for mine in _worker_mines[start:stop]]
+    finally:
+        # Pool workers exit without calling the atexit functions (see src/logger.py)
+        log.flush()
+
+
+def use_mine_processes(mines: list,
+                       jobs: int) -> bool:
+
+    if jobs <= 1 or len(mines) < MINES_PARALLEL_MIN_ROWS:
+        return False
+
+    # NOTE: without fork (e.g. on Windows), pickling the mines to every worker costs
+    # more than formatting them: they are then always formatted serially.
+    import multiprocessing
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def map_mine_chunks(mines: list,
+                    jobs: int,
+                    function):
+
+    # Exercise-wide contact lists are formatted in chunks on several processes.
+    # executor.map returns the chunks in order, so the output is the same as in serial mode.
+    import concurrent.futures
+    import multiprocessing
+    starts = range(0, len(mines), MINES_CHUNK_SIZE)
+    stops = [start + MINES_CHUNK_SIZE for start in starts]
+    debug("Formatting %d mines in %d chunks on %d processes...", len(mines), len(starts), jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                mp_context=multiprocessing.get_context("fork"),
+                                                initializer=_initMinesWorker,
+                                                initargs=(mines,)) as executor:
+        yield from executor.map(function, starts, stops)
+
+
+def format_mine_lines(mines: list,
+                      jobs: int) -> list:
+
+    # One line per mine, in order (see format_mine)
+    if use_mine_processes(mines, jobs):
+        return [line for chunk in map_mine_chunks(mines, jobs, _formatMineLinesRange) for line in chunk]
+    return [format_mine(mine) for mine in mines]
+
+
+def create_mines(writer: ReportWriter,
+                 data: dict) -> None:
+
+    # Lines already formatted (see src/mines_cache.py)
+    lines = data['mine lines']
+    if len(lines) == 0:
+        return
+
+    writer.writeLines(lines)
+    writer.write("\n")
+
+
+def create_trckhist(writer: ReportWriter,
+                    data: dict) -> None:
+
+    # Each vehicle's track is decimated on its own, then the lines of all vehicles are merged by time
+    tracks = [(decimate(iterCachedEstimatedStateChunks(filepath), data['decimation strategy'], data), vehicle)
+              for vehicle, filepath in data['estimated state files']]
+
+    with span("trckhist") as stage:
+        for line in mergeTrckhistLines(tracks):
+            writer.write(line)
+            stage.count(1)
+
+    writer.write("\n")
+
+
+def create_body(writer: ReportWriter,
+                report_type: ReportType,
                 data : dict,
                 add_full_mcmpedat : bool,
                 add_trckhist : bool,
-                add_narr : bool) -> str:
+                add_narr : bool) -> None:
 
     second_utc = ""
 
@@ -194,55 +255,77 @@ def create_body(report_type: ReportType,
         progress = data['stop progress']
         comments = data['complete comments']
 
-    body = ""
-    body += "EXER/REPMUS 2024//\n"
-    body += msgid(data['originator'], data['message serial number'], report_type)
-    body += "REF/A/TYPE:DOC/EXPLAN/COMMANDO NAVAL/09JUL2024//\n"
-    body += "REF/B/TYPE:DOC/SRL PLAN ANNEX E/EXCON MCM/09JUL2024//\n"
-    body += ref("C", "OPDIR", data['originator'], data['reference utc'])
-    body += "GEODATUM/WGE//\n"
-    body += nmwrepq(NMW_TQ_MAP[report_type])
-    body += "HEADING/MCM//\n"
-    body += mtaskrep(data['area'],
-                           data['task'],
-                           data['originator'],
-                           report_type,
-                           timeToZulu(data['start utc']),
-                           second_utc)
+    writer.emit(exer, "REPMUS 2024")
+    writer.emit(msgid, data['originator'], data['message serial number'], report_type)
+    writer.emit(ref_doc, "A", "EXPLAN", "COMMANDO NAVAL", "09JUL2024")
+    writer.emit(ref_doc, "B", "SRL PLAN ANNEX E", "EXCON MCM", "09JUL2024")
+    writer.emit(ref, "C", "OPDIR", data['originator'], data['reference utc'])
+    writer.emit(geodatum, "WGE")
+    writer.emit(nmwrepq, NMW_TQ_MAP[report_type])
+    writer.emit(heading, "MCM")
+    writer.emit(mtaskrep,
+                data['area'],
+                data['task'],
+                data['originator'],
+                report_type,
+                timeToZulu(data['start utc']),
+                second_utc)
 
     if report_type == ReportType.Complete:
         if add_full_mcmpedat:
-            body += mcmpedat(data['area'],
-                                   data['task'],
-                                   int(data['mission sonar range']),
-                                   float(data['classification probability']),
-                                   float(data['probability undetected burial']),
-                                   float(data['probability undetected seabed']),
-                                   int(data['mission number of rows']),
-                                   float(data['mission grid step']))
+            writer.emit(mcmpedat,
+                        data['area'],
+                        data['task'],
+                        data['survey completion'],
+                        int(data['mission sonar range']),
+                        float(data['classification probability']),
+                        float(data['probability undetected burial']),
+                        float(data['probability undetected seabed']),
+                        data['survey tracks'])
         if add_trckhist:
-            body += create_trckhist(data)
-        body += create_mines(data)
+            create_trckhist(writer, data)
+        create_mines(writer, data)
         if add_narr:
-            body += narr(data['vehicle time in water'],
-                               data['pma detection and processing'],
-                               data['pma classification and processing'],
-                               data['pma recovery and processing'])
+            writer.emit(narr,
+                        data['vehicle time in water'],
+                        data['pma detection and processing'],
+                        data['pma classification and processing'],
+                        data['pma recovery and processing'])
     else:
-        body += mcmpedat_short(data['area'], data['task'], progress)
+        writer.emit(mcmpedat_short, data['area'], data['task'], progress)
 
-    body += gentext(comments.upper())
-    body += "\n"
-
-    return body
+    writer.emit(gentext, comments.upper())
+    writer.write("\n")
 
 
 def create_file(filename: str,
                 content: str) -> None:
 
-    file = open(filename, 'w')
-    file.write(content)
-    file.close()
+    writeFileAtomically(pathlib.Path(filename), content)
+
+
+def write_content(writer: ReportWriter,
+                  report_type: ReportType,
+                  data: dict,
+                  add_full_mcmpedat : bool,
+                  add_trckhist : bool,
+                  add_narr : bool) -> None:
+
+    writer.emit(header, data['originator'], data['destination'])
+    writer.emit(begin)
+    create_body(writer, report_type, data, add_full_mcmpedat, add_trckhist, add_narr)
+    writer.emit(end)
+
+
+def create_content(report_type: ReportType,
+                   data: dict,
+                   add_full_mcmpedat : bool,
+                   add_trckhist : bool,
+                   add_narr : bool) -> str:
+
+    writer = ReportWriter()
+    write_content(writer, report_type, data, add_full_mcmpedat, add_trckhist, add_narr)
+    return writer.getvalue()
 
 
 def create_report(report_type: ReportType,
@@ -250,16 +333,18 @@ def create_report(report_type: ReportType,
                   directory: str,
                   add_full_mcmpedat : bool,
                   add_trckhist : bool,
-                  add_narr : bool) -> tuple [str, str]:
-
-    content = ""
-    content += header(data['originator'], data['destination'])
-    content += begin()
-    content += create_body(report_type, data, add_full_mcmpedat, add_trckhist, add_narr)
-    content += end()
+                  add_narr : bool,
+                  batch: AtomicWriteBatch = None) -> tuple [str, str]:
 
     filename = create_filename(report_type, data)
     filepath = directory / filename
-    create_file(filepath, content)
+
+    # The report is written straight to the file: the track history can be
+    # far larger than the rest of the report, so it is never assembled in memory.
+    # It replaces the previous report when the batch is committed (see src/filesystem_utils.py).
+    with AtomicWriteBatch() if batch is None else contextlib.nullcontext(batch) as batch, \
+         span("write report"), \
+         batch.open(filepath) as file:
+        write_content(ReportWriter(file), report_type, data, add_full_mcmpedat, add_trckhist, add_narr)
 
     return filepath, filename
@@ -10,3 +10,23 @@ class ReportType(enum.Enum):
 
     def __str__(self):
         return self.name.upper()
+
+    # Accept the names as printed (e.g. --only START)
+    @classmethod
+    def _missing_(cls, value):
+        if isinstance(value, str):
+            for member in cls:
+                if member.value == value.lower():
+                    return member
+        return None
+
+
+# Track decimation strategy enum
+class DecimationStrategy(enum.Enum):
+    Time            = "time"
+    Distance        = "distance"
+    Change          = "change"
+    DouglasPeucker  = "douglas-peucker"
+
+    def __str__(self):
+        return self.value
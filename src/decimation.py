@@ -0,0 +1,250 @@
+# Track decimation strategies used to reduce the number of TRCKHIST lines.
+#
+# Every strategy consumes a stream of EstimatedState chunks (dicts of NumPy
+# arrays, see src/estimated_state.py) and yields (chunk, indices) pairs, where
+# indices are the rows of the chunk to keep. The first and the last row of the
+# track are always kept.
+
+# Local imports
+from src.constants import EARTH_RADIUS_M, \
+                          MS_TO_KNOTS
+from src.datatypes import DecimationStrategy
+from src.lazy_import import lazyImport
+
+np = lazyImport("numpy")
+
+# Number of rows compared at once when looking for the next heading or speed change
+CHANGE_SEARCH_WINDOW = 16
+
+
+def _withLookahead(chunks):
+    # Yields (chunk, is_last) pairs, so that the last row of the track is known.
+    previous = None
+    for chunk in chunks:
+        if len(chunk['time']) == 0:
+            continue
+        if previous is not None:
+            yield previous, False
+        previous = chunk
+    if previous is not None:
+        yield previous, True
+
+
+def _previousValues(values, state, key):
+    # values shifted by one row, continuing from the last row of the previous chunk.
+    previous = np.empty_like(values)
+    previous[0] = state.get(key, values[0])
+    previous[1:] = values[:-1]
+    state[key] = values[-1]
+    return previous
+
+
+def _cumulative(increments, state, key):
+    cumulative = np.cumsum(increments) + state.get(key, 0.0)
+    state[key] = cumulative[-1]
+    return cumulative
+
+
+def _planarDistances(latitude_a, longitude_a, latitude_b, longitude_b):
+    # Equirectangular approximation, good enough over the few metres between rows.
+    x = (longitude_b - longitude_a) * np.cos((latitude_a + latitude_b) / 2)
+    y = latitude_b - latitude_a
+    return EARTH_RADIUS_M * np.hypot(x, y)
+
+
+def _timeMetrics(chunk, state):
+    # Time may occasionally go backwards in the logs - only count it going forwards.
+    time = np.maximum.accumulate(chunk['time'])
+    time = np.maximum(time, state.get('time', time[0]))
+    state['time'] = time[-1]
+    return [time]
+
+
+def _distanceMetrics(chunk, state):
+    latitude = chunk['latitude']
+    longitude = chunk['longitude']
+    distances = _planarDistances(_previousValues(latitude, state, 'latitude'),
+                                 _previousValues(longitude, state, 'longitude'),
+                                 latitude,
+                                 longitude)
+    return [_cumulative(distances, state, 'distance')]
+
+
+def _firstAbove(metric, anchor, threshold, start) -> int:
+    # First index >= start with (metric - anchor) > threshold, metric being non-decreasing.
+    count = len(metric)
+    index = start + int(np.searchsorted(metric[start:], anchor + threshold, side='right'))
+    # The search works on (anchor + threshold), but the rows are compared on
+    # (metric - anchor) - fix up any rounding difference at the boundary.
+    while index > start and (metric[index - 1] - anchor) > threshold:
+        index -= 1
+    while index < count and not (metric[index] - anchor) > threshold:
+        index += 1
+    return index
+
+
+def _greedySelect(metrics, thresholds, anchors, start) -> tuple:
+    # Keeps a row as soon as any metric moved more than its threshold since the
+    # last kept row. Every kept row only costs one binary search per metric.
+    count = len(metrics[0])
+    kept = []
+    index = start
+    while index < count:
+        index = min(_firstAbove(metric, anchor, threshold, index)
+                    for metric, threshold, anchor in zip(metrics, thresholds, anchors))
+        if index < count:
+            kept.append(index)
+            anchors = [metric[index] for metric in metrics]
+            index += 1
+    return kept, anchors
+
+
+def _decimateGreedy(chunks, metrics_function, thresholds):
+    state = {}
+    anchors = None
+
+    for chunk, is_last in _withLookahead(chunks):
+        count = len(chunk['time'])
+        metrics = metrics_function(chunk, state)
+
+        kept = []
+        start = 0
+        if anchors is None:
+            kept.append(0)
+            anchors = [metric[0] for metric in metrics]
+            start = 1
+
+        selected, anchors = _greedySelect(metrics, thresholds, anchors, start)
+        kept += selected
+
+        if is_last and (len(kept) == 0 or kept[-1] != count - 1):
+            kept.append(count - 1)
+
+        yield chunk, np.array(kept, dtype=np.intp)
+
+
+def _firstChanged(heading, speed, anchor, thresholds, start) -> int:
+    # First index >= start whose heading (degrees, wrapped at 360) or speed (knots) differs
+    # from the anchor (heading, speed of the last kept row) by more than its threshold.
+    # The rows are compared in windows of doubling size, so that finding a row costs about
+    # as much as the rows skipped before it: the whole chunk is a single linear pass.
+    count = len(heading)
+    window = CHANGE_SEARCH_WINDOW
+    while start < count:
+        stop = min(start + window, count)
+        heading_change = np.abs((heading[start:stop] - anchor[0] + 180.0) % 360.0 - 180.0)
+        changed = (heading_change > thresholds[0]) | (np.abs(speed[start:stop] - anchor[1]) > thresholds[1])
+        if changed.any():
+            return start + int(np.argmax(changed))
+        start = stop
+        window *= 2
+    return count
+
+
+def _decimateChange(chunks, thresholds):
+    # Keeps a row when its heading or speed differs from the ones of the last kept row by
+    # more than the thresholds: sensor jitter around a steady course never adds up.
+    anchor = None
+
+    for chunk, is_last in _withLookahead(chunks):
+        count = len(chunk['time'])
+        heading = np.degrees(chunk['yaw'])
+        speed = np.hypot(chunk['vx'], chunk['vy']) * MS_TO_KNOTS
+
+        kept = []
+        index = 0
+        if anchor is None:
+            kept.append(0)
+            anchor = (heading[0], speed[0])
+            index = 1
+
+        while True:
+            index = _firstChanged(heading, speed, anchor, thresholds, index)
+            if index >= count:
+                break
+            kept.append(index)
+            anchor = (heading[index], speed[index])
+            index += 1
+
+        if is_last and (len(kept) == 0 or kept[-1] != count - 1):
+            kept.append(count - 1)
+
+        yield chunk, np.array(kept, dtype=np.intp)
+
+
+def _douglasPeucker(x, y, tolerance) -> "np.ndarray":
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+
+    # Iterative version (no recursion limit): each pass over a segment is
+    # vectorized, which gives O(n log n) on typical survey tracks.
+    stack = [(0, len(x) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length = np.hypot(dx, dy)
+        if length == 0.0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep)
+
+
+def _decimateDouglasPeucker(chunks, tolerance):
+    # NOTE: the track is simplified one chunk at a time (to keep memory bounded),
+    # so the last row of every chunk is kept. The tolerance still holds everywhere.
+    previous = None
+
+    for chunk, _ in _withLookahead(chunks):
+        latitude = chunk['latitude']
+        longitude = chunk['longitude']
+        offset = 0
+        if previous is not None:
+            latitude = np.concatenate(([previous[0]], latitude))
+            longitude = np.concatenate(([previous[1]], longitude))
+            offset = 1
+        previous = (latitude[-1], longitude[-1])
+
+        x = EARTH_RADIUS_M * longitude * np.cos(np.mean(latitude))
+        y = EARTH_RADIUS_M * latitude
+        kept = _douglasPeucker(x, y, tolerance)
+
+        yield chunk, kept[kept >= offset] - offset
+
+
+def decimate(chunks,
+             strategy: DecimationStrategy,
+             data: dict):
+
+    if strategy == DecimationStrategy.Time:
+        return _decimateGreedy(chunks,
+                               _timeMetrics,
+                               [data['decimation time interval']])
+    if strategy == DecimationStrategy.Distance:
+        return _decimateGreedy(chunks,
+                               _distanceMetrics,
+                               [data['decimation distance interval']])
+    if strategy == DecimationStrategy.Change:
+        return _decimateChange(chunks,
+                               [data['decimation heading change'],
+                                data['decimation speed change']])
+    if strategy == DecimationStrategy.DouglasPeucker:
+        return _decimateDouglasPeucker(chunks,
+                                       data['decimation tolerance'])
+
+    raise ValueError(f"Unknown decimation strategy: {strategy}")
@@ -0,0 +1,85 @@
+# Date-time group (DTG) formatting used in APP-11 reports, e.g. 150810ZSEP2024.
+#
+# datetime.strptime/strftime are slow and called for every mine and telemetry row,
+# so the fixed formats used by the reports are parsed and formatted by hand,
+# and the formatted DTGs are cached per minute.
+
+# Library imports
+import datetime
+import functools
+import time
+
+# Local imports
+from src.lazy_import import lazyImport
+
+# Only needed by epochsToZulu (TRCKHIST lines), and slower to import than the rest of the generator
+np = lazyImport("numpy")
+
+
+# Month abbreviations (not taken from strftime, which depends on the locale)
+MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+          "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+
+# Ordinal of 1970-01-01, the first day of the epoch
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Number of minute buckets kept in the cache
+DTG_CACHE_SIZE = 1 << 14
+
+
+def formatDTG(year: int, month: int, day: int, hour: int, minute: int) -> str:
+    return "{:02d}{:02d}{:02d}Z{}{}".format(day, hour, minute, MONTHS[month - 1], year)
+
+
+def parseDatetime(time_str: str) -> tuple:
+    # Parses a 'YYYYMMDD-HHMM' datetime, returns (year, month, day, hour, minute).
+    if len(time_str) != 13 or time_str[8] != '-' \
+       or not time_str[:8].isdigit() or not time_str[9:].isdigit():
+        raise ValueError(f"time data '{time_str}' does not match format 'YYYYMMDD-HHMM'")
+
+    year = int(time_str[0:4])
+    month = int(time_str[4:6])
+    day = int(time_str[6:8])
+    hour = int(time_str[9:11])
+    minute = int(time_str[11:13])
+
+    if hour > 23 or minute > 59:
+        raise ValueError(f"time data '{time_str}' is not a valid time")
+    # Let datetime validate the date itself (month range, days in month, leap years)
+    datetime.date(year, month, day)
+
+    return year, month, day, hour, minute
+
+
+@functools.lru_cache(maxsize=DTG_CACHE_SIZE)
+def timeToZulu(time_str: str) -> str:
+    return formatDTG(*parseDatetime(time_str))
+
+
+@functools.lru_cache(maxsize=DTG_CACHE_SIZE)
+def minuteToZulu(epoch_minute: int) -> str:
+    # DTG of the minute epoch_minute (minutes since 1970-01-01 00:00 UTC).
+    days, minute_of_day = divmod(epoch_minute, 1440)
+    date = datetime.date.fromordinal(EPOCH_ORDINAL + days)
+    return formatDTG(date.year, date.month, date.day, minute_of_day // 60, minute_of_day % 60)
+
+
+def epochToZulu(timestamp: float) -> str:
+    # Consecutive telemetry rows share the same minute, so this is nearly always a cache hit.
+    return minuteToZulu(int(timestamp // 60))
+
+
+def epochsToZulu(timestamps) -> list:
+    # Batch version of epochToZulu for arrays of timestamps: every distinct minute is
+    # formatted once, and the rows are mapped to their minute in one vectorized pass.
+    minutes = np.floor_divide(np.asarray(timestamps, dtype=np.float64), 60.0).astype(np.int64)
+    if len(minutes) == 0:
+        return []
+
+    unique_minutes, inverse = np.unique(minutes, return_inverse=True)
+    formatted = [minuteToZulu(minute) for minute in unique_minutes.tolist()]
+    return [formatted[i] for i in inverse.ravel().tolist()]
+
+
+def currentDatetime() -> str:
+    return epochToZulu(time.time())
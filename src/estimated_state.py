@@ -0,0 +1,246 @@
+# Columnar processing of EstimatedState data used in TRCKHIST generation.
+#
+# The per-row helpers in src/utils.py (extractAndFormat*) are the reference
+# implementation: the functions below compute the same values on whole NumPy
+# arrays, and only build strings for the rows that are actually reported.
+#
+# EstimatedState exports are wide (23 columns) and long (millions of rows), but only
+# 7 columns are used. The file is memory-mapped, the columns are found by name in the
+# header, and only those columns are decoded, block by block, with NumPy: the other
+# values are never turned into Python objects.
+
+# Library imports
+import heapq
+import io
+import mmap
+import operator
+
+# Local imports
+from src.app11 import trckhist
+from src.constants import ESTATE_COLUMN_NAME_MAP, \
+                          ESTATE_BLOCK_SIZE, \
+                          ESTATE_CHUNK_SIZE, \
+                          MS_TO_KNOTS
+from src.dtg import epochsToZulu
+from src.exit_codes import FailureError
+from src.lazy_import import lazyImport
+from src.utils import formatFix
+
+np = lazyImport("numpy")
+
+
+class EstimatedStateFileError(FailureError):
+    pass
+
+
+def columnName(header_value: str) -> str:
+    # e.g. " lat (rad)" -> "lat"
+    return header_value.strip().lstrip("\ufeff").split("(")[0].strip().lower()
+
+
+def getColumnIndices(header: list) -> dict:
+    # Map of array name to column index (see ESTATE_COLUMN_NAME_MAP), the first column of each name
+    indices = {columnName(value): index for index, value in reversed(list(enumerate(header)))}
+    missing = [name for name in ESTATE_COLUMN_NAME_MAP.values() if name not in indices]
+    if len(missing) > 0:
+        raise EstimatedStateFileError(f"missing column(s): {', '.join(missing)}")
+    return {array: indices[name] for array, name in ESTATE_COLUMN_NAME_MAP.items()}
+
+
+def _emptyArrays() -> dict:
+    return {name: np.empty(0, dtype=np.float64) for name in ESTATE_COLUMN_NAME_MAP}
+
+
+def _decodeColumns(block: bytes, width: int, columns: dict):
+    # Arrays of the columns of a block of complete rows (ending with a newline), or None if
+    # the rows are not all plain comma separated values with width columns.
+    if b'"' in block:
+        return None
+    data = np.frombuffer(block, dtype=np.uint8)
+    separators = np.flatnonzero((data == ord(",")) | (data == ord("\n")))
+    rows = block.count(b"\n")
+    if len(separators) != rows * width:
+        return None
+    separators = separators.reshape(rows, width)
+    # Rows with too many and too few values could make up the count: every row must end
+    # with its last separator
+    if not np.all(data[separators[:, -1]] == ord("\n")):
+        return None
+    row_starts = np.concatenate(([0], separators[:-1, -1] + 1))
+
+    arrays = {}
+    for name, column in columns.items():
+        starts = separators[:, column - 1] + 1 if column > 0 else row_starts
+        ends = separators[:, column]
+        # The values are copied into a fixed width (space padded) bytes array, which NumPy parses
+        size = max(int((ends - starts).max()), 1)
+        positions = starts[:, np.newaxis] + np.arange(size)
+        values = np.where(positions < ends[:, np.newaxis], data[np.minimum(positions, len(data) - 1)], ord(" "))
+        try:
+            arrays[name] = values.astype(np.uint8, copy=False).view(f"S{size}").ravel().astype(np.float64)
+        except ValueError:
+            return None
+    return arrays
+
+
+def _parseColumns(block: bytes, columns: dict, first_line: int, filepath) -> dict:
+    # Slower path for the blocks _decodeColumns cannot handle: blank lines are skipped,
+    # and the rows that are too short or not numbers are reported.
+    import csv
+    values = {name: [] for name in columns}
+    text = io.StringIO(block.decode(), newline="")
+    for line_number, row in enumerate(csv.reader(text), first_line):
+        if len(row) == 0 or "".join(row).strip() == "":
+            continue
+        try:
+            for name, column in columns.items():
+                values[name].append(float(row[column]))
+        except (IndexError, ValueError) as e:
+            raise EstimatedStateFileError(f"{filepath}, line {line_number}: {e}")
+    return {name: np.array(column_values, dtype=np.float64) for name, column_values in values.items()}
+
+
+def _countLines(mapped, end: int) -> int:
+    return sum(mapped[start:min(start + ESTATE_BLOCK_SIZE, end)].count(b"\n")
+               for start in range(0, end, ESTATE_BLOCK_SIZE))
+
+
+def iterEstimatedStateBlocks(filepath, block_size=ESTATE_BLOCK_SIZE, start=0, end=None):
+    # Yields the arrays of the rows of about block_size bytes at a time.
+    # start, end: byte offsets of the first and after the last row to read (at the start of
+    # a line), to only read the rows appended since a previous run.
+    import csv
+    with open(filepath, "rb") as file:
+        if file.seek(0, io.SEEK_END) == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header = next(csv.reader([mapped.readline().decode()]), [])
+            try:
+                columns = getColumnIndices(header)
+            except EstimatedStateFileError as e:
+                raise EstimatedStateFileError(f"{filepath}: {e}")
+            width = len(header)
+
+            position = max(mapped.tell(), start)
+            line_number = 2 if position == mapped.tell() else _countLines(mapped, position) + 1
+            size = len(mapped) if end is None else min(end, len(mapped))
+            while position < size:
+                end = mapped.rfind(b"\n", position, min(position + block_size, size)) + 1
+                if end <= position:
+                    # No newline in the block: a very long line, or the last one
+                    end = mapped.find(b"\n", position) + 1 or size
+                block = mapped[position:end]
+                if not block.endswith(b"\n"):
+                    block += b"\n"
+
+                arrays = _decodeColumns(block, width, columns)
+                if arrays is None:
+                    arrays = _parseColumns(block, columns, line_number, filepath)
+                yield arrays
+
+                line_number += block.count(b"\n")
+                position = end
+
+
+def iterEstimatedStateChunks(filepath, chunk_size=ESTATE_CHUNK_SIZE):
+    # Yields the arrays of chunk_size rows at a time (fewer for the last chunk): the track
+    # is decimated chunk by chunk, so the chunks do not depend on the size of the blocks.
+    pending = []
+    count = 0
+    for arrays in iterEstimatedStateBlocks(filepath):
+        pending.append(arrays)
+        count += len(arrays['time'])
+        if count < chunk_size:
+            continue
+
+        merged = {name: np.concatenate([arrays[name] for arrays in pending]) for name in ESTATE_COLUMN_NAME_MAP}
+        start = 0
+        while count - start >= chunk_size:
+            yield {name: values[start:start + chunk_size] for name, values in merged.items()}
+            start += chunk_size
+        pending = [{name: values[start:] for name, values in merged.items()}]
+        count -= start
+
+    if count > 0:
+        yield {name: np.concatenate([arrays[name] for arrays in pending]) for name in ESTATE_COLUMN_NAME_MAP}
+
+
+def loadEstimatedState(filepath) -> dict:
+    # Same as iterEstimatedStateChunks, but all the rows at once
+    blocks = list(iterEstimatedStateBlocks(filepath))
+    if len(blocks) == 0:
+        return _emptyArrays()
+    return {name: np.concatenate([arrays[name] for arrays in blocks]) for name in ESTATE_COLUMN_NAME_MAP}
+
+
+def radiansToDDMArray(radians) -> "np.ndarray":
+    degrees = np.degrees(radians)
+    degrees_int = np.trunc(degrees)
+    return 100 * degrees_int + (degrees - degrees_int) * 60
+
+
+def formatFixes(latitude, longitude) -> list:
+    return [formatFix(lat, lon)
+            for lat, lon in zip(radiansToDDMArray(latitude).tolist(),
+                                radiansToDDMArray(longitude).tolist())]
+
+
+def sensorAltitudes(altitude) -> "np.ndarray":
+    return np.floor(altitude).astype(np.int64)
+
+
+def speedsInKnots(vx, vy) -> "np.ndarray":
+    return np.floor(np.sqrt(vx ** 2 + vy ** 2) * MS_TO_KNOTS).astype(np.int64)
+
+
+def headingsInDegrees(yaw) -> "np.ndarray":
+    return np.floor(np.degrees(yaw) % 360).astype(np.int64)
+
+
+def formatTrckhistLines(estimated_state: dict,
+                        indices,
+                        equipment: str) -> list:
+
+    selected = {name: values[indices] for name, values in estimated_state.items()}
+
+    dtgs = epochsToZulu(selected['time'])
+    fixes = formatFixes(selected['latitude'], selected['longitude'])
+    altitudes = sensorAltitudes(selected['altitude']).tolist()
+    speeds = speedsInKnots(selected['vx'], selected['vy']).tolist()
+    headings = headingsInDegrees(selected['yaw']).tolist()
+
+    return [trckhist(equipment,
+                     dtg,
+                     fix,
+                     "ALT:{}".format(altitude),
+                     "{}".format(speed),
+                     "{}".format(heading).zfill(3))
+            for dtg, fix, altitude, speed, heading
+            in zip(dtgs, fixes, altitudes, speeds, headings)]
+
+
+def streamTrckhistLines(decimated,
+                        equipment: str):
+
+    for chunk, indices in decimated:
+        yield from formatTrckhistLines(chunk, indices, equipment)
+
+
+def _timedTrckhistLines(decimated,
+                        equipment: str):
+    # (time, line) of each row kept
+    for chunk, indices in decimated:
+        yield from zip(chunk['time'][indices].tolist(), formatTrckhistLines(chunk, indices, equipment))
+
+
+def mergeTrckhistLines(tracks: list):
+    # tracks: (decimated chunks, equipment) of each vehicle of the task.
+    # The lines of the vehicles are interleaved by time, keeping one line per vehicle in memory
+    # (k-way merge): each track must be in chronological order, rows with the same time are
+    # written in the order of the tracks.
+    if len(tracks) == 1:
+        yield from streamTrckhistLines(*tracks[0])
+        return
+    streams = [_timedTrckhistLines(decimated, equipment) for decimated, equipment in tracks]
+    for _, line in heapq.merge(*streams, key=operator.itemgetter(0)):
+        yield line
@@ -0,0 +1,163 @@
+# Binary cache of the parsed EstimatedState.csv columns, kept between runs.
+#
+# The COMPLETE report is regenerated many times during a task, always from the same
+# (multi-GB) EstimatedState.csv. The first run writes the decoded columns next to the
+# CSV file while it streams it (.EstimatedState.npy, a float64 array of one row per
+# CSV row and one column per ESTATE_COLUMN_NAME_MAP entry), and the next runs
+# memory-map that file instead of parsing the text again.
+#
+# The size, modification time and SHA-256 hash of the CSV file are kept in a second
+# file (.EstimatedState.json): the hash is only computed again when the size matches
+# but the modification time does not (e.g. a copied or touched file). The cache is
+# discarded when the version of the generator or the column map changes.
+
+# Library imports
+import io
+import json
+import os
+import pathlib
+
+# Local imports
+from src.constants import ESTATE_CHUNK_SIZE, \
+                          ESTATE_COLUMN_NAME_MAP, \
+                          GENERATOR_VERSION
+from src.estimated_state import iterEstimatedStateChunks
+from src.filesystem_utils import AtomicWriteBatch, \
+                                 writeFileAtomically
+from src.lazy_import import lazyImport
+from src.logger import debug
+from src.manifest import hashFile
+
+np = lazyImport("numpy")
+
+# Number of rows the .npy header is written for before the rows are counted: the header
+# is padded to 64 bytes, so it has the same size for any number of rows up to this one.
+_PLACEHOLDER_ROWS = 10 ** 15
+
+
+def getCacheFiles(filepath: pathlib.Path) -> tuple:
+    # (array file, metadata file), e.g. data/.EstimatedState.npy and data/.EstimatedState.json
+    return (filepath.with_name(f".{filepath.stem}.npy"),
+            filepath.with_name(f".{filepath.stem}.json"))
+
+
+def fileSignature(filepath: pathlib.Path) -> tuple:
+    stat = filepath.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _metadata(signature: tuple, file_hash: str, rows: int) -> dict:
+    return {
+            'version'    : GENERATOR_VERSION,
+            'columns'    : list(ESTATE_COLUMN_NAME_MAP.items()),
+            'size'       : signature[0],
+            'mtime'      : signature[1],
+            'hash'       : file_hash,
+            'rows'       : rows
+           }
+
+
+def _arrayHeader(rows: int) -> bytes:
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': "<f8",
+                                                  'fortran_order': False,
+                                                  'shape': (rows, len(ESTATE_COLUMN_NAME_MAP))})
+    return header.getvalue()
+
+
+def loadCache(filepath: pathlib.Path):
+    # Memory-mapped array of the rows of filepath, or None if there is no valid cache
+    array_file, meta_file = getCacheFiles(filepath)
+    try:
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        signature = fileSignature(filepath)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict):
+        return None
+
+    if meta.get('version') != GENERATOR_VERSION:
+        debug("EstimatedState cache was written by generator version %s - ignoring.", meta.get('version'))
+        return None
+    if meta.get('columns') != [list(item) for item in ESTATE_COLUMN_NAME_MAP.items()]:
+        debug("EstimatedState columns changed - ignoring the cache.")
+        return None
+    if meta.get('size') != signature[0]:
+        return None
+    if meta.get('mtime') != signature[1]:
+        # Same size but touched: only the content tells whether the rows are the same
+        if hashFile(filepath) != meta.get('hash'):
+            return None
+        debug("%s was touched but did not change - keeping its cache.", filepath)
+        meta['mtime'] = signature[1]
+        try:
+            writeFileAtomically(meta_file, json.dumps(meta))
+        except OSError:
+            pass
+
+    try:
+        array = np.load(array_file, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if array.dtype != np.float64 or array.shape != (meta.get('rows'), len(ESTATE_COLUMN_NAME_MAP)):
+        return None
+    return array
+
+
+def _arrays(rows) -> dict:
+    # Contiguous copy of each column of a block of cached rows
+    return {name: np.ascontiguousarray(rows[:, index]) for index, name in enumerate(ESTATE_COLUMN_NAME_MAP)}
+
+
+def _rows(chunk: dict) -> "np.ndarray":
+    return np.column_stack([chunk[name] for name in ESTATE_COLUMN_NAME_MAP]).astype("<f8", copy=False)
+
+
+def iterCachedEstimatedStateChunks(filepath: pathlib.Path, chunk_size=ESTATE_CHUNK_SIZE):
+    # Same chunks as src/estimated_state.py:iterEstimatedStateChunks, read from the cache
+    # if it is up to date, or parsed from the CSV file (and cached) otherwise.
+    array = loadCache(filepath)
+    if array is not None:
+        debug("EstimatedState cache: %d row(s) loaded.", len(array))
+        for start in range(0, len(array), chunk_size):
+            yield _arrays(array[start:start + chunk_size])
+        return
+
+    if not os.access(filepath.parent, os.W_OK):
+        debug("Cannot write the EstimatedState cache next to %s - parsing only.", filepath)
+        yield from iterEstimatedStateChunks(filepath, chunk_size)
+        return
+
+    # Nothing is kept if the chunks are not all read (or the report fails)
+    array_file, meta_file = getCacheFiles(filepath)
+    signature = fileSignature(filepath)
+    count = 0
+    with AtomicWriteBatch() as batch:
+        with batch.open(array_file, "wb") as file:
+            file.write(_arrayHeader(_PLACEHOLDER_ROWS))
+            for chunk in iterEstimatedStateChunks(filepath, chunk_size):
+                rows = _rows(chunk)
+                file.write(rows.tobytes())
+                count += len(rows)
+                yield chunk
+            file.seek(0)
+            file.write(_arrayHeader(count))
+
+        # The file changed while it was read (e.g. appended to): the next run parses it again
+        if fileSignature(filepath) != signature:
+            batch.abort()
+            return
+        batch.writeFile(meta_file, json.dumps(_metadata(signature, hashFile(filepath), count)))
+    debug("EstimatedState cache: %d row(s) written.", count)
+
+
+def loadCachedEstimatedState(filepath: pathlib.Path) -> dict:
+    # Same as src/estimated_state.py:loadEstimatedState, through the cache
+    array = loadCache(filepath)
+    if array is not None:
+        return _arrays(array)
+    chunks = list(iterCachedEstimatedStateChunks(filepath))
+    if len(chunks) == 0:
+        return {name: np.empty(0, dtype=np.float64) for name in ESTATE_COLUMN_NAME_MAP}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in ESTATE_COLUMN_NAME_MAP}
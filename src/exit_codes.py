@@ -6,3 +6,8 @@ class ExitCode(IntFlag):
     Failure = 1
     Aborted = 2
 
+
+# Base of the errors that stop the run with ExitCode.Failure (e.g. a malformed input file).
+# Defined here so that the scripts can catch them without importing the modules raising them.
+class FailureError(Exception):
+    pass
@@ -1,4 +1,7 @@
 # Library imports
+import contextlib
+import hashlib
+import os
 import shutil
 from pathlib import Path
 
@@ -8,41 +11,163 @@ from src.logger import debug
 
 def createDirectoryIfNecessary(directory: Path) -> bool:
     if directory.exists():
-        debug(f"Directory {directory} already exists - skipping.")
+        debug("Directory %s already exists - skipping.", directory)
         return False
 
     directory.mkdir(parents=True)
-    debug(f"Created directory: {directory}")
+    debug("Created directory: %s", directory)
     return True
 
 
-def readDictFromFileIfPossible(filepath) -> dict:
-    dict = {}
-    try:
-        with open(filepath, "r") as f:
-            dict = eval(f.read())
-    except Exception as e:
-        dict = {}
-    debug(f"Cached dictionary: {dict}")
-    return dict
-
-
 def createFileWithContent(filepath: Path, content: str, force=False) -> bool:
     if filepath.exists() and not force:
-        debug(f"File {filepath} already exists - skipping.")
+        debug("File %s already exists - skipping.", filepath)
         return False
 
-    with open(filepath, "w") as f:
-        f.write(content)
-    debug(f"Created file: {filepath}")
+    if writeFileAtomically(filepath, content):
+        debug("Created file: %s", filepath)
+    else:
+        debug("File %s is unchanged - skipping.", filepath)
     return True
 
 
 def copyFileIfPossible(source: Path, destination: Path) -> bool:
     if destination.exists():
-        debug(f"File {destination} already exists - skipping.")
+        debug("File %s already exists - skipping.", destination)
         return False
 
     shutil.copy(source, destination)
-    debug(f"Copied file {source} to {destination}")
+    debug("Copied file %s to %s", source, destination)
     return True
+
+
+def fileDigest(filepath: Path) -> bytes:
+    digest = hashlib.blake2b()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def sameContent(first: Path, second: Path) -> bool:
+    # Files of different sizes are not read
+    try:
+        if first.stat().st_size != second.stat().st_size:
+            return False
+        return fileDigest(first) == fileDigest(second)
+    except OSError:
+        return False
+
+
+def _fsync(path: Path) -> None:
+    # Directories can only be opened read-only (and cannot be synced on Windows)
+    if path.is_dir():
+        if os.name != "posix":
+            return
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicWriteBatch:
+    # Files written together (e.g. the reports of a task and their manifest).
+    #
+    #   with AtomicWriteBatch() as batch:
+    #       with batch.open(filepath) as file:
+    #           file.write(...)
+    #       batch.writeFile(other_filepath, content)
+    #
+    # Every file is written to a hidden temporary file next to it, and only renamed over
+    # the destination when the batch is committed (at the end of the with block), so that
+    # a crash never leaves a truncated file behind. The temporary files are synced to disk
+    # together, and each directory is synced once, after all its files are renamed.
+    # Files whose content did not change are not replaced (their timestamps are kept).
+
+    def __init__(self):
+        # (temporary file, destination) of the files to rename on commit
+        self._pending = []
+        self.written = 0
+        self.unchanged = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return None
+
+    def _temporaryFile(self, filepath: Path) -> Path:
+        return filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+
+    @contextlib.contextmanager
+    def open(self, filepath: Path, mode: str = "w"):
+        # File to write the content of filepath to (mode: "w" or "wb")
+        temporary_file = self._temporaryFile(filepath)
+        try:
+            with open(temporary_file, mode) as file:
+                yield file
+        except BaseException:
+            temporary_file.unlink(missing_ok=True)
+            raise
+        self._add(temporary_file, filepath)
+
+    def writeFile(self, filepath: Path, content: str) -> bool:
+        # Returns False if filepath already has this content (nothing is written then)
+        data = content.encode()
+        try:
+            if filepath.stat().st_size == len(data) and fileDigest(filepath) == hashlib.blake2b(data).digest():
+                self.unchanged += 1
+                return False
+        except OSError:
+            pass
+
+        temporary_file = self._temporaryFile(filepath)
+        with open(temporary_file, "wb") as file:
+            file.write(data)
+        self._pending.append((temporary_file, filepath))
+        return True
+
+    def _add(self, temporary_file: Path, filepath: Path) -> None:
+        if sameContent(temporary_file, filepath):
+            temporary_file.unlink()
+            self.unchanged += 1
+        else:
+            self._pending.append((temporary_file, filepath))
+
+    def commit(self) -> None:
+        pending, self._pending = self._pending, []
+        try:
+            for temporary_file, _ in pending:
+                _fsync(temporary_file)
+        except BaseException:
+            self._pending = pending
+            self.abort()
+            raise
+
+        directories = []
+        for temporary_file, filepath in pending:
+            os.replace(temporary_file, filepath)
+            if filepath.parent not in directories:
+                directories.append(filepath.parent)
+        for directory in directories:
+            _fsync(directory)
+        self.written += len(pending)
+
+    def abort(self) -> None:
+        # The destinations are left as they were
+        pending, self._pending = self._pending, []
+        for temporary_file, _ in pending:
+            temporary_file.unlink(missing_ok=True)
+
+
+def writeFileAtomically(filepath: Path, content: str) -> bool:
+    # Returns False if filepath already had this content
+    with AtomicWriteBatch() as batch:
+        return batch.writeFile(filepath, content)
@@ -0,0 +1,36 @@
+# Lazy imports of the heavy modules only needed on some code paths: numpy (e.g. only used for
+# the TRCKHIST lines of COMPLETE reports) and the src modules of the optional stages.
+# Standard library modules needed on a single code path are imported in the function that
+# uses them instead.
+#
+#   np = lazyImport("numpy")
+#
+# The module object is created straight away, but its code only runs the first time
+# one of its attributes is used (see importlib.util.LazyLoader).
+# Before python 3.12, that first use is not thread-safe: a module used by several threads
+# must be loaded before the other threads are started.
+
+# Library imports
+import importlib.util
+import sys
+
+
+def lazyImport(name: str):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # Like the import statement, so that "import package.module" finds it afterwards
+    parent, _, child = name.rpartition(".")
+    if parent != "":
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -1,7 +1,17 @@
 # Library imports.
-from colorama import Fore, Style
+import atexit
+import importlib
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
-from enum import IntEnum
+from enum import Enum, IntEnum
+
+
+# Seconds between the checks that the writer thread is still alive, while flushing
+FLUSH_CHECK_INTERVAL = 0.5
 
 
 # Report type enum
@@ -14,31 +24,157 @@ class LogLevel(IntEnum):
         return self.name.upper()
 
 
+# Log output format enum
+class LogFormat(Enum):
+    Console     = "console"
+    Json        = "json"
+
+    def __str__(self):
+        return self.value
+
+
+def _loadFormatterModules(log_format: LogFormat) -> None:
+    # The modules of the formatters are only imported once something is printed, and by the
+    # calling thread before the writer thread is started, never by the writer thread itself
+    importlib.import_module("colorama" if log_format == LogFormat.Console else "json")
+
+
+# Messages are put in a queue and written to stdout by a background thread, so that
+# the callers (e.g. the workers of a batch run) never wait for the terminal or pipe.
+# Colors are names of colorama.Fore colors (e.g. "YELLOW").
+# Debug messages take printf-style arguments, which are only formatted when the
+# message is actually printed:
+#
+#   debug("Hashing %s...", filepath)
 class Logger:
     _instance = None
     _name = None
     _log_level = LogLevel.Normal
+    _log_format = LogFormat.Console
 
     def __new__(cls, name):
         if cls._name is None:
             cls._instance = super(Logger, cls).__new__(cls)
             cls._name = name
+            cls._instance._resetWriter()
         return cls._instance
 
-    def log(self, message="", debugLevel="INFO", color=Fore.WHITE):
-        print("{}[{}][{:7s}] {}{}".format(
-                                      color,
-                                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                      debugLevel,
-                                      message,
-                                      Style.RESET_ALL))
+    def _resetWriter(self):
+        # Called again in forked processes: the thread of the parent does not exist there
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._stopped = False
+        # (second, formatted time) of the last message
+        self._timestamp = (None, "")
+
+    def log(self, message="", debugLevel="INFO", color=None):
+        record = (time.time(), debugLevel, color, message)
+        if self._writer is None and not self._stopped:
+            _loadFormatterModules(self._log_format)
+            try:
+                self._writer = threading.Thread(target=self._writeRecords, name="logger", daemon=True)
+                self._writer.start()
+            except RuntimeError:
+                # Interpreter shutting down
+                self._writer = None
+                self._stopped = True
+        if self._stopped or not self._writer.is_alive():
+            # Also once the writer thread died (e.g. a message failed to be formatted)
+            self._write([record])
+        else:
+            self._queue.put(record)
+
+    def flush(self):
+        # Waits until the messages logged so far are written
+        if self._writer is not None and self._writer.is_alive():
+            written = threading.Event()
+            self._queue.put(written)
+            # The writer thread sets the event even when writing fails, but could still die
+            # before getting to it: it is never waited for once dead
+            while not written.wait(FLUSH_CHECK_INTERVAL):
+                if not self._writer.is_alive():
+                    return
+
+    def stop(self):
+        # Messages logged after this are written straight away (e.g. at exit)
+        self.flush()
+        self._stopped = True
+
+    def _writeRecords(self):
+        while True:
+            records = [self._queue.get()]
+            # Everything queued in the meantime is written at once
+            while not self._queue.empty():
+                records.append(self._queue.get())
+
+            events = [record for record in records if isinstance(record, threading.Event)]
+            try:
+                self._write([record for record in records if not isinstance(record, threading.Event)])
+            finally:
+                # Never leave a flush waiting, even if a message fails to be formatted
+                for event in events:
+                    event.set()
+
+    def _write(self, records):
+        if len(records) == 0:
+            return
+        if self._log_format == LogFormat.Json:
+            lines = [self._formatJson(*record) for record in records]
+        else:
+            lines = [self._formatConsole(*record) for record in records]
+        try:
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            # stdout closed (e.g. piped to head)
+            pass
+
+    def _formatTime(self, created):
+        # strftime is only called once per second
+        second = int(created)
+        if self._timestamp[0] != second:
+            self._timestamp = (second, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second)))
+        return self._timestamp[1]
+
+    def _formatConsole(self, created, debugLevel, color, message):
+        import colorama
+        return "{}[{}][{:7s}] {}{}\n".format(
+                                          getattr(colorama.Fore, "WHITE" if color is None else color),
+                                          self._formatTime(created),
+                                          debugLevel,
+                                          message,
+                                          colorama.Style.RESET_ALL)
+
+    def _formatJson(self, created, debugLevel, color, message):
+        import json
+        return json.dumps({
+                           'time'       : datetime.fromtimestamp(created).astimezone().isoformat(timespec='milliseconds'),
+                           'level'      : debugLevel,
+                           'logger'     : self._name,
+                           'pid'        : os.getpid(),
+                           'message'    : f"{message}"
+                          }) + "\n"
 
     def setLogLevel(self, logLevel):
         self._log_level = logLevel
 
-    def debug(self, message=""):
+    def getLogLevel(self):
+        return self._log_level
+
+    def isEnabled(self, logLevel):
+        return self._log_level <= logLevel
+
+    def setLogFormat(self, logFormat):
+        if self._writer is not None and logFormat != self._log_format:
+            _loadFormatterModules(logFormat)
+        self._log_format = logFormat
+
+    def getLogFormat(self):
+        return self._log_format
+
+    def debug(self, message="", *args):
         if self._log_level <= LogLevel.Debug:
-          self.log(message, "DEBUG", Fore.CYAN)
+          self.log(message % args if args else message, "DEBUG", "CYAN")
 
     def info(self, message=""):
         if self._log_level <= LogLevel.Normal:
@@ -46,30 +182,30 @@ class Logger:
 
     def warning(self, message=""):
         if self._log_level <= LogLevel.Normal:
-            self.log(message, "WARNING", Fore.YELLOW)
+            self.log(message, "WARNING", "YELLOW")
 
     def error(self, message=""):
         if self._log_level <= LogLevel.Quiet:
-            self.log(message, "ERROR", Fore.RED)
+            self.log(message, "ERROR", "RED")
 
     def success(self, message=""):
         if self._log_level <= LogLevel.Quiet:
-            self.log(message, "SUCCESS", Fore.GREEN)
+            self.log(message, "SUCCESS", "GREEN")
 
 
 log = Logger("APP-11")
 
-def debug(message):
-    log.debug(message)
-
-def info(message):
-    log.info(message)
-
-def warning(message):
-    log.warning(message)
-
-def error(message):
-    log.error(message)
-
-def success(message=""):
-    log.success(message)
+# The queue is written out before the process exits, and before forking, so that a child process
+# never starts with stdout locked by the thread of its parent.
+# NOTE: pool workers exit without calling the atexit functions: they flush the queue at the end
+# of each of their tasks instead (see src/batch.py and src/create_report.py).
+atexit.register(log.stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=log.flush, after_in_child=log._resetWriter)
+
+# Bound methods: the level is checked before any other work is done
+debug = log.debug
+info = log.info
+warning = log.warning
+error = log.error
+success = log.success
@@ -0,0 +1,144 @@
+# Manifest of the inputs used to generate the reports of a task, used to only
+# regenerate the reports whose inputs changed since the last run.
+
+# Library imports
+import hashlib
+import json
+import pathlib
+
+# Local imports
+from src.constants import FILENAME_MANIFEST, \
+                          GENERATOR_VERSION, \
+                          REPORT_SECTION_DEPENDENCY_MAP, \
+                          REPORT_FILE_DEPENDENCY_MAP, \
+                          REPORT_COVERAGE_FILE_DEPENDENCY_MAP
+from src.filesystem_utils import AtomicWriteBatch, \
+                                 createFileWithContent
+from src.logger import debug
+
+
+def _emptyManifest() -> dict:
+    return {'version': GENERATOR_VERSION, 'files': {}, 'reports': {}}
+
+
+def loadManifest(reports_directory: pathlib.Path) -> dict:
+    try:
+        with open(reports_directory / FILENAME_MANIFEST, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return _emptyManifest()
+
+    if manifest.get('version') != GENERATOR_VERSION:
+        debug("Manifest was written by generator version %s - ignoring.", manifest.get('version'))
+        return _emptyManifest()
+    return manifest
+
+
+def saveManifest(reports_directory: pathlib.Path, manifest: dict, batch: AtomicWriteBatch = None) -> None:
+    # Saved in the batch of the reports, if given, so that it is only replaced together with them
+    content = json.dumps(manifest, indent=2, sort_keys=True)
+    if batch is None:
+        createFileWithContent(reports_directory / FILENAME_MANIFEST, content, True)
+    else:
+        batch.writeFile(reports_directory / FILENAME_MANIFEST, content)
+
+
+def hashFile(filepath: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fileHash(manifest: dict, filepath: pathlib.Path) -> str:
+    # Hash of the file content, re-using the hash stored in the manifest as long as
+    # the size and modification time did not change (some logs are several GB).
+    if not filepath.exists():
+        return ""
+
+    stat = filepath.stat()
+    entry = manifest['files'].get(filepath.name)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+        return entry['hash']
+
+    debug("Hashing %s...", filepath)
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': hashFile(filepath)}
+    manifest['files'][filepath.name] = entry
+    return entry['hash']
+
+
+def filesHash(manifest: dict, data_directory: pathlib.Path, pattern: str) -> str:
+    # Hash of the names and contents of the files matching a glob pattern ("" if there is none)
+    filepaths = sorted(data_directory.glob(pattern))
+    if len(filepaths) == 0:
+        return ""
+    hashes = [(filepath.name, fileHash(manifest, filepath)) for filepath in filepaths]
+    return hashlib.sha256(json.dumps(hashes).encode()).hexdigest()
+
+
+def sectionHash(params, section: str) -> str:
+    # Only the values matter: comments and alignment changes do not trigger a rebuild.
+    if not params.has_section(section):
+        return ""
+    items = sorted(params.items(section, raw=True))
+    return hashlib.sha256(json.dumps(items).encode()).hexdigest()
+
+
+def fileDependencies(report_type, params) -> list:
+    # The EstimatedState logs only change the progress of the STOP report when it is computed
+    # from the coverage: otherwise, appending to them must not regenerate the report.
+    if params.has_section("COVERAGE"):
+        return REPORT_FILE_DEPENDENCY_MAP[report_type] + REPORT_COVERAGE_FILE_DEPENDENCY_MAP[report_type]
+    return REPORT_FILE_DEPENDENCY_MAP[report_type]
+
+
+def inputHashes(manifest: dict,
+                params,
+                data_directory: pathlib.Path,
+                report_types: list) -> dict:
+    hashes = {}
+    for report_type in report_types:
+        for section in REPORT_SECTION_DEPENDENCY_MAP[report_type]:
+            hashes[section] = sectionHash(params, section)
+        for filename in fileDependencies(report_type, params):
+            if filename in hashes:
+                continue
+            if "*" in filename:
+                hashes[filename] = filesHash(manifest, data_directory, filename)
+            else:
+                hashes[filename] = fileHash(manifest, data_directory / filename)
+    return hashes
+
+
+def reportKey(report_type,
+              params,
+              input_hashes: dict,
+              message_serial_number: int,
+              settings: list) -> str:
+    # Everything a report depends on: its inputs, its number and the settings used.
+    dependencies = REPORT_SECTION_DEPENDENCY_MAP[report_type] + fileDependencies(report_type, params)
+    key = {
+           'inputs'     : {dependency: input_hashes[dependency] for dependency in dependencies},
+           'serial'     : message_serial_number,
+           'settings'   : settings
+          }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def isUpToDate(manifest: dict,
+               report_type,
+               key: str,
+               reports_directory: pathlib.Path) -> bool:
+    entry = manifest['reports'].get(str(report_type))
+    if entry is None or entry['key'] != key:
+        return False
+    return (reports_directory / entry['file']).exists()
+
+
+def recordReport(manifest: dict,
+                 report_type,
+                 key: str,
+                 filename: str) -> dict:
+    manifest['reports'][str(report_type)] = {'key': key, 'file': filename}
+    return manifest
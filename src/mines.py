@@ -0,0 +1,168 @@
+# Mine detection records, parsed once from Mines.csv.
+#
+# Every row is converted and validated when the file is loaded (see parseMineRows, used by
+# src/mines_cache.py and src/correlation.py), so that the reports only read ready-to-use
+# values. Exercise-wide contact lists repeat the same few vehicles, statuses and cases over
+# and over: those strings are interned.
+
+# Library imports
+import operator
+import os
+import pathlib
+import sys
+
+# Local imports
+from src import dtg
+from src.constants import MINES_COLUMN_MAP, \
+                          MINES_REQUIRED_COLUMN_MAP, \
+                          MINE_STATUS_ID_MAP, \
+                          MINE_CASE_MAP, \
+                          DETECTION_EQUIPMENT_MAP
+from src.exit_codes import FailureError
+
+
+# Columns every detection requires a value for
+MINES_COMMON_REQUIRED_COLUMNS = ["type",
+                                 "utc",
+                                 "longitude",
+                                 "latitude",
+                                 "circular error probability",
+                                 "detected by"]
+
+
+class MinesFileError(FailureError):
+    pass
+
+
+class MineRecord:
+
+    __slots__ = ('type',
+                 'contact_reference_number',
+                 'mine_reference_number',
+                 'nombo_identification',
+                 'utc',
+                 'longitude',
+                 'latitude',
+                 'circular_error_probability',
+                 'confidence_level',
+                 'detection_vehicle',
+                 'detection_equipment',
+                 'mine_status_identifier',
+                 'mine_case',
+                 'mine_identity',
+                 'depth',
+                 'image_name')
+
+    def __init__(self, values: tuple):
+        # values: raw column values of the row, in the order of MINES_COLUMN_MAP
+        (detection_type,
+         contact_reference_number,
+         mine_reference_number,
+         nombo_identification,
+         utc,
+         longitude,
+         latitude,
+         circular_error_probability,
+         confidence_level,
+         detection_vehicle,
+         mine_status_identifier,
+         mine_case,
+         mine_identity,
+         depth,
+         image) = values
+
+        self.type                       = sys.intern(detection_type.upper())
+        self.contact_reference_number   = contact_reference_number.upper()
+        self.mine_reference_number      = mine_reference_number.upper()
+        self.nombo_identification       = nombo_identification.upper()
+        self.utc                        = dtg.timeToZulu(utc)
+        self.longitude                  = float(longitude)
+        self.latitude                   = float(latitude)
+        self.circular_error_probability = int(circular_error_probability)
+        self.confidence_level           = float(confidence_level) if confidence_level != "" else None
+        self.detection_vehicle          = sys.intern(detection_vehicle)
+        self.detection_equipment        = DETECTION_EQUIPMENT_MAP_UPPER[self.detection_vehicle]
+        self.mine_status_identifier     = MINE_STATUS_ID_MAP[mine_status_identifier] if mine_status_identifier != "" else None
+        self.mine_case                  = MINE_CASE_MAP[mine_case] if mine_case != "" else None
+        self.mine_identity              = sys.intern(mine_identity.upper())
+        self.depth                      = int(depth) if depth != "" else None
+        self.image_name                 = os.path.basename(image).upper()
+
+    def __repr__(self):
+        return f"MineRecord({self.type}, {self.utc}, {self.latitude}, {self.longitude})"
+
+
+# Detection equipments, as written in the reports
+DETECTION_EQUIPMENT_MAP_UPPER = {vehicle: sys.intern(equipment.upper())
+                                 for vehicle, equipment in DETECTION_EQUIPMENT_MAP.items()}
+
+# Position of each column in the values of a MineRecord
+MINES_VALUE_INDEX_MAP = {key: index for index, key in enumerate(MINES_COLUMN_MAP)}
+
+
+def requiredValuesGetter(columns: list):
+    # Returns a function picking the values of columns out of the values of a MineRecord.
+    # NOTE: the first index is repeated so that itemgetter always returns a tuple
+    indices = [MINES_VALUE_INDEX_MAP[column] for column in columns]
+    return operator.itemgetter(*indices, indices[0])
+
+
+MINES_COMMON_REQUIRED_VALUES = requiredValuesGetter(MINES_COMMON_REQUIRED_COLUMNS)
+MINES_REQUIRED_VALUES_MAP = {detection_type: requiredValuesGetter(MINES_COMMON_REQUIRED_COLUMNS + columns)
+                             for detection_type, columns in MINES_REQUIRED_COLUMN_MAP.items()}
+
+
+def getColumnsGetter(header: list):
+    # Returns a function picking the values of MINES_COLUMN_MAP out of a row,
+    # wherever the columns are in the file.
+    header = [name.strip() for name in header]
+    missing = [name for name in MINES_COLUMN_MAP.values() if name not in header]
+    if len(missing) > 0:
+        raise MinesFileError(f"missing column(s): {', '.join(missing)}")
+    return operator.itemgetter(*[header.index(name) for name in MINES_COLUMN_MAP.values()])
+
+
+def checkRequiredValues(values: tuple) -> None:
+    detection_type = values[0].upper()
+    required = MINES_REQUIRED_VALUES_MAP.get(detection_type, MINES_COMMON_REQUIRED_VALUES)
+    if "" in required(values):
+        columns = MINES_COMMON_REQUIRED_COLUMNS + MINES_REQUIRED_COLUMN_MAP.get(detection_type, [])
+        empty = [MINES_COLUMN_MAP[column] for column in columns if values[MINES_VALUE_INDEX_MAP[column]] == ""]
+        raise MinesFileError(f"{detection_type} requires a value for: {', '.join(empty)}")
+
+
+def parseMineRow(row: list, columns) -> MineRecord:
+    values = columns(row)
+    checkRequiredValues(values)
+
+    try:
+        return MineRecord(values)
+    except KeyError as e:
+        raise MinesFileError(f"unknown value {e}")
+    except ValueError as e:
+        raise MinesFileError(f"{e}")
+
+
+def parseMineRows(filepath: pathlib.Path, header: list, rows) -> list:
+    # rows: (line number, values) of the rows following the header.
+    # Returns the MineRecord of each row, in order (None for the blank lines).
+    try:
+        columns = getColumnsGetter(header)
+    except MinesFileError as e:
+        raise MinesFileError(f"{filepath}: {e}")
+    width = len(header)
+
+    records = []
+    for line_number, row in rows:
+        # Skip blank lines, and pad rows whose empty trailing values were left out
+        if len(row) < width:
+            if "".join(row).strip() == "":
+                records.append(None)
+                continue
+            row = row + [""] * (width - len(row))
+        try:
+            records.append(parseMineRow(row, columns))
+        except MinesFileError as e:
+            raise MinesFileError(f"{filepath}, line {line_number}: {e}")
+
+    return records
@@ -0,0 +1,155 @@
+# Cache of the formatted Mines.csv lines of a task, kept between runs.
+#
+# Mines.csv only grows during a task, so most of its rows were already formatted by the
+# previous run. Each row is keyed by a hash of its text: the rows found in the cache are
+# neither parsed nor formatted again, only the new (or edited) ones are. The lines are
+# returned in the order of the rows, so the report is the same as without the cache.
+#
+# The cache is stored next to the data directory of the task (<TASK>/.mines_cache.json),
+# and is discarded when the version of the generator or the header of Mines.csv changes.
+
+# Library imports
+import csv
+import hashlib
+import json
+import pathlib
+
+# Local imports
+from src.constants import FILENAME_MINES_CACHE, \
+                          FILENAME_MINES_CSV, \
+                          GENERATOR_VERSION
+from src.create_report import format_mine_lines
+from src.filesystem_utils import writeFileAtomically
+from src.logger import debug
+from src.mines import parseMineRows
+
+
+# Caches loaded or saved by this process, by cache file path: (size, modification time, cache),
+# so that a long-lived process (--watch) does not read its own cache back from the disk
+_loaded_caches = {}
+
+
+def getCacheFile(data_directory: pathlib.Path) -> pathlib.Path:
+    return data_directory.parent / FILENAME_MINES_CACHE
+
+
+def rowKey(record: str) -> str:
+    # The line ending is left out, so that the last row keeps its key when rows are appended
+    return hashlib.blake2b(record.rstrip("\r\n").encode(), digest_size=12).hexdigest()
+
+
+def iterRecords(csvfile):
+    # Yields (line number, text) of the rows of a CSV file: its lines, except that a quoted
+    # value spanning several lines keeps its row in one piece (line number of its last line).
+    pending = ""
+    line_number = 0
+    for line_number, line in enumerate(csvfile, 1):
+        if pending == "" and '"' not in line:
+            yield line_number, line
+            continue
+        pending += line
+        if pending.count('"') % 2 == 0:
+            yield line_number, pending
+            pending = ""
+    if pending != "":
+        yield line_number, pending
+
+
+def fileSignature(filepath: pathlib.Path) -> tuple:
+    stat = filepath.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def loadCache(cache_file: pathlib.Path, header: str) -> dict:
+    # Map of row key to formatted line (empty if there is no valid cache for this header)
+    try:
+        signature = fileSignature(cache_file)
+    except OSError:
+        return {}
+
+    entry = _loaded_caches.get(cache_file)
+    if entry is not None and entry[0] == signature:
+        cache = entry[1]
+    else:
+        try:
+            with open(cache_file, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or not isinstance(cache.get('lines'), dict):
+            return {}
+        _loaded_caches[cache_file] = (signature, cache)
+
+    if cache.get('version') != GENERATOR_VERSION:
+        debug("Mines cache was written by generator version %s - ignoring.", cache.get('version'))
+        return {}
+    # The columns may have been moved: the rows would not mean the same anymore
+    if cache.get('header') != header:
+        debug("Mines.csv header changed - ignoring the mines cache.")
+        return {}
+    return cache['lines']
+
+
+def saveCache(cache_file: pathlib.Path, header: str, lines: dict) -> None:
+    # Written atomically, so that an interrupted run never leaves a truncated cache
+    cache = {'version': GENERATOR_VERSION, 'header': header, 'lines': lines}
+    # NOTE: json.dumps uses the C encoder, json.dump does not
+    writeFileAtomically(cache_file, json.dumps(cache, separators=(",", ":")))
+    _loaded_caches[cache_file] = (fileSignature(cache_file), cache)
+
+
+def loadMineLines(data_directory: pathlib.Path, jobs: int = 1) -> list:
+    # Formatted line of every row of Mines.csv, in order (empty for the detection types left out of the report).
+    # Rows are parsed and validated by src/mines.py:parseMineRows, but only when they are not in the cache.
+    filepath = data_directory / FILENAME_MINES_CSV
+    cache_file = getCacheFile(data_directory)
+
+    keys = []
+    lines = []
+    # Rows missing from the cache: (index in lines, line number, text)
+    misses = []
+    with open(filepath, newline='') as csvfile:
+        records = iterRecords(csvfile)
+        first = next(records, None)
+        if first is None:
+            return []
+
+        header_text = first[1].rstrip("\r\n")
+        header = next(csv.reader([header_text]), [])
+        cache = loadCache(cache_file, header_text)
+
+        for line_number, record in records:
+            key = rowKey(record)
+            line = cache.get(key)
+            if line is None:
+                misses.append((len(lines), line_number, record))
+            keys.append(key)
+            lines.append(line)
+
+    # The rows missing from the cache are split by a single CSV reader
+    # NOTE: the header is checked even when every row is in the cache
+    rows = csv.reader(record for _, _, record in misses)
+    mines = parseMineRows(filepath, header, ((line_number, row) for (_, line_number, _), row in zip(misses, rows)))
+    new_rows = []
+    blank_rows = []
+    for (index, _, _), mine in zip(misses, mines):
+        if mine is None:
+            blank_rows.append(index)
+        else:
+            new_rows.append((index, mine))
+
+    debug("Mines cache: %d row(s) reused, %d row(s) to format.", len(lines) - len(misses), len(new_rows))
+    if len(new_rows) > 0:
+        formatted = format_mine_lines([mine for _, mine in new_rows], jobs)
+        for (index, _), line in zip(new_rows, formatted):
+            lines[index] = line
+    if len(blank_rows) > 0:
+        blank_rows = set(blank_rows)
+        keys = [key for index, key in enumerate(keys) if index not in blank_rows]
+        lines = [line for index, line in enumerate(lines) if index not in blank_rows]
+
+    # Rows removed from the file are dropped from the cache
+    if len(new_rows) > 0 or len(cache) != len(set(keys)):
+        saveCache(cache_file, header_text, dict(zip(keys, lines)))
+
+    return lines
@@ -0,0 +1,170 @@
+# Timing of the stages of the report generation (generate_reports.py --profile).
+#
+#   with span("load mines") as stage:
+#       lines = loadMineLines(data_directory)
+#       stage.count(len(lines))
+#
+# Spans can be nested, and the report lists the wall time, number of rows and peak
+# traced memory of each stage. When profiling is disabled (the default), span()
+# returns a shared do-nothing object, so instrumented code costs next to nothing.
+
+# Library imports
+import contextlib
+import time
+
+# Local imports
+from src.logger import log, info
+
+# NOTE: cProfile and tracemalloc are only imported when profiling
+
+
+# Number of frames kept by tracemalloc for each allocation in dumps
+TRACEMALLOC_DUMP_FRAMES = 25
+
+
+class _NullSpan:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return None
+
+    def count(self, rows: int) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+
+    __slots__ = ('profiler', 'name', 'path', 'start', 'rows', 'peak')
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.rows = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.profiler.enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.exit(self, elapsed)
+        return None
+
+    def count(self, rows: int) -> None:
+        self.rows += rows
+
+
+class Profiler:
+
+    def __init__(self, track_memory: bool):
+        self.track_memory = track_memory
+        self.stack = []
+        # Map of span path (e.g. "report COMPLETE/format mines") to [calls, seconds, rows, peak bytes]
+        self.stages = {}
+
+    def enter(self, span: Span) -> None:
+        span.path = span.name if len(self.stack) == 0 else f"{self.stack[-1].path}/{span.name}"
+        if self.track_memory:
+            import tracemalloc
+            # The peak of the enclosing span is saved before being reset for this one
+            if len(self.stack) > 0:
+                self.stack[-1].peak = max(self.stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(span)
+        # Stages are listed in the order they are first entered
+        self.stages.setdefault(span.path, [0, 0.0, 0, 0])
+
+    def exit(self, span: Span, elapsed: float) -> None:
+        self.stack.pop()
+        if self.track_memory:
+            import tracemalloc
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+            if len(self.stack) > 0:
+                self.stack[-1].peak = max(self.stack[-1].peak, span.peak)
+
+        stage = self.stages[span.path]
+        stage[0] += 1
+        stage[1] += elapsed
+        stage[2] += span.rows
+        stage[3] = max(stage[3], span.peak)
+
+
+_profiler = None
+
+
+def enable(track_memory: bool = True) -> None:
+    global _profiler
+    _profiler = Profiler(track_memory)
+    if track_memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def disable() -> None:
+    global _profiler
+    _profiler = None
+
+
+def isEnabled() -> bool:
+    return _profiler is not None
+
+
+def span(name: str):
+    if _profiler is None:
+        return NULL_SPAN
+    return Span(_profiler, name)
+
+
+def stages() -> dict:
+    # Map of span path to {'calls', 'seconds', 'rows', 'peak memory'}
+    if _profiler is None:
+        return {}
+    return {path: {'calls': calls, 'seconds': seconds, 'rows': rows, 'peak memory': peak}
+            for path, (calls, seconds, rows, peak) in _profiler.stages.items()}
+
+
+def printReport() -> None:
+    # Asked for explicitly: printed whatever the log level (e.g. with -q), with its own label
+    log.log(f"{'stage':<56}{'calls':>6}{'time (s)':>11}{'rows':>10}{'rows/s':>11}{'peak (MiB)':>12}", "PROFILE")
+    for path, stage in stages().items():
+        rows = f"{stage['rows']}" if stage['rows'] > 0 else "-"
+        rate = f"{stage['rows'] / stage['seconds']:.0f}" if stage['rows'] > 0 and stage['seconds'] > 0 else "-"
+        peak = f"{stage['peak memory'] / 2**20:.1f}" if stage['peak memory'] > 0 else "-"
+        log.log(f"{path:<56}{stage['calls']:>6}{stage['seconds']:>11.3f}{rows:>10}{rate:>11}{peak:>12}", "PROFILE")
+
+
+@contextlib.contextmanager
+def dumps(cprofile_file=None, tracemalloc_file=None):
+    # Writes a cProfile dump (readable with pstats or snakeviz) and/or
+    # a tracemalloc snapshot of the code run in the block.
+    # NOTE: enter it before enable(), so that tracemalloc keeps enough frames for the dump.
+    profile = None
+    if tracemalloc_file is not None:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_DUMP_FRAMES)
+    if cprofile_file is not None:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(cprofile_file)
+            info(f"cProfile dump written to '{cprofile_file}'.")
+        if tracemalloc_file is not None:
+            tracemalloc.take_snapshot().dump(tracemalloc_file)
+            info(f"tracemalloc snapshot written to '{tracemalloc_file}'.")
@@ -0,0 +1,34 @@
+# Writer used to assemble APP-11 reports piece by piece into a sink.
+
+# Library imports
+import io
+
+
+class ReportWriter:
+    # The sink can be a list (used as a buffer), an io.StringIO or an open file:
+    # pieces are appended to it as they are produced, so assembling a report is
+    # linear in its size, and the same code can build it in memory or stream it to disk.
+
+    def __init__(self, sink=None):
+        if sink is None:
+            sink = []
+        self._sink = sink
+        self._write = sink.append if isinstance(sink, list) else sink.write
+
+    def write(self, text: str) -> None:
+        self._write(text)
+
+    def writeLines(self, lines) -> None:
+        for line in lines:
+            self._write(line)
+
+    def emit(self, set_function, *args) -> None:
+        # Writes the line produced by one of the src/app11.py set functions.
+        self._write(set_function(*args))
+
+    def getvalue(self) -> str:
+        if isinstance(self._sink, list):
+            return "".join(self._sink)
+        if isinstance(self._sink, io.StringIO):
+            return self._sink.getvalue()
+        raise TypeError("Only list and io.StringIO sinks can be read back.")
@@ -0,0 +1,137 @@
+# Registry of the message serial numbers allocated to each area and task.
+#
+# Backed by SQLite: lookups are indexed, the next number comes from a counter
+# (O(1) allocation), and allocations run in an exclusive transaction, so that
+# several operators or processes can allocate numbers at the same time.
+
+# Library imports
+import ast
+import pathlib
+import sqlite3
+
+# Local imports
+from src.exit_codes import FailureError
+from src.logger import debug, info
+
+
+# Seconds to wait for another process to release the registry
+REGISTRY_LOCK_TIMEOUT = 30.0
+
+REGISTRY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS serials (
+    area    TEXT    NOT NULL,
+    task    TEXT    NOT NULL,
+    number  INTEGER NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS serials_by_task ON serials (area, task, number);
+CREATE TABLE IF NOT EXISTS counter (
+    id          INTEGER PRIMARY KEY CHECK (id = 0),
+    last_number INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counter (id, last_number) VALUES (0, 0);
+"""
+
+
+class SerialRegistryError(FailureError):
+    pass
+
+
+class SerialRegistry:
+
+    def __init__(self, filepath: pathlib.Path):
+        self._filepath = filepath
+        # Transactions are handled explicitly (see _transaction)
+        self._connection = sqlite3.connect(filepath,
+                                           timeout=REGISTRY_LOCK_TIMEOUT,
+                                           isolation_level=None)
+        self._connection.executescript(REGISTRY_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock on the database file straight away,
+        # so that two processes can never read the same counter value.
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def numbers(self, area: str, task: str) -> list:
+        rows = self._connection.execute("SELECT number FROM serials WHERE area = ? AND task = ? ORDER BY number",
+                                        (area, task))
+        return [row[0] for row in rows]
+
+    def lastNumber(self) -> int:
+        return self._connection.execute("SELECT last_number FROM counter").fetchone()[0]
+
+    def isEmpty(self) -> bool:
+        return self._connection.execute("SELECT COUNT(*) FROM serials").fetchone()[0] == 0
+
+    def _record(self, area: str, task: str, numbers: list) -> None:
+        try:
+            self._connection.executemany("INSERT INTO serials (area, task, number) VALUES (?, ?, ?)",
+                                         [(area, task, number) for number in numbers])
+        except sqlite3.IntegrityError:
+            raise SerialRegistryError(f"Serial numbers {numbers} are already (partly) allocated to another task.")
+        self._connection.execute("UPDATE counter SET last_number = MAX(last_number, ?)", (max(numbers),))
+
+    def reserve(self, area: str, task: str, count: int, start_number: int = None) -> tuple:
+        # Returns (has_number, start number) like the old number cache did:
+        # the numbers already allocated to the task if any, otherwise count new
+        # numbers (from start_number if given, or after the last allocated one).
+        self._transaction()
+        try:
+            numbers = self.numbers(area, task)
+            has_number = len(numbers) > 0
+            if has_number:
+                start_number = numbers[0]
+            else:
+                if start_number is None:
+                    start_number = self.lastNumber() + 1
+                if count > 0:
+                    self._record(area, task, list(range(start_number, start_number + count)))
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+
+        debug("Report start number: %d", start_number)
+        return has_number, start_number
+
+    def importNumbers(self, cache_dict: dict) -> None:
+        self._transaction()
+        try:
+            for area, tasks in cache_dict.items():
+                for task, numbers in tasks.items():
+                    if len(numbers) > 0 and len(self.numbers(area, task)) == 0:
+                        self._record(area, task, list(numbers))
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+
+
+def migrateNumberCache(registry: SerialRegistry, number_cache_file: pathlib.Path) -> bool:
+    # Imports the numbers of the old number cache file (a python dict of
+    # area -> task -> numbers) into an empty registry, then renames the old file.
+    if not number_cache_file.exists() or not registry.isEmpty():
+        return False
+
+    content = number_cache_file.read_text().strip()
+    if content != "":
+        try:
+            cache_dict = ast.literal_eval(content)
+        except (ValueError, SyntaxError) as e:
+            raise SerialRegistryError(f"Could not parse number cache '{number_cache_file}': {e}")
+        if not isinstance(cache_dict, dict):
+            raise SerialRegistryError(f"Number cache '{number_cache_file}' does not contain a dictionary.")
+        registry.importNumbers(cache_dict)
+
+    migrated_file = number_cache_file.with_name(number_cache_file.name + ".migrated")
+    number_cache_file.rename(migrated_file)
+    info(f"Migrated number cache to the serial registry (old file kept as '{migrated_file}').")
+    return True
@@ -0,0 +1,188 @@
+# Survey legs of the vehicle track, used for the tracks of the full MCMPEDAT set.
+#
+# A survey (e.g. a lawnmower pattern) is made of straight legs along a common axis,
+# run in both directions. The track is sampled once per SURVEY_SAMPLE_INTERVAL, the axis
+# is the mean course of the samples (as an undirected line: the angles are doubled, so
+# that legs run in opposite directions add up instead of cancelling out), and the samples
+# moving along the axis (in either direction) are cut into legs.
+#
+# The legs are then grouped into tracks by their cross-track offset: the legs of a same
+# track are the runs of that track. The completion of the survey is the part of the
+# along-track extent of the survey covered by the runs of each track.
+#
+# Offsets are in metres, positive to starboard of the survey axis (as seen along the first leg).
+
+# Library imports
+import math
+
+# Local imports
+from src.constants import EARTH_RADIUS_M, \
+                          SURVEY_SAMPLE_INTERVAL, \
+                          SURVEY_LEG_HEADING_TOLERANCE, \
+                          SURVEY_LEG_MIN_SPEED, \
+                          SURVEY_LEG_MIN_LENGTH, \
+                          SURVEY_TRACK_TOLERANCE
+from src.lazy_import import lazyImport
+
+np = lazyImport("numpy")
+
+
+def sampleTrack(chunks, interval=SURVEY_SAMPLE_INTERVAL) -> tuple:
+    # Arrays (time, latitude, longitude) of the first row of each interval of time, from
+    # a stream of EstimatedState chunks. Rows going back in time are left out.
+    times, latitudes, longitudes = [], [], []
+    last_bucket = -math.inf
+    for chunk in chunks:
+        if len(chunk['time']) == 0:
+            continue
+        buckets = np.floor(chunk['time'] / interval)
+        latest = np.maximum.accumulate(buckets)
+        previous = np.empty_like(latest)
+        previous[0] = last_bucket
+        previous[1:] = latest[:-1]
+        keep = buckets > np.maximum(previous, last_bucket)
+        last_bucket = max(last_bucket, float(latest[-1]))
+        times.append(chunk['time'][keep])
+        latitudes.append(chunk['latitude'][keep])
+        longitudes.append(chunk['longitude'][keep])
+
+    if len(times) == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    return np.concatenate(times), np.concatenate(latitudes), np.concatenate(longitudes)
+
+
+def findLegs(time, latitude, longitude) -> dict:
+    # Legs of the sampled track, as arrays of one entry per leg:
+    #   direction: +1 along the survey axis, -1 against it
+    #   offset: mean cross-track offset (m)
+    #   start, end: along-track start and end of the leg (m, start < end)
+    #   samples: number of samples of the leg
+    empty = {key: np.empty(0) for key in ("direction", "offset", "start", "end", "samples")}
+    if len(time) < 2:
+        return empty
+
+    # Latitudes and longitudes are in radians
+    x = EARTH_RADIUS_M * longitude * math.cos(float(np.mean(latitude)))
+    y = EARTH_RADIUS_M * latitude
+    dx, dy = np.diff(x), np.diff(y)
+    distances = np.hypot(dx, dy)
+    dt = np.diff(time)
+    courses = np.arctan2(dy, dx)
+    moving = distances >= SURVEY_LEG_MIN_SPEED * dt
+    if not np.any(moving):
+        return empty
+
+    # Mean course, as an undirected axis
+    axis = 0.5 * math.atan2(float(np.sum(distances[moving] * np.sin(2 * courses[moving]))),
+                            float(np.sum(distances[moving] * np.cos(2 * courses[moving]))))
+    deviations = np.abs(np.angle(np.exp(1j * (courses - axis))))
+    tolerance = math.radians(SURVEY_LEG_HEADING_TOLERANCE)
+    steps = np.zeros(len(dt), dtype=np.int8)
+    steps[moving & (deviations <= tolerance)] = 1
+    steps[moving & (deviations >= math.pi - tolerance)] = -1
+
+    # The first leg runs along the axis
+    first = np.flatnonzero(steps)
+    if len(first) == 0:
+        return empty
+    if steps[first[0]] < 0:
+        axis += math.pi
+        steps = -steps
+    along = x * math.cos(axis) + y * math.sin(axis)
+    across = x * math.sin(axis) - y * math.cos(axis)
+
+    # Runs of steps in the same direction: a leg goes from the first sample of its first step
+    # to the last sample of its last step
+    changes = np.flatnonzero(np.diff(steps)) + 1
+    run_starts = np.concatenate(([0], changes))
+    run_ends = np.concatenate((changes, [len(steps)]))
+    legs = steps[run_starts] != 0
+    run_starts, run_ends = run_starts[legs], run_ends[legs]
+    direction = steps[run_starts].astype(np.float64)
+
+    # Mean cross-track offset of the samples of each leg
+    cumulative = np.concatenate(([0.0], np.cumsum(across)))
+    samples = (run_ends - run_starts + 1).astype(np.float64)
+    offset = (cumulative[run_ends + 1] - cumulative[run_starts]) / samples
+    start = np.minimum(along[run_starts], along[run_ends])
+    end = np.maximum(along[run_starts], along[run_ends])
+
+    long_enough = end - start >= SURVEY_LEG_MIN_LENGTH
+    direction, offset, start, end, samples = (values[long_enough] for values in (direction, offset, start, end, samples))
+    if len(direction) == 0:
+        return empty
+
+    # A leg cut by a short swerve is still one run: consecutive legs in the same direction
+    # on the same track are merged
+    new_leg = np.ones(len(direction), dtype=bool)
+    new_leg[1:] = (direction[1:] != direction[:-1]) | (np.abs(np.diff(offset)) > SURVEY_TRACK_TOLERANCE)
+    first_legs = np.flatnonzero(new_leg)
+    merged_samples = np.add.reduceat(samples, first_legs)
+    return {
+            'direction'  : direction[first_legs],
+            'offset'     : np.add.reduceat(offset * samples, first_legs) / merged_samples,
+            'start'      : np.minimum.reduceat(start, first_legs),
+            'end'        : np.maximum.reduceat(end, first_legs),
+            'samples'    : merged_samples
+           }
+
+
+def _coveredLength(starts, ends) -> float:
+    # Length of the union of the intervals
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reached = np.maximum.accumulate(ends)
+    previous = np.concatenate(([starts[0]], reached[:-1]))
+    return float(np.sum(np.maximum(ends - np.maximum(starts, previous), 0.0)))
+
+
+def groupTracks(legs: dict) -> list:
+    # (offset, runs, covered length) of each track, sorted by offset: legs whose offsets are
+    # less than SURVEY_TRACK_TOLERANCE apart are runs of the same track.
+    if len(legs['offset']) == 0:
+        return []
+    order = np.argsort(legs['offset'], kind="stable")
+    offsets = legs['offset'][order]
+    lengths = (legs['end'] - legs['start'])[order]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(offsets) > SURVEY_TRACK_TOLERANCE) + 1, [len(offsets)]))
+
+    tracks = []
+    for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        legs_of_track = order[first:last]
+        tracks.append((float(np.average(offsets[first:last], weights=lengths[first:last])),
+                       last - first,
+                       _coveredLength(legs['start'][legs_of_track], legs['end'][legs_of_track])))
+    return tracks
+
+
+def surveyTracks(tracks: list, completion: float) -> dict:
+    # 'tracks': (offset from the centre line in m, rounded, number of runs) of each track,
+    #           from starboard to port
+    # 'completion': percentage of the survey completed
+    if len(tracks) == 0:
+        return {'tracks': [], 'completion': 0}
+    centre = (tracks[0][0] + tracks[-1][0]) / 2
+    return {
+            'tracks'     : [(int(round(offset - centre)), runs) for offset, runs, _ in reversed(tracks)],
+            'completion' : min(100, max(0, int(round(100 * completion))))
+           }
+
+
+def analyseSurvey(chunks, planned_tracks: int = 0) -> dict:
+    # Tracks and completion of the survey run along the track of the EstimatedState chunks
+    # (see surveyTracks). Missing tracks (when fewer than planned_tracks are found) count as
+    # not run at all.
+    legs = findLegs(*sampleTrack(chunks))
+    tracks = groupTracks(legs)
+    if len(tracks) == 0:
+        return surveyTracks([], 0.0)
+
+    extent = float(np.max(legs['end']) - np.min(legs['start']))
+    covered = sum(length for _, _, length in tracks)
+    return surveyTracks(tracks, covered / (extent * max(planned_tracks, len(tracks))))
+
+
+def plannedSurvey(number_of_tracks: int, track_spacing: float) -> dict:
+    # Regularly spaced tracks of one run each, all completed (when there is no track to analyse)
+    tracks = [(i * track_spacing, 1, 1.0) for i in range(number_of_tracks)]
+    return surveyTracks(tracks, 1.0)
@@ -0,0 +1,321 @@
+# Generation of the APP-11 reports of a single task, shared by single-task and
+# batch runs of generate_reports.py.
+
+# Library imports
+import configparser
+import pathlib
+
+# Local imports
+from src.constants import FILENAME_ESTIMATED_STATE_CSV, \
+                          FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN, \
+                          FILENAME_MINES_CSV, \
+                          FILENAME_PARAMETERS, \
+                          FOLDER_NAME_DATA, \
+                          FOLDER_NAME_REPORTS, \
+                          PARAMETER_SECTION_MAP, \
+                          DEFAULT_VEHICLE, \
+                          COVERAGE_CELL_SIZE, \
+                          ESTATE_THROTTLE_DELTA_T, \
+                          DEFAULT_DECIMATION_STRATEGY, \
+                          DEFAULT_DECIMATION_DISTANCE_INTERVAL, \
+                          DEFAULT_DECIMATION_HEADING_CHANGE, \
+                          DEFAULT_DECIMATION_SPEED_CHANGE, \
+                          DEFAULT_DECIMATION_TOLERANCE, \
+                          DECIMATION_THRESHOLD_MAP, \
+                          DECIMATION_SETTINGS
+from src.create_report import create_report
+from src.datatypes import ReportType, DecimationStrategy
+from src.filesystem_utils import AtomicWriteBatch, \
+                                 createDirectoryIfNecessary
+from src.lazy_import import lazyImport
+from src.logger import info, debug, warning
+from src.manifest import loadManifest, \
+                         saveManifest, \
+                         inputHashes, \
+                         reportKey, \
+                         isUpToDate, \
+                         recordReport
+from src.profiling import span
+
+# Only needed by the COMPLETE report (Mines.csv parsing and formatting, survey tracks)
+# and for the automatic progress
+coverage = lazyImport("src.coverage")
+estimated_state_cache = lazyImport("src.estimated_state_cache")
+mines_cache = lazyImport("src.mines_cache")
+survey_legs = lazyImport("src.survey_legs")
+
+
+def getDataDirectory(top_directory: pathlib.Path,
+                     element: str,
+                     area: str,
+                     task: str) -> pathlib.Path:
+    return top_directory / FOLDER_NAME_DATA / element / area / task / FOLDER_NAME_DATA
+
+
+def getReportsDirectory(top_directory: pathlib.Path,
+                        element: str,
+                        area: str,
+                        task: str) -> pathlib.Path:
+    return top_directory / FOLDER_NAME_REPORTS / element / area / task
+
+
+def findTasks(top_directory: pathlib.Path,
+              element: str = "*",
+              area: str = "*",
+              task: str = "*") -> list:
+    # Every data/<TE>/<AREA>/<TASK>/data/parameters.ini matching the (glob) patterns,
+    # sorted so that serial numbers are always allocated in the same order.
+    data_path = top_directory / FOLDER_NAME_DATA
+    pattern = f"{element}/{area}/{task}/{FOLDER_NAME_DATA}/{FILENAME_PARAMETERS}"
+
+    tasks = []
+    for param_data_file in data_path.glob(pattern):
+        parts = param_data_file.relative_to(data_path).parts
+        tasks.append((parts[0], parts[1], parts[2]))
+
+    return sorted(tasks)
+
+
+def checkTaskFiles(data_directory: pathlib.Path):
+    # Returns an error message if a required input file is missing, None otherwise.
+    if not (data_directory / FILENAME_PARAMETERS).exists():
+        return f"Directory '{data_directory}' does not contain a file '{FILENAME_PARAMETERS}'."
+
+    if not (data_directory / FILENAME_MINES_CSV).exists():
+        return f"Directory '{data_directory}' does not contain a file '{FILENAME_MINES_CSV}'."
+
+    return None
+
+
+def getParams(data_directory: pathlib.Path) -> dict:
+    params = configparser.ConfigParser()
+    params.read(data_directory / FILENAME_PARAMETERS)
+    return params
+
+
+def getReportTypes(params: dict) -> list:
+    report_types = []
+    for key in PARAMETER_SECTION_MAP.keys():
+        if key in params:
+            report_types.append(PARAMETER_SECTION_MAP[key])
+    return report_types
+
+
+def getData(params: dict) -> dict:
+    data = {}
+    data['area']                = params['GENERAL']['Area']
+    data['task']                = params['GENERAL']['Task Order Number']
+    data['originator']          = params['GENERAL']['Originator']
+    data['destination']         = params['GENERAL']['Destination']
+    data['reference utc']       = params['GENERAL']['Reference UTC Datetime']
+    data['vehicle name']        = params['GENERAL'].get('Vehicle', DEFAULT_VEHICLE)
+
+    data['start utc']           = params['START']['Start UTC Datetime']
+    data['etc utc']             = params['START']['Estimated Completion UTC Datetime']
+    data['start comments']      = params['START']['Comments']
+
+    data['stop utc']            = params['STOP']['Stop UTC Datetime']
+    data['stop progress']       = params['STOP']['Progress']
+    data['stop comments']       = params['STOP']['Comments']
+
+    data['complete utc']        = params['COMPLETE']['Complete UTC Datetime']
+    data['complete comments']   = params['COMPLETE']['Comments']
+
+    trckhist = params['TRCKHIST'] if params.has_section('TRCKHIST') else {}
+    data['decimation strategy']             = DecimationStrategy(trckhist.get('Decimation', str(DEFAULT_DECIMATION_STRATEGY)))
+    data['decimation time interval']        = float(trckhist.get('Time Interval', ESTATE_THROTTLE_DELTA_T))
+    data['decimation distance interval']    = float(trckhist.get('Distance Interval', DEFAULT_DECIMATION_DISTANCE_INTERVAL))
+    data['decimation heading change']       = float(trckhist.get('Heading Change', DEFAULT_DECIMATION_HEADING_CHANGE))
+    data['decimation speed change']         = float(trckhist.get('Speed Change', DEFAULT_DECIMATION_SPEED_CHANGE))
+    data['decimation tolerance']            = float(trckhist.get('Tolerance', DEFAULT_DECIMATION_TOLERANCE))
+
+    # The full MCMPEDAT set (with the tracks of the survey) is only written if its section is there
+    data['full mcmpedat'] = params.has_section('MCMPEDAT')
+    if data['full mcmpedat']:
+        mcmpedat = params['MCMPEDAT']
+        data['mission sonar range']             = int(mcmpedat['Sonar Range'])
+        data['classification probability']      = float(mcmpedat['Classification Probability'])
+        data['probability undetected burial']   = float(mcmpedat['Probability Undetected Burial'])
+        data['probability undetected seabed']   = float(mcmpedat['Probability Undetected Seabed'])
+        data['mission number of rows']          = int(mcmpedat.get('Number Of Tracks', 0))
+        data['mission grid step']               = float(mcmpedat.get('Track Spacing', 0))
+
+    # With a COVERAGE section, the progress is the part of the task area swept by the sonar
+    data['automatic progress'] = params.has_section('COVERAGE')
+    if data['automatic progress']:
+        coverage_section = params['COVERAGE']
+        data['coverage area']                   = coverage.parseArea(coverage_section['Area'])
+        data['coverage sonar range']            = float(coverage_section['Sonar Range'])
+        data['coverage cell size']              = float(coverage_section.get('Cell Size', COVERAGE_CELL_SIZE))
+
+    return data
+
+
+def applyOptions(data: dict, options: dict) -> dict:
+    # Command line options take precedence over the parameters file.
+    if options.get('decimation') is not None:
+        data['decimation strategy'] = options['decimation']
+    if options.get('decimation threshold') is not None:
+        data[DECIMATION_THRESHOLD_MAP[data['decimation strategy']]] = options['decimation threshold']
+    data['jobs'] = options.get('jobs') or 1
+    return data
+
+
+def getAdditionalData(data: dict,
+                      report_type: ReportType,
+                      data_directory: pathlib.Path) -> dict:
+    if report_type in (ReportType.Stop, ReportType.Complete) and data['automatic progress']:
+        data = getCoverageProgress(data, data_directory)
+    if report_type == ReportType.Complete:
+        # NOTE: estimated state data can be huge - it is streamed while the report is written.
+        data['estimated state files'] = getEstimatedStateFiles(data_directory, data['vehicle name'])
+        for vehicle, estimated_state_file in data['estimated state files']:
+            debug("Found estimated state data of %s: %s", vehicle, estimated_state_file)
+        if data['full mcmpedat']:
+            data = getSurveyTracks(data)
+        debug("Parsing mine detection data...")
+        with span("load mines") as stage:
+            # Only the rows not formatted by a previous run are parsed (see src/mines_cache.py)
+            data['mine lines'] = mines_cache.loadMineLines(data_directory, data['jobs'])
+            stage.count(len(data['mine lines']))
+    return data
+
+
+def getEstimatedStateFiles(data_directory: pathlib.Path, vehicle_name: str) -> list:
+    # (vehicle, file) of each EstimatedState file of the task: EstimatedState.csv is the log of
+    # the vehicle of the GENERAL section, and EstimatedState_<VEHICLE>.csv the logs of the others.
+    estimated_state_files = []
+    estimated_state_file = data_directory / FILENAME_ESTIMATED_STATE_CSV
+    if estimated_state_file.exists():
+        estimated_state_files.append((vehicle_name, estimated_state_file))
+    prefix, suffix = FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN.split("*")
+    for estimated_state_file in sorted(data_directory.glob(FILENAME_VEHICLE_ESTIMATED_STATE_CSV_PATTERN)):
+        vehicle = estimated_state_file.name[len(prefix):-len(suffix)].upper()
+        estimated_state_files.append((vehicle, estimated_state_file))
+    return estimated_state_files
+
+
+def getCoverageProgress(data: dict, data_directory: pathlib.Path) -> dict:
+    # Replaces the progress of the parameters file by the coverage of the task area by all
+    # the vehicles, computed from the rows of their EstimatedState files added since the
+    # last run (see src/coverage.py)
+    if 'coverage progress' not in data:
+        estimated_state_files = getEstimatedStateFiles(data_directory, data['vehicle name'])
+        if len(estimated_state_files) == 0:
+            warning(f"No {FILENAME_ESTIMATED_STATE_CSV} to compute the coverage from - using the progress of [STOP].")
+            data['coverage progress'] = data['stop progress']
+        else:
+            with span("coverage") as stage:
+                grids = [coverage.updateCoverage(estimated_state_file,
+                                                 data['coverage area'],
+                                                 data['coverage sonar range'],
+                                                 data['coverage cell size'])
+                         for _, estimated_state_file in estimated_state_files]
+                grid = grids[0]
+                for other in grids[1:]:
+                    grid.merge(other)
+                data['coverage progress'] = grid.percentage()
+                stage.count(int(grid.inside.sum()))
+            debug("Coverage of the task area: %d%%.", data['coverage progress'])
+    data['stop progress'] = data['coverage progress']
+    return data
+
+
+def getSurveyTracks(data: dict) -> dict:
+    # Tracks of the full MCMPEDAT set: found along the track of the first vehicle if there is one,
+    # or the planned ones otherwise (see src/survey_legs.py)
+    survey = {'tracks': []}
+    if len(data['estimated state files']) > 0:
+        with span("survey tracks") as stage:
+            chunks = estimated_state_cache.iterCachedEstimatedStateChunks(data['estimated state files'][0][1])
+            survey = survey_legs.analyseSurvey(chunks, data['mission number of rows'])
+            stage.count(len(survey['tracks']))
+    if len(survey['tracks']) == 0:
+        debug("No survey legs found - using the planned tracks.")
+        survey = survey_legs.plannedSurvey(data['mission number of rows'], data['mission grid step'])
+    else:
+        debug("Found %d survey track(s), %d%% completed.", len(survey['tracks']), survey['completion'])
+    data['survey tracks'] = survey['tracks']
+    data['survey completion'] = survey['completion']
+    # The coverage of the task area (see getCoverageProgress) is used instead, if there is one
+    if data['automatic progress']:
+        data['survey completion'] = data['stop progress']
+    return data
+
+
+def countReports(top_directory: pathlib.Path,
+                 element: str,
+                 area: str,
+                 task: str) -> int:
+    params = getParams(getDataDirectory(top_directory, element, area, task))
+    return len(getReportTypes(params))
+
+
+def getReportSettings(report_type: ReportType, data: dict) -> list:
+    # Settings (other than the input files) that change the content of a report.
+    if report_type == ReportType.Complete:
+        return [data[setting] for setting in DECIMATION_SETTINGS]
+    return []
+
+
+def generateTask(top_directory: pathlib.Path,
+                 element: str,
+                 area: str,
+                 task: str,
+                 report_start_number: int,
+                 options: dict) -> list:
+    # Generates the reports of one task, numbered from report_start_number.
+    # Reports whose inputs did not change since the last run are skipped (unless forced).
+    # Returns the report numbers used (one per report type in the parameters file).
+    data_directory = getDataDirectory(top_directory, element, area, task)
+    reports_directory = getReportsDirectory(top_directory, element, area, task)
+
+    if not reports_directory.exists():
+        createDirectoryIfNecessary(reports_directory)
+        debug("No reports directory found - creating...")
+
+    with span("read parameters"):
+        params = getParams(data_directory)
+        report_types = getReportTypes(params)
+        data = applyOptions(getData(params), options)
+
+    selected_report_types = [report for report in report_types
+                             if options.get('only') is None or options['only'] == report]
+    with span("hash inputs"):
+        manifest = loadManifest(reports_directory)
+        input_hashes = inputHashes(manifest, params, data_directory, selected_report_types)
+
+    report_number = report_start_number
+    report_numbers = []
+    # The reports and the manifest only replace the previous ones once they are all written
+    with AtomicWriteBatch() as batch:
+        for report in report_types:
+            # NOTE: reports skipped with --only still use up their number, so that
+            # the numbering stays the same whichever reports are generated.
+            if report in selected_report_types:
+                key = reportKey(report, params, input_hashes, report_number, getReportSettings(report, data))
+                if not options.get('force') and isUpToDate(manifest, report, key, reports_directory):
+                    info(f"{report} report with number {report_number} is up to date - skipping.")
+                else:
+                    info(f"Generating {report} report with number {report_number}...")
+                    with span(f"report {report}"):
+                        data["message serial number"] = report_number
+                        data = getAdditionalData(data, report, data_directory)
+                        _, filename = create_report(report,
+                                                    data,
+                                                    reports_directory,
+                                                    data['full mcmpedat'],
+                                                    len(data.get('estimated state files', [])) > 0,
+                                                    False,
+                                                    batch)
+                    manifest = recordReport(manifest, report, key, filename)
+            report_numbers.append(report_number)
+            report_number += 1
+
+        with span("save manifest"):
+            saveManifest(reports_directory, manifest, batch)
+        with span("commit files"):
+            batch.commit()
+    debug("%d file(s) written, %d unchanged.", batch.written, batch.unchanged)
+
+    return report_numbers
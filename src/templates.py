@@ -14,6 +14,13 @@ def parameterTemplate(area: str,
     # - Datetimes should be in UTC, in format YYYYMMDD-HHMM.
     # - Progress should be a percentage (0 to 100).
     # - Comments are optional and can be left empty.
+    # - TRCKHIST decimation is one of: time (Time Interval, in s), distance (Distance Interval, in m),
+    #   change (Heading Change, in deg, and Speed Change, in kn) or douglas-peucker (Tolerance, in m).
+    # - Uncomment the MCMPEDAT section to report the tracks of the survey in the COMPLETE report:
+    #   they are found in EstimatedState.csv (or Number Of Tracks tracks, Track Spacing m apart, without it).
+    # - Uncomment the COVERAGE section to fill in the progress from EstimatedState.csv: the part of the
+    #   Area (corners "latitude longitude" in decimal degrees, separated by commas) within Sonar Range (in m)
+    #   of the track, on a grid of Cell Size m (the Progress of the STOP section is then ignored).
 
     [GENERAL]
     Originator                                = {originator}
@@ -21,6 +28,7 @@ def parameterTemplate(area: str,
     Area                                      = {area}
     Task Order Number                         = {task_order_number}
     Reference UTC Datetime                    = {date}-
+    Vehicle                                   = SONOBOT
 
     [START]
     Start UTC Datetime                        = {date}-
@@ -35,4 +43,25 @@ def parameterTemplate(area: str,
     [COMPLETE]
     Complete UTC Datetime                     = {date}-
     Comments                                  =
+
+    [TRCKHIST]
+    Decimation                                = time
+    Time Interval                             = 15
+    Distance Interval                         = 25
+    Heading Change                            = 10
+    Speed Change                              = 1
+    Tolerance                                 = 5
+
+    # [MCMPEDAT]
+    # Sonar Range                               = 50
+    # Classification Probability                = 0.9
+    # Probability Undetected Burial             = 0.1
+    # Probability Undetected Seabed             = 0.1
+    # Number Of Tracks                          = 20
+    # Track Spacing                             = 25
+
+    # [COVERAGE]
+    # Area                                      = 43.0000 9.0000, 43.0000 9.0100, 43.0100 9.0100, 43.0100 9.0000
+    # Sonar Range                               = 50
+    # Cell Size                                 = 5
     """)
@@ -1,18 +1,22 @@
 # Utils used in REPMUS 2023 APP-11 report generation.
 
 # Library imports
-import datetime
 import math
-from pathlib import Path
-import time
 
 # Local imports
-from src.constants import MINE_STATUS_ID_MAP, MINE_CASE_MAP
+from src import dtg
+from src.constants import ESTATE_COLUMN_TIME, \
+                          ESTATE_COLUMN_LATITUDE, \
+                          ESTATE_COLUMN_LONGITUDE, \
+                          ESTATE_COLUMN_YAW, \
+                          ESTATE_COLUMN_VX, \
+                          ESTATE_COLUMN_VY, \
+                          ESTATE_COLUMN_ALTITUDE, \
+                          MS_TO_KNOTS
 
 
 def timeToZulu(time_str):
-    date = datetime.datetime.strptime(time_str, '%Y%m%d-%H%M')
-    return date.strftime('%d%H%MZ%b%Y').upper()
+    return dtg.timeToZulu(time_str)
 
 
 def degreesToDDM(deg):
@@ -30,8 +34,7 @@ def radiansToDDM(radians):
 
 
 def currentDatetime():
-    time = datetime.datetime.now(datetime.timezone.utc)
-    return "{}".format(time.strftime('%d%H%MZ%b%Y')).upper()
+    return dtg.currentDatetime()
 
 
 def formatFix(lat, lon):
@@ -47,42 +50,48 @@ def formatFix(lat, lon):
 
 
 def throttleData(data, delta_t):
-    throttled_data = []
+    # Keeps the first and the last rows, and every row more than delta_t
+    # seconds after the previously kept one.
+    if len(data) == 0:
+        return []
+
+    throttled_data = [data[0]]
 
     start_t = float(data[0][0])
-    for i in range(0, len(data) - 1):
-        row = data[i]
+    for row in data[1:]:
         row_t = float(row[0])
         if (row_t - start_t) > delta_t:
             throttled_data.append(row)
             start_t = row_t
 
+    if throttled_data[-1] is not data[-1]:
+        throttled_data.append(data[-1])
+
     return throttled_data
 
 
 def extractAndFormatDTG(line):
-    time = datetime.datetime.fromtimestamp(float(line[0]))
-    return "{}".format(time.strftime('%d%H%MZ%b%Y')).upper()
+    return dtg.epochToZulu(float(line[ESTATE_COLUMN_TIME]))
 
 
 def extractAndFormatFix(line):
-    return formatFix(radiansToDDM(float(line[3])),
-                     radiansToDDM(float(line[4])))
+    return formatFix(radiansToDDM(float(line[ESTATE_COLUMN_LATITUDE])),
+                     radiansToDDM(float(line[ESTATE_COLUMN_LONGITUDE])))
 
 
 def extractAndFormatSensorAltitude(line):
-    return "ALT:{}".format(math.floor(float(line[22])))
+    return "ALT:{}".format(math.floor(float(line[ESTATE_COLUMN_ALTITUDE])))
 
 
 def extractAndFormatSpeed(line):
-    vx = float(line[15])
-    vy = float(line[16])
-    total_speed = math.floor(math.sqrt(vx ** 2 + vy ** 2) * 1.94384)
+    vx = float(line[ESTATE_COLUMN_VX])
+    vy = float(line[ESTATE_COLUMN_VY])
+    total_speed = math.floor(math.sqrt(vx ** 2 + vy ** 2) * MS_TO_KNOTS)
     return "{}".format(total_speed)
 
 
 def extractAndFormatHeading(line):
-    yaw = float(line[11]);
+    yaw = float(line[ESTATE_COLUMN_YAW]);
     return "{}".format(math.floor(math.degrees(yaw) % 360)).zfill(3)
 
 
@@ -100,55 +109,19 @@ def createTrckHist(data, equipment):
     f.close();
 
 
-def getMineContactReferenceNumber(line):
-    return "{}".format(line[1]).upper()
-
-
-def getMineReferenceNumber(line):
-    return "{}".format(line[2]).upper()
-
-
-def getMineNOMBOIdentification(line):
-    return "{}".format(line[3]).upper()
-
-
-def getMineDTG(line):
-    return timeToZulu(line[4])
-
-
-def getMineFix(line):
-    return formatFix(degreesToDDM(float(line[6])),
-                     degreesToDDM(float(line[5])))
-
-
-def getMineCircularErrorProbability(line):
-    return "{}".format(int(line[7]))
-
-
-def getMineSonarConfidenceLevel(line):
-    return "{}".format(int(math.floor((float(line[8]) * 100) / 25.0)) + 1)
-
-
-def getMineDetectionEquipment(line):
-    return line[9]
-
-
-def getMineStatusIdentifier(line):
-    return MINE_STATUS_ID_MAP[line[10]]
-
-
-def getMineCase(line):
-    return MINE_CASE_MAP[line[11]]
+# Formatting of the numeric fields of a MineRecord (see src/mines.py)
+def getMineFix(mine):
+    return formatFix(degreesToDDM(mine.latitude),
+                     degreesToDDM(mine.longitude))
 
 
-def getMineIdentity(line):
-    return "{}".format(line[12]).upper()
+def getMineCircularErrorProbability(mine):
+    return "{}".format(mine.circular_error_probability)
 
 
-def getMineDepth(line):
-    return "{}".format(int(line[13]))
+def getMineSonarConfidenceLevel(mine):
+    return "{}".format(int(math.floor((mine.confidence_level * 100) / 25.0)) + 1)
 
 
-def getMineImageName(line):
-    path = Path(line[14])
-    return "{}".format(path.name).upper()
+def getMineDepth(mine):
+    return "{}".format(mine.depth)
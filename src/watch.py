@@ -0,0 +1,268 @@
+# Watch mode of generate_reports.py (--watch): the data directories of the tasks are
+# monitored, and the reports of a task are regenerated when its input files change.
+#
+# Changes are detected with inotify on Linux (through ctypes, no extra dependency), or by
+# scanning the directories every WATCH_POLL_INTERVAL seconds otherwise. A burst of changes
+# (e.g. an editor saving parameters.ini, or Mines.csv being appended to) is collected until
+# the files have been quiet for WATCH_DEBOUNCE_DELAY seconds, and only the reports whose
+# inputs changed are regenerated (see src/manifest.py).
+
+# Library imports
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import pathlib
+import select
+import struct
+import time
+
+# Local imports
+from src.constants import FOLDER_NAME_DATA, \
+                          WATCHED_FILENAMES, \
+                          WATCH_DEBOUNCE_DELAY, \
+                          WATCH_MAX_DELAY, \
+                          WATCH_POLL_INTERVAL
+from src.logger import log, LogLevel, info, debug, warning, error, success
+from src.tasks import checkTaskFiles, \
+                      countReports, \
+                      findTasks, \
+                      generateTask, \
+                      getDataDirectory
+
+
+# inotify flags (see inotify(7))
+IN_MODIFY       = 0x00000002
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_NONBLOCK     = 0o4000
+IN_CLOEXEC      = 0o2000000
+
+INOTIFY_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+# struct inotify_event: wd, mask, cookie, len (followed by the name)
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_BUFFER_SIZE = 65536
+
+# Depth of the data directories of the tasks below the top level data directory (<TE>/<AREA>/<TASK>/data)
+TASK_DATA_DEPTH = 4
+
+
+class InotifyWatcher:
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Map of watch descriptor to watched directory
+        self._directories = {}
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def watch(self, directory: pathlib.Path) -> None:
+        if directory in self._directories.values():
+            return
+        wd = self._add_watch(self._fd, os.fsencode(directory), INOTIFY_WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch '{directory}'")
+        self._directories[wd] = directory
+
+    def read(self, timeout) -> set:
+        # Paths changed in the watched directories, waiting up to timeout seconds (forever if None)
+        # for the first change. The watched directories themselves are returned if events were lost.
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if len(readable) == 0:
+            return set()
+
+        changes = set()
+        buffer = os.read(self._fd, INOTIFY_BUFFER_SIZE)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                changes.update(self._directories.values())
+            elif mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+            elif wd in self._directories:
+                directory = self._directories[wd]
+                changes.add(directory / os.fsdecode(name) if len(name) > 0 else directory)
+        return changes
+
+
+class PollingWatcher:
+
+    def __init__(self, interval: float = WATCH_POLL_INTERVAL):
+        self._interval = interval
+        # Map of watched directory to {name: (size, mtime)} of its entries
+        self._snapshots = {}
+
+    def close(self) -> None:
+        pass
+
+    def watch(self, directory: pathlib.Path) -> None:
+        if directory not in self._snapshots:
+            self._snapshots[directory] = self._snapshot(directory)
+
+    def _snapshot(self, directory: pathlib.Path) -> dict:
+        entries = {}
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return entries
+
+    def read(self, timeout) -> set:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changes = set()
+            for directory, previous in list(self._snapshots.items()):
+                current = self._snapshot(directory)
+                for name in previous.keys() | current.keys():
+                    if previous.get(name) != current.get(name):
+                        changes.add(directory / name)
+                self._snapshots[directory] = current
+            if len(changes) > 0:
+                return changes
+
+            remaining = self._interval if deadline is None else min(self._interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return changes
+            time.sleep(remaining)
+
+
+def createWatcher(polling: bool):
+    if not polling:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            warning(f"inotify is not available ({e}) - scanning the data directories "
+                    f"every {WATCH_POLL_INTERVAL}s instead.")
+    return PollingWatcher()
+
+
+def waitForChanges(watcher) -> set:
+    # Blocks until something changes, then collects changes until the files have been quiet
+    # for WATCH_DEBOUNCE_DELAY seconds (or for at most WATCH_MAX_DELAY seconds).
+    changes = set()
+    while len(changes) == 0:
+        changes = watcher.read(None)
+
+    deadline = time.monotonic() + WATCH_MAX_DELAY
+    while True:
+        timeout = min(WATCH_DEBOUNCE_DELAY, deadline - time.monotonic())
+        if timeout <= 0:
+            return changes
+        more = watcher.read(timeout)
+        if len(more) == 0:
+            return changes
+        changes.update(more)
+
+
+def watchedDirectories(top_directory: pathlib.Path) -> list:
+    # The top level data directory and every directory below it, down to the data directories of
+    # the tasks, so that the tasks created while watching (with create_directory.py) are found.
+    data_path = top_directory / FOLDER_NAME_DATA
+    directories = [data_path]
+    level = [data_path]
+    for depth in range(1, TASK_DATA_DEPTH + 1):
+        level = [child for directory in level
+                 for child in (directory.iterdir() if directory.is_dir() else [])
+                 if child.is_dir() and (depth < TASK_DATA_DEPTH or child.name == FOLDER_NAME_DATA)]
+        directories.extend(level)
+    return directories
+
+
+def changedTasks(top_directory: pathlib.Path, changes: set) -> tuple:
+    # (tasks whose input files changed, whether the directory tree may have changed)
+    data_path = top_directory / FOLDER_NAME_DATA
+    tasks = set()
+    rescan = False
+    for path in changes:
+        try:
+            parts = path.relative_to(data_path).parts
+        except ValueError:
+            continue
+        # Hidden files (caches of the generator, swap files of editors) are not inputs
+        if len(parts) > 0 and parts[-1].startswith("."):
+            continue
+        if len(parts) == TASK_DATA_DEPTH + 1 and parts[3] == FOLDER_NAME_DATA:
+            if any(fnmatch.fnmatchcase(parts[4], pattern) for pattern in WATCHED_FILENAMES):
+                tasks.add(parts[:3])
+        else:
+            rescan = True
+    return tasks, rescan
+
+
+def regenerateTask(top_directory: pathlib.Path, task: tuple, registry, options: dict) -> None:
+    element, area, task_number = task
+    message = checkTaskFiles(getDataDirectory(top_directory, element, area, task_number))
+    if message is not None:
+        warning(message)
+        return
+
+    try:
+        count = countReports(top_directory, element, area, task_number)
+        _, report_start_number = registry.reserve(area, task_number, count)
+        report_numbers = generateTask(top_directory, element, area, task_number, report_start_number, options)
+    except Exception as e:
+        # The files may be in the middle of being edited: the next change triggers a new attempt
+        error(f"{'/'.join(task)}: {type(e).__name__}: {e}")
+        return
+    success(f"{'/'.join(task)}: reports {report_numbers}")
+
+
+def watchTasks(top_directory: pathlib.Path,
+               element: str,
+               area: str,
+               task: str,
+               registry,
+               options: dict,
+               polling: bool = False) -> None:
+    # Regenerates the reports of the tasks matching the (glob) patterns whenever their inputs
+    # change, until interrupted (Ctrl+C).
+    watcher = createWatcher(polling)
+    try:
+        for directory in watchedDirectories(top_directory):
+            watcher.watch(directory)
+
+        tasks = set(findTasks(top_directory, element, area, task))
+        info(f"Watching {len(tasks)} task(s) in '{top_directory}' (Ctrl+C to stop)...")
+        for watched_task in sorted(tasks):
+            regenerateTask(top_directory, watched_task, registry, options)
+
+        while True:
+            changes = waitForChanges(watcher)
+            if log.isEnabled(LogLevel.Debug):
+                debug("Changed: %s", ", ".join(sorted(f"{path}" for path in changes)))
+            affected, rescan = changedTasks(top_directory, changes)
+
+            if rescan:
+                for directory in watchedDirectories(top_directory):
+                    watcher.watch(directory)
+                found = set(findTasks(top_directory, element, area, task))
+                for new_task in sorted(found - tasks):
+                    info(f"New task: {'/'.join(new_task)}")
+                affected |= found - tasks
+                tasks = found
+
+            for changed_task in sorted(affected & tasks):
+                regenerateTask(top_directory, changed_task, registry, options)
+    finally:
+        watcher.close()
@@ -0,0 +1,133 @@
+#!/bin/python3
+
+# Library imports
+import argparse
+import os
+import pathlib
+import textwrap
+import sys
+import time
+
+# Local imports
+from src.app11_parser import isReportFilename, \
+                             validateReport
+from src.exit_codes import ExitCode
+from src.logger import log, LogLevel, LogFormat, info, success, error, debug
+
+
+# Number of reports validated by a worker process at a time
+VALIDATION_CHUNK_SIZE = 64
+
+
+def usage():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent(
+        '''
+        Checks APP-11 reports before they are sent: every set is parsed back and formatted again
+        with the layouts of the generator, and the result must be the original line.
+        The header, BT lines, filename, MSGID, NMWREPQ and MTASKREP sets are also checked against each other.
+        '''
+        ),
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('paths',
+                        type=pathlib.Path,
+                        nargs='+',
+                        help='Report files, or directories searched recursively for reports '
+                             '(e.g. the top level directory of an exercise)')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of processes validating reports (default: number of CPUs)')
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='store_true',
+                        help='Print debug information')
+    parser.add_argument('-q',
+                        '--quiet',
+                        action='store_true',
+                        help='Quiet mode (only print errors)')
+    parser.add_argument('--log-format',
+                        type=LogFormat,
+                        choices=list(LogFormat),
+                        default=LogFormat.Console,
+                        help='Format of the messages: coloured console lines, or one JSON object per line '
+                             '(time, level, logger, pid, message) for other programs (default: console)')
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    return args
+
+
+def findReports(paths: list) -> list:
+    reports = []
+    for path in paths:
+        if path.is_dir():
+            for directory, _, filenames in os.walk(path):
+                reports.extend(pathlib.Path(directory) / filename
+                               for filename in filenames if isReportFilename(filename))
+        else:
+            reports.append(path)
+    return sorted(reports)
+
+
+def validateReports(reports: list, jobs: int):
+    # Yields (report, errors) in the order of reports
+    if jobs == 1 or len(reports) <= VALIDATION_CHUNK_SIZE:
+        for report in reports:
+            yield report, validateReport(report)
+        return
+
+    # Only needed to validate many reports on several processes
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from zip(reports, executor.map(validateReport, reports, chunksize=VALIDATION_CHUNK_SIZE))
+
+
+def main():
+    args = usage()
+
+    if args.verbose:
+        log.setLogLevel(LogLevel.Debug)
+    elif args.quiet:
+        log.setLogLevel(LogLevel.Quiet)
+    log.setLogFormat(args.log_format)
+
+    for path in args.paths:
+        if not path.exists():
+            error(f"'{path}' does not exist.")
+            sys.exit(ExitCode.Failure)
+
+    reports = findReports(args.paths)
+    if len(reports) == 0:
+        error("No report found.")
+        sys.exit(ExitCode.Failure)
+    info(f"Validating {len(reports)} report(s)...")
+
+    start = time.perf_counter()
+    invalid = 0
+    for report, errors in validateReports(reports, args.jobs):
+        if len(errors) == 0:
+            debug("%s: OK", report)
+            continue
+
+        invalid += 1
+        error(f"{report}:")
+        for message in errors:
+            error(f"  {message}")
+    elapsed = time.perf_counter() - start
+    debug("Validated %d report(s) in %.3fs (%.0f reports/s).", len(reports), elapsed, len(reports) / max(elapsed, 1e-9))
+
+    if invalid > 0:
+        error(f"{invalid} of {len(reports)} report(s) are invalid.")
+        sys.exit(ExitCode.Failure)
+
+    success(f"All {len(reports)} report(s) are valid.")
+
+
+if __name__ == "__main__":
+    main()